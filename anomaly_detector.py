@@ -0,0 +1,139 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+from typing import Dict, List, Tuple
+
+import tracing
+
+ANOMALY_ALPHA = float(os.environ.get("ANOMALY_ALPHA", 0.05))  # EWMA weight of the newest value
+ANOMALY_THRESHOLD = float(os.environ.get("ANOMALY_THRESHOLD", 4.0))  # |z| that flags an event
+ANOMALY_WARMUP = int(os.environ.get("ANOMALY_WARMUP", 20))  # Values a series needs before it can flag
+ANOMALY_FIELDS = tuple(os.environ.get("ANOMALY_FIELDS", "intensity,temperature,humidity,battery_level").split(","))
+LLM_TRIGGER = os.environ.get("LLM_TRIGGER", "anomalies")  # anomalies or all: which events main.py sends to the LLM
+
+# --- Online anomaly detection ---
+# Every event feeds two series per numeric field, one for its device_id and one for its
+# location, so a device reporting from several places is still compared with itself and
+# the simulators, which draw a new device_id for nearly every event, still warm up per
+# location. Each series keeps an exponentially weighted mean and variance: three numbers,
+# updated in O(1) per value, so drift such as a draining battery or a warming room moves
+# the baseline instead of flagging every reading. An event is scored against the baselines
+# from before it arrived; if any field is more than ANOMALY_THRESHOLD deviations away in
+# either series, the event is flagged. Fields come from the top level
+# (script1.py), metadata (battery_level) or a numeric sensor reading (script.py writes
+# temperature and humidity as reading strings). Flags are plain metadata:
+#   {"anomaly": true, "anomaly_z": 4.2, "anomaly_fields": "temperature"}
+# pipeline.py adds them to every DocumentStore row. main.py adds them to flagged events
+# only, keeping ordinary prompt lines short, and sends just those events (and ones the
+# Predictor rules match) to the LLM unless LLM_TRIGGER=all.
+#   python anomaly_detector.py simulated_data.jsonl
+
+MIN_DEVIATION = 1e-3  # Floor on the deviation, so a series that never moved cannot divide by zero
+
+def event_values(event: Dict, fields: Tuple[str, ...] = ANOMALY_FIELDS) -> Dict[str, float]:
+    metadata = event.get("metadata") or {}
+    values = {}
+    for field in fields:
+        value = event.get(field, metadata.get(field))
+        if value is None and event.get("sensor") == field:
+            value = event.get("reading")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(value):
+            values[field] = value
+    return values
+
+def series_keys(event: Dict) -> List[Tuple[str, str]]:
+    metadata = event.get("metadata") or {}
+    keys = [("device_id", metadata.get("device_id")), ("location", event.get("location", metadata.get("location")))]
+    return [(kind, value) for kind, value in keys if value is not None]
+
+class _Series:
+    __slots__ = ("count", "mean", "var")
+
+    def __init__(self, value: float):
+        self.count = 1
+        self.mean = value
+        self.var = 0.0
+
+    def update(self, value: float, alpha: float) -> float:
+        """z-score of value against the series so far, then fold it in."""
+        diff = value - self.mean
+        z = diff / max(math.sqrt(self.var), MIN_DEVIATION)
+        increment = alpha * diff
+        self.mean += increment
+        self.var = (1 - alpha) * (self.var + diff * increment)
+        self.count += 1
+        return z
+
+class AnomalyDetector:
+    # Safe to call from Pathway's worker threads and main.py's tail loop alike
+    def __init__(self, alpha: float = ANOMALY_ALPHA, threshold: float = ANOMALY_THRESHOLD,
+                 warmup: int = ANOMALY_WARMUP, fields: Tuple[str, ...] = ANOMALY_FIELDS):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.fields = fields
+        self._series: Dict[Tuple, _Series] = {}
+        self._lock = threading.Lock()
+        self.scored = 0
+        self.flagged = 0
+
+    def score(self, event: Dict) -> Dict:
+        """Anomaly flags for one event, updating its series."""
+        keys = series_keys(event)
+        worst = 0.0
+        fields: List[str] = []
+        with self._lock:
+            for field, value in event_values(event, self.fields).items():
+                for key in keys:
+                    series = self._series.get(key + (field,))
+                    if series is None:
+                        self._series[key + (field,)] = _Series(value)
+                        continue
+                    warm = series.count >= self.warmup
+                    z = series.update(value, self.alpha)
+                    if warm:
+                        worst = max(worst, abs(z))
+                        if abs(z) >= self.threshold and field not in fields:
+                            fields.append(field)
+            self.scored += 1
+            if fields:
+                self.flagged += 1
+        tracing.count("anomaly.scored")
+        if fields:
+            tracing.count("anomaly.flagged")
+        return {"anomaly": bool(fields), "anomaly_z": round(worst, 2), "anomaly_fields": ",".join(fields)}
+
+    def annotate(self, event: Dict) -> Dict:
+        """Score an event and, if it is anomalous, merge its flags into event["metadata"]."""
+        flags = self.score(event)
+        if flags["anomaly"]:
+            event["metadata"] = {**(event.get("metadata") or {}), **flags}
+        return flags
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"series": len(self._series), "scored": self.scored, "flagged": self.flagged}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a sensor log through the anomaly detector and print flagged events.")
+    parser.add_argument("path")
+    parser.add_argument("--alpha", type=float, default=ANOMALY_ALPHA)
+    parser.add_argument("--threshold", type=float, default=ANOMALY_THRESHOLD)
+    parser.add_argument("--warmup", type=int, default=ANOMALY_WARMUP)
+    args = parser.parse_args()
+
+    detector = AnomalyDetector(args.alpha, args.threshold, args.warmup)
+    with open(args.path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                if detector.annotate(event)["anomaly"]:
+                    print(json.dumps(event))
+    print(json.dumps(detector.stats()), file=sys.stderr)
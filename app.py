@@ -1,8 +1,27 @@
+import os
+
 import streamlit as st
-import requests
 import pandas as pd
 
+from retrieve_client import RetrieveClient
+
 API_URL = "http://localhost:8765/v1/retrieve"
+API_BASE_URL = os.environ.get("API_BASE_URL", API_URL.rsplit("/v1/", 1)[0])
+RECALL_CACHE_TTL = int(os.environ.get("RECALL_CACHE_TTL", 15))  # seconds an identical query/k result is reused
+
+# One keep-alive client per server process, shared by every session and rerun
+@st.cache_resource
+def get_client() -> RetrieveClient:
+    return RetrieveClient(API_BASE_URL)
+
+# Identical query/k pairs within the TTL reuse the already-built DataFrame
+@st.cache_data(ttl=RECALL_CACHE_TTL, show_spinner=False)
+def recall(query: str, k: int) -> pd.DataFrame:
+    return pd.DataFrame(get_client().retrieve(query, k))
+
+@st.cache_data(ttl=RECALL_CACHE_TTL, show_spinner=False)
+def recall_many(queries: tuple, k: int) -> list:
+    return [pd.DataFrame(data) for data in get_client().retrieve_many(queries, k)]
 
 st.title("Digital Neocortex Dashboard")
 
@@ -11,19 +30,28 @@ query_text = st.text_input("Enter your memory recall query:", "Recall the most r
 k = st.number_input("Number of results", min_value=1, max_value=10, value=3, step=1)
 
 if st.button("Retrieve Memory"):
-    payload = {"query": query_text, "k": k}
     try:
-        response = requests.post(API_URL, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        if data:
-            df = pd.DataFrame(data)
+        df = recall(query_text, int(k))
+        if not df.empty:
             st.dataframe(df)
         else:
             st.write("No matching documents found.")
     except Exception as e:
         st.error(f"Error: {e}")
 
+st.header("Batch Recall")
+batch_text = st.text_area("One query per line:", "")
+if st.button("Retrieve All"):
+    queries = tuple(line.strip() for line in batch_text.splitlines() if line.strip())
+    try:
+        for query, df in zip(queries, recall_many(queries, int(k))):
+            st.subheader(query)
+            if not df.empty:
+                st.dataframe(df)
+            else:
+                st.write("No matching documents found.")
+    except Exception as e:
+        st.error(f"Error: {e}")
+
 st.header("Prediction Engine (Coming Soon)")
 st.write("This section will eventually display upcoming alerts and predictions based on your interactions.")
-
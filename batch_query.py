@@ -0,0 +1,197 @@
+import argparse
+import csv
+import json
+import os
+import socket
+import sys
+import time
+from bisect import bisect_left
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from retrieve_client import RetrieveClient
+
+# --- Batch retrieval runner ---
+# Replays a queries.csv (query, k, metadata_filter, filepath_globpattern, as written by
+# queryscript.py) against the DocumentStore for offline evaluation and capacity planning.
+# The CSV is read row by row, at most 2 x --concurrency queries are in flight and latency
+# percentiles come from fixed buckets, so files of any size run in constant memory. Each
+# result is appended to --output as one JSON line as soon as it completes; the run ends with
+# throughput and a latency histogram.
+#   python batch_query.py queries.csv --output results.jsonl --concurrency 32
+#   python batch_query.py queries.csv --in-process --report report.json
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+# Percentiles come from a finer set of buckets, 2% apart from 10 us to about 10 minutes, so
+# they are within 2% of the exact value without keeping one sample per query
+QUANTILE_BOUNDS_S = [1e-5 * 1.02 ** i for i in range(905)]
+
+def read_queries(path: str, default_k: int = 3) -> Iterator[Dict]:
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            if not row.get("query"):
+                continue
+            yield {
+                "query": row["query"],
+                "k": int(row.get("k") or default_k),
+                "metadata_filter": row.get("metadata_filter") or None,
+                "filepath_globpattern": row.get("filepath_globpattern") or None,
+            }
+
+class LatencyHistogram:
+    def __init__(self, buckets_ms: List[float] = HISTOGRAM_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.fine = [0] * (len(QUANTILE_BOUNDS_S) + 1)  # The last bucket is open-ended
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        ms = seconds * 1000
+        for i, bound in enumerate(self.buckets_ms):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.fine[bisect_left(QUANTILE_BOUNDS_S, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        # Upper bound of the bucket holding the pct-th sample, capped at the largest seen
+        rank = max(1, round(pct / 100 * self.count))
+        seen = 0
+        for bound, count in zip(QUANTILE_BOUNDS_S, self.fine):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def labels(self) -> List[str]:
+        return [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+
+    def to_dict(self) -> Dict:
+        summary = {}
+        if self.count:
+            ms = lambda seconds: round(seconds * 1000, 3)
+            summary = {
+                "p50_ms": ms(self.percentile(50)),
+                "p90_ms": ms(self.percentile(90)),
+                "p99_ms": ms(self.percentile(99)),
+                "mean_ms": ms(self.total / self.count),
+            }
+        return {**summary, "histogram": dict(zip(self.labels(), self.counts))}
+
+    def render(self, width: int = 40) -> str:
+        peak = max(self.counts) or 1
+        lines = []
+        for label, count in zip(self.labels(), self.counts):
+            if count:
+                lines.append(f"{label:>10} {'#' * max(1, round(width * count / peak)):<{width}} {count}")
+        return "\n".join(lines)
+
+def start_in_process_store(host: str = "127.0.0.1") -> str:
+    # Builds the DocumentStore from pipeline.py inside this process and serves it on a free
+    # loopback port, so no separate server.py is needed
+    from pathway.xpacks.llm.servers import DocumentStoreServer
+    from pipeline import store
+
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        port = probe.getsockname()[1]
+    DocumentStoreServer(host=host, port=port, document_store=store).run(threaded=True, with_cache=False)
+    base_url = f"http://{host}:{port}"
+    client = RetrieveClient(base_url, retries=0)
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        try:
+            client.session.post(base_url + "/v1/statistics", json={}, timeout=2).raise_for_status()
+            return base_url
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError("in-process DocumentStore did not come up within 300s")
+
+def run(path: str, client: RetrieveClient, output: str, concurrency: int, default_k: int = 3,
+        limit: Optional[int] = None) -> Tuple[Dict, LatencyHistogram]:
+    histogram = LatencyHistogram()
+    errors = 0
+    completed = 0
+
+    def execute(index: int, row: Dict) -> Dict:
+        start = time.perf_counter()
+        record = {"row": index, **row}
+        try:
+            record["result"] = client.retrieve(row["query"], row["k"], row["metadata_filter"], row["filepath_globpattern"])
+        except Exception as e:
+            record["error"] = str(e)
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return record
+
+    start = last_report = time.perf_counter()
+    reported = 0
+    with open(output, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+
+        def collect(done):
+            nonlocal errors, completed
+            for future in done:
+                record = future.result()
+                histogram.add(record["latency_ms"] / 1000)
+                errors += "error" in record
+                completed += 1
+                out.write(json.dumps(record) + "\n")
+
+        for index, row in enumerate(read_queries(path, default_k)):
+            if limit is not None and index >= limit:
+                break
+            if len(pending) >= 2 * concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(execute, index, row))
+
+            now = time.perf_counter()
+            if now - last_report >= 1.0:
+                print(f"[batch_query] {completed} queries, {round((completed - reported) / (now - last_report), 1)} q/s", file=sys.stderr)
+                last_report, reported = now, completed
+        collect(pending)
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "queries": completed,
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_qps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency": histogram.to_dict(),
+    }
+    return report, histogram
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every query in a queries.csv against the DocumentStore.")
+    parser.add_argument("queries", nargs="?", default="queries.csv", help="CSV produced by queryscript.py")
+    parser.add_argument("--output", default="results.jsonl", help="one JSON line per query with its results")
+    parser.add_argument("--report", help="optional path for the JSON throughput/latency report")
+    parser.add_argument("--url", default=f"http://localhost:{os.environ.get('PATHWAY_PORT', 8765)}", help="server.py base URL")
+    parser.add_argument("--in-process", action="store_true", help="build the DocumentStore in this process instead of using --url")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--k", type=int, default=3, help="k for rows that leave it empty")
+    parser.add_argument("--limit", type=int, help="stop after this many queries")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    args = parser.parse_args()
+
+    base_url = start_in_process_store() if args.in_process else args.url
+    client = RetrieveClient(base_url, timeout=args.timeout, pool_size=args.concurrency)
+    report, histogram = run(args.queries, client, args.output, args.concurrency, args.k, args.limit)
+    print(histogram.render())
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.in_process:
+        # The Pathway engine thread never finishes on its own; results are already on disk
+        sys.stdout.flush()
+        os._exit(0)
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+from vector_snapshot import event_text
+
+# Time-to-first-query of server.py after a restart, with and without the embedding snapshot
+# (vector_snapshot.py). A synthetic log of --rows events is served three times: from an empty
+# snapshot directory, again after the checkpoint covered the whole log, and once more after
+# --append new rows. Each run measures how long until /v1/retrieve answers at all and until
+# the newest row of the log is the top hit, i.e. the whole log has been indexed.
+#   python -m benchmarks.cold_start --rows 5000 --append 500
+
+def write_events(path: str, start: int, count: int, template: list):
+    base = datetime(2025, 3, 22, 7, 0, 0)
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(start, start + count):
+            event = dict(template[i % len(template)])
+            event["timestamp"] = (base + timedelta(seconds=i)).isoformat()
+            if i == start + count - 1:
+                event["reading"] = f"{event['reading']} (row {i})"  # The newest row has unique text
+            f.write(json.dumps(event) + "\n")
+    return event
+
+def wait_for_checkpoint(snapshot_dir: str, data_path: str, timeout: float) -> float:
+    start = time.perf_counter()
+    size = os.path.getsize(data_path)
+    while time.perf_counter() - start < timeout:
+        try:
+            with open(os.path.join(snapshot_dir, "checkpoint.json")) as f:
+                if json.load(f)["offset"] >= size:
+                    return time.perf_counter() - start
+        except (OSError, ValueError, KeyError):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("checkpoint did not cover the log")
+
+def run_server(data_path: str, snapshot_dir: str, newest: dict, port: int, timeout: float, checkpoint: bool) -> dict:
+    env = dict(os.environ, PIPELINE_DATA_PATH=data_path, PIPELINE_SNAPSHOT_DIR=snapshot_dir,
+               PIPELINE_SNAPSHOT_SECONDS="1", PATHWAY_PORT=str(port), SERVER_MODE="dev")
+    url = f"http://127.0.0.1:{port}/v1/retrieve"
+    target = event_text(newest)
+    session = requests.Session()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "server.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"first_response_s": None, "first_query_s": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                response = session.post(url, json={"query": target, "k": 1}, timeout=5)
+            except requests.RequestException:
+                time.sleep(0.05)
+                continue
+            if response.status_code == 200:
+                elapsed = round(time.perf_counter() - start, 3)
+                result["first_response_s"] = result["first_response_s"] or elapsed
+                hits = response.json()
+                if hits and hits[0].get("text") == target:
+                    result["first_query_s"] = elapsed
+                    break
+            time.sleep(0.05)
+        if checkpoint and result["first_query_s"] is not None:
+            result["checkpoint_after_s"] = round(wait_for_checkpoint(snapshot_dir, data_path, timeout), 3)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    try:
+        with open(os.path.join(snapshot_dir, "checkpoint.json")) as f:
+            result["snapshot_rows"] = json.load(f)["rows"]
+    except (OSError, ValueError, KeyError):
+        result["snapshot_rows"] = 0
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restart time-to-first-query with and without the embedding snapshot.")
+    parser.add_argument("--template", default="simulated_data.jsonl", help="events to replay with fresh timestamps")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--append", type=int, default=500, help="rows added before the last restart")
+    parser.add_argument("--port", type=int, default=18790)
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--output", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    with open(args.template) as f:
+        template = [json.loads(line) for line in f if line.strip()]
+    workdir = tempfile.mkdtemp(prefix="cold_start_")
+    data_path = os.path.join(workdir, "events.jsonl")
+    snapshot_dir = os.path.join(workdir, "snapshot")
+    try:
+        newest = write_events(data_path, 0, args.rows, template)
+        report = {"rows": args.rows, "appended": args.append}
+        # A fresh port per run, so a socket still closing from the previous server cannot interfere
+        report["no_snapshot"] = run_server(data_path, snapshot_dir, newest, args.port, args.timeout, checkpoint=True)
+        report["snapshot"] = run_server(data_path, snapshot_dir, newest, args.port + 1, args.timeout, checkpoint=False)
+        newest = write_events(data_path, args.rows, args.append, template)
+        report["snapshot_plus_appended"] = run_server(data_path, snapshot_dir, newest, args.port + 2, args.timeout, checkpoint=False)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Tuple
+
+from llm_convo import HANDOFF_TOKENS, DigitalNeocortex
+from memory_tiers import TieredMemory
+from stub_llm import StubJiniAI
+
+# Wall-clock comparison of llm_convo.py's sequential respond() against respond_async()
+# with overlapping conversations, using the stub LLM so the numbers only reflect scheduling.
+#   python -m benchmarks.convo_fanout --events 6 --first-token 0.5 --token 0.02
+
+def make_brain(events_path: str, archive_dir: str, args) -> DigitalNeocortex:
+    client = StubJiniAI(first_token_latency=args.first_token, token_latency=args.token, reply_tokens=args.reply_tokens)
+    brain = DigitalNeocortex(events_path, client=client, agent_timeout=args.timeout, handoff_tokens=args.handoff_tokens)
+    brain.memory = TieredMemory(archive_dir=archive_dir)  # Keeps benchmark events out of the real archive
+    # The stub's echoed replies repeat across events; cache hits would hide the scheduling gain
+    for agent in (brain.llm1, brain.llm2, brain.opinionAI):
+        agent.cache = None
+    return brain
+
+def run_sequential(brain: DigitalNeocortex, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        brain.respond(query)
+    return time.perf_counter() - start
+
+async def run_async(brain: DigitalNeocortex, queries, max_in_flight: int) -> Tuple[float, float]:
+    first_token_at = []
+    start = time.perf_counter()
+
+    def on_token(agent, token):
+        if not first_token_at:
+            first_token_at.append(time.perf_counter() - start)
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def one(query):
+        async with semaphore:
+            return await brain.respond_async(query, on_token=on_token)
+
+    await asyncio.gather(*(one(query) for query in queries))
+    return time.perf_counter() - start, first_token_at[0] if first_token_at else float("nan")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=6)
+    parser.add_argument("--first-token", type=float, default=0.5, help="stub latency before the first token (s)")
+    parser.add_argument("--token", type=float, default=0.02, help="stub latency per token (s)")
+    parser.add_argument("--reply-tokens", type=int, default=30)
+    parser.add_argument("--max-in-flight", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--handoff-tokens", type=int, default=HANDOFF_TOKENS, help="Llm1 tokens before Llm2 starts; 0 waits for all")
+    args = parser.parse_args()
+
+    with open("simulated_dataM.jsonl") as f:
+        events = [json.loads(line) for line in f if line.strip()][: args.events]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        events_path = os.path.join(tmp, "events.jsonl")
+        with open(events_path, "w") as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+        queries = [json.dumps(event, indent=4) for event in events]
+
+        sequential_brain = make_brain(events_path, os.path.join(tmp, "sequential_history"), args)
+        async_brain = make_brain(events_path, os.path.join(tmp, "async_history"), args)
+        for event in events:
+            sequential_brain.process_event(event)
+            async_brain.process_event(event)
+
+        sequential = run_sequential(sequential_brain, queries)
+        concurrent, first_token = asyncio.run(run_async(async_brain, queries, args.max_in_flight))
+        for brain in (sequential_brain, async_brain):
+            brain.memory.close()  # Archive the hot tier now, not at exit after tmp is gone
+
+    print(json.dumps({
+        "events": len(queries),
+        "sequential_s": round(sequential, 3),
+        "async_s": round(concurrent, 3),
+        "speedup": round(sequential / concurrent, 2),
+        "async_first_token_s": round(first_token, 3),
+    }, indent=2))
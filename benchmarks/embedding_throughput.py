@@ -0,0 +1,54 @@
+import argparse
+import json
+import time
+
+from embedding_stage import BatchedSentenceTransformerEmbedder
+
+# Rows/sec of the ingest embedding stage when replaying simulated_data.jsonl: one
+# model call per row (the previous pipeline.py behaviour) against batched, memoized calls.
+#   python -m benchmarks.embedding_throughput --repeat 10 --batch-size 64
+
+def load_texts(path: str, repeat: int):
+    texts = []
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for _ in range(repeat):
+        for row in rows:
+            # Same document text as pipeline.py builds for the DocumentStore
+            texts.append(f"Timestamp: {row['timestamp']} | Sensor: {row['sensor']} | Reading: {row['reading']} | Intensity: {row['intensity']}")
+    return texts
+
+def per_row(embedder: BatchedSentenceTransformerEmbedder, texts) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        embedder.model.encode(text)
+    return time.perf_counter() - start
+
+def batched(embedder: BatchedSentenceTransformerEmbedder, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embedder.embed_batch(texts[i:i + batch_size])
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="simulated_data.jsonl")
+    parser.add_argument("--repeat", type=int, default=5, help="replay the file this many times")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--model", default="all-MiniLM-L12-v2")
+    args = parser.parse_args()
+
+    texts = load_texts(args.data, args.repeat)
+    embedder = BatchedSentenceTransformerEmbedder(model=args.model, max_batch_size=args.batch_size)
+    embedder.model.encode(texts[:8])  # Warm up
+
+    single = per_row(embedder, texts)
+    grouped = batched(embedder, texts, args.batch_size)
+    print(json.dumps({
+        "rows": len(texts),
+        "per_row_rows_per_s": round(len(texts) / single, 1),
+        "batched_rows_per_s": round(len(texts) / grouped, 1),
+        "speedup": round(single / grouped, 2),
+        "memo_hits": embedder.memo_hits,
+        "encoded": embedder.encoded,
+    }, indent=2))
@@ -0,0 +1,408 @@
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.retriever_report import latency_summary, load_queries
+from stub_llm import StubJiniAI
+from vector_snapshot import event_text
+
+# End-to-end benchmark, from a sensor write to the first token of the answer that uses it.
+#
+# Pipeline phase: server.py serves a fresh log while script.py appends to it at --rate
+# events/s for --duration seconds. Meanwhile one thread queries /v1/retrieve (up to --qps), and
+# another repeatedly takes the newest line of the log and polls until that exact document
+# is retrievable. Ingest throughput comes from the server's ingest.rows counter (tracing.py,
+# read from METRICS_PORT).
+#
+# Agent phase: each DigitalNeocortex variant tails its own log, which script.py or
+# script1.py (whichever schema the variant reads) fills at --agent-rate, and answers
+# through the stub LLM (stub_llm.py) with scripted latency. Each cycle mirrors the variant's
+# run() loop up to the first answer. main.py's follow-up turn is not timed.
+#
+# The log is timed from the side: a thread polls the file every 2 ms and stamps every line
+# when it first appears, so the simulators need no changes. Latencies are in ms. Throughputs
+# end in _per_s. With --baseline, metrics that got worse by more than --tolerance compared
+# with an earlier report are listed under "regressions".
+#   python -m benchmarks.end_to_end --rate 200 --duration 30 --output e2e.json
+#   python -m benchmarks.end_to_end --skip-pipeline --agents main1 llm_convo --baseline e2e.json
+
+SIMULATORS = {"sensor": "script.py", "story": "script1.py"}
+AGENTS = {"main": "sensor", "main1": "story", "main12": "story", "llm_convo": "story"}  # Module -> log schema
+
+def event_key(event: Dict) -> str:
+    return json.dumps(event, sort_keys=True)
+
+def summarize(seconds: List[float]) -> Optional[Dict]:
+    return {"count": len(seconds), **latency_summary(seconds)} if seconds else None
+
+class ArrivalClock:
+    def __init__(self, path: str, keep: bool = True, skip_existing: bool = False, interval: float = 0.002):
+        self.path = path
+        self.keep = keep  # Remember every line, not just the newest
+        self.skip_existing = skip_existing
+        self.interval = interval
+        self.arrivals: Dict[str, float] = {}
+        self.latest: Optional[Tuple[Dict, float]] = None
+        self.lines = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "ArrivalClock":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def arrival(self, event: Dict) -> Optional[float]:
+        return self.arrivals.get(event_key(event))
+
+    def _run(self):
+        partial = b""
+        with open(self.path, "rb") as f:
+            if self.skip_existing:
+                f.seek(0, os.SEEK_END)
+            while not self._stop.is_set():
+                data = f.read()
+                if not data:
+                    time.sleep(self.interval)
+                    continue
+                now = time.perf_counter()
+                lines = (partial + data).split(b"\n")
+                partial = lines.pop()
+                for line in lines:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if self.keep:
+                        self.arrivals[event_key(event)] = now
+                    self.latest = (event, now)
+                    self.lines += 1
+
+def start_simulator(source: str, path: str, rate: float, seed: int, duration: Optional[float] = None,
+                    events: Optional[int] = None) -> subprocess.Popen:
+    command = [sys.executable, SIMULATORS[source], "--output", path, "--rate", str(rate), "--workers", "1",
+               "--seed", str(seed)]
+    if duration:
+        command += ["--duration", str(duration)]
+    if events:
+        command += ["--events", str(events)]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+def simulator_summary(process: subprocess.Popen, timeout: float) -> Dict:
+    out, _ = process.communicate(timeout=timeout)
+    summaries = [line for line in out.splitlines() if line.startswith("{")]
+    return json.loads(summaries[-1]) if summaries else {}
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+# --- Pipeline phase ---
+
+def server_metrics(port: int) -> Dict:
+    return requests.get(f"http://127.0.0.1:{port}/metrics.json", timeout=5).json()
+
+def wait_for(check: Callable[[], bool], timeout: float, interval: float = 0.1) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    return False
+
+def run_pipeline(args, workdir: str) -> Dict:
+    data_path = os.path.join(workdir, "events.jsonl")
+    if args.seed_rows:
+        simulator_summary(start_simulator("sensor", data_path, 0, args.seed, events=args.seed_rows), args.timeout)
+    else:
+        open(data_path, "w").close()
+    seeded = count_lines(data_path)
+    env = dict(os.environ, PIPELINE_DATA_PATH=data_path, PIPELINE_SNAPSHOT_DIR="", PATHWAY_CACHE_DIR=os.path.join(workdir, "cache"),
+               PATHWAY_PORT=str(args.port), METRICS_PORT=str(args.metrics_port), SERVER_MODE=args.server_mode, TRACING="on")
+    url = f"http://127.0.0.1:{args.port}/v1/retrieve"
+    ingested = lambda: server_metrics(args.metrics_port)["counters"].get("ingest.rows", 0)
+    session = requests.Session()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "server.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for(lambda: session.post(url, json={"query": "status", "k": 1}, timeout=5).status_code == 200, args.timeout):
+            raise TimeoutError("server.py did not start answering")
+        startup = time.perf_counter() - start
+        if not wait_for(lambda: ingested() >= seeded, args.timeout):
+            raise TimeoutError("server.py did not index the seed rows")
+        rows_before = ingested()
+
+        stop = threading.Event()
+        retrieval: List[float] = []
+        lags: List[float] = []
+        missed = [0]
+        clock = ArrivalClock(data_path, keep=False, skip_existing=True).start()
+
+        def query_loop():
+            queries = load_queries(args.queries)
+            query_session = requests.Session()
+            i = 0
+            while not stop.is_set():
+                began = time.perf_counter()
+                try:
+                    response = query_session.post(url, json={"query": queries[i % len(queries)], "k": args.k}, timeout=30)
+                    if response.status_code == 200:
+                        retrieval.append(time.perf_counter() - began)
+                except requests.RequestException:
+                    pass
+                i += 1
+                stop.wait(max(0.0, 1 / args.qps - (time.perf_counter() - began)))
+
+        def probe_loop():
+            probe_session = requests.Session()
+            probed = None
+            while not stop.is_set():
+                latest = clock.latest
+                if latest is None or latest[0] is probed:
+                    stop.wait(0.01)
+                    continue
+                probed, arrived = latest
+                text = event_text(probed)
+                # The filter narrows the candidates to a handful of rows, so the exact document is
+                # found even where the model barely separates near-identical events
+                metadata = probed["metadata"]
+                payload = {"query": text, "k": 10, "metadata_filter":
+                           f"device_id == `\"{metadata['device_id']}\"` && location == `\"{metadata['location']}\"`"}
+                while True:
+                    try:
+                        hits = probe_session.post(url, json=payload, timeout=30).json()
+                    except (requests.RequestException, ValueError):
+                        hits = []
+                    if any(hit.get("text") == text for hit in hits):
+                        lags.append(time.perf_counter() - arrived)
+                        break
+                    if time.perf_counter() - arrived > args.probe_timeout or stop.is_set():
+                        missed[0] += 1
+                        break
+                    time.sleep(0.01)
+                stop.wait(args.probe_interval)
+
+        threads = [threading.Thread(target=query_loop, daemon=True), threading.Thread(target=probe_loop, daemon=True)]
+        for thread in threads:
+            thread.start()
+        load_start = time.perf_counter()
+        written = simulator_summary(start_simulator("sensor", data_path, args.rate, args.seed + 1, duration=args.duration),
+                                    args.duration + args.timeout)
+        load_seconds = time.perf_counter() - load_start
+        rows_during_load = ingested() - rows_before
+        caught_up = wait_for(lambda: ingested() - rows_before >= written.get("events", 0), args.timeout, interval=0.05)
+        drain_seconds = time.perf_counter() - load_start
+        stop.set()
+        for thread in threads:
+            thread.join()
+        clock.stop()
+        metrics = server_metrics(args.metrics_port)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    rows = metrics["counters"].get("ingest.rows", 0) - rows_before
+    return {
+        "server_mode": args.server_mode,
+        "seed_rows": seeded,
+        "startup_s": round(startup, 3),
+        "target_rate": args.rate,
+        "written_rows": written.get("events", 0),
+        "written_rows_per_s": written.get("events_per_s", 0.0),
+        "ingested_rows": rows,
+        "caught_up": caught_up,
+        # Rows indexed while the simulator ran, and all of them by the time the index caught up
+        "ingest_rows_per_s": round(rows_during_load / load_seconds, 1),
+        "drained_rows_per_s": round(rows / drain_seconds, 1),
+        "searchable_lag": summarize(lags),
+        "searchable_missed": missed[0],
+        "retrieval": summarize(retrieval),
+        "stages": metrics["latency"],
+    }
+
+# --- Agent phase ---
+
+class TimedStub(StubJiniAI):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.call_times: List[float] = []
+
+    def reply_tokens(self, prompt: str) -> List[str]:
+        self.call_times.append(time.perf_counter())  # Called as a completion request arrives
+        return super().reply_tokens(prompt)
+
+def make_agent(name: str, path: str, stub: StubJiniAI, archive_dir: str):
+    from memory_tiers import TieredMemory
+
+    brain = importlib.import_module(name).DigitalNeocortex(path)
+    brain.memory = TieredMemory(archive_dir=archive_dir)
+    for attr in ("jini_client", "llm1", "llm2", "opinionAI"):
+        client = getattr(brain, attr, None)
+        if client is not None:
+            client.client = stub
+    return brain
+
+def next_events(brain, timeout: float) -> List[Dict]:
+    scheduler = getattr(brain.sensors, "scheduler", None)
+    if scheduler is not None:
+        return scheduler.next_batch(timeout)
+    deadline = time.monotonic() + timeout  # main12.py only polls its tail
+    while time.monotonic() < deadline:
+        events = brain.sensors.get_new_events()
+        if events:
+            return events
+        time.sleep(0.05)
+    return []
+
+def answer(name: str, brain, events: List[Dict], on_token: Callable[[str], None]):
+    if name == "llm_convo":
+        query = brain.generate_query(events)
+        return asyncio.run(brain.respond_async(query, on_token=lambda agent, token: on_token(token), events=events))
+    if name == "main12":
+        return brain.respond(brain.generate_query(), on_token=lambda agent, token: on_token(token))
+    return brain.respond(brain.generate_query(events), on_token=on_token, events=events)
+
+def run_agent(name: str, args, workdir: str) -> Dict:
+    path = os.path.join(workdir, f"{name}.jsonl")
+    open(path, "w").close()
+    stub = TimedStub(args.first_token, args.token, args.reply_tokens)
+    try:
+        brain = make_agent(name, path, stub, os.path.join(workdir, f"{name}_history"))
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    clock = ArrivalClock(path).start()
+    simulator = start_simulator(AGENTS[name], path, args.agent_rate, args.seed, duration=args.agent_duration)
+    pickup: List[float] = []
+    prompt_build: List[float] = []
+    freshness: List[float] = []
+    cycles = answered = 0
+    deadline = time.perf_counter() + args.agent_duration
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while time.perf_counter() < deadline:
+            events = next_events(brain, timeout=0.5)
+            if not events:
+                continue
+            started = time.perf_counter()
+            for event in events:
+                brain.process_event(event)
+            calls = len(stub.call_times)
+            first_token: List[float] = []
+            answer(name, brain, events, lambda token: first_token or first_token.append(time.perf_counter()))
+            cycles += 1
+            answered += len(events)
+            if len(stub.call_times) > calls:
+                prompt_build.append(stub.call_times[calls] - started)
+            arrivals = [arrived for arrived in map(clock.arrival, events) if arrived is not None]
+            pickup.extend(started - arrived for arrived in arrivals)
+            if first_token:
+                freshness.extend(first_token[0] - arrived for arrived in arrivals)
+    written = simulator_summary(simulator, args.timeout)
+    clock.stop()
+    brain.memory.close()
+    return {
+        "source": AGENTS[name],
+        "written_events": written.get("events", 0),
+        "answered_events": answered,
+        "cycles": cycles,
+        "llm_calls": stub.calls,
+        "pickup": summarize(pickup),  # Line written -> agent starts on its batch
+        "prompt_build": summarize(prompt_build),  # Batch picked up -> first completion request
+        "freshness": summarize(freshness),  # Line written -> first answer token
+    }
+
+# --- Report comparison ---
+
+def flatten(report: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """Metrics more than `tolerance` (a fraction) worse than in `baseline`."""
+    previous = flatten(baseline)
+    regressions = []
+    for metric, value in flatten(report).items():
+        before = previous.get(metric)
+        # Server stage quantiles are histogram bucket bounds, too coarse to compare at 10%
+        if not before or not (metric.endswith("_ms") or metric.endswith("_per_s")) or ".stages." in metric:
+            continue
+        change = (value - before) / before
+        worse = -change if metric.endswith("_per_s") else change
+        if worse > tolerance:
+            regressions.append({"metric": metric, "baseline": before, "current": value, "change": round(change, 3)})
+    return regressions
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end latency and throughput from sensor write to LLM answer.")
+    parser.add_argument("--rate", type=float, default=200, help="events/s appended while the pipeline is measured")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of pipeline load")
+    parser.add_argument("--seed-rows", type=int, default=1000, help="rows in the log before server.py starts")
+    parser.add_argument("--server-mode", choices=["dev", "production"], default="dev")
+    parser.add_argument("--port", type=int, default=18870)
+    parser.add_argument("--metrics-port", type=int, default=18879)
+    parser.add_argument("--queries", default="queries.csv", help="CSV produced by queryscript.py")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--qps", type=float, default=20, help="background retrieval rate during the load")
+    parser.add_argument("--probe-interval", type=float, default=0.5, help="seconds between searchable-lag probes")
+    parser.add_argument("--probe-timeout", type=float, default=30)
+    parser.add_argument("--agents", nargs="*", choices=sorted(AGENTS), default=["main", "main1", "llm_convo"])
+    parser.add_argument("--agent-rate", type=float, default=2, help="events/s appended to each agent's log")
+    parser.add_argument("--agent-duration", type=float, default=20)
+    parser.add_argument("--first-token", type=float, default=0.3, help="stub latency before the first token (s)")
+    parser.add_argument("--token", type=float, default=0.01, help="stub latency per token (s)")
+    parser.add_argument("--reply-tokens", type=int, default=30)
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative slowdown before a metric is reported")
+    parser.add_argument("--output", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="end_to_end_")
+    # Keep the agents' archives and the stub's repeated replies out of the repo and the cache
+    os.environ.setdefault("MEMORY_ARCHIVE_DIR", os.path.join(workdir, "history"))
+    os.environ["LLM_CACHE"] = "off"
+    report = {"revision": git_revision(), "config": vars(args)}
+    try:
+        if not args.skip_pipeline:
+            report["pipeline"] = run_pipeline(args, workdir)
+        report["agents"] = {name: run_agent(name, args, workdir) for name in args.agents}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
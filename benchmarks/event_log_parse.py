@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from event_log import EventLogReader, EventLogWriter, schema_for
+
+# Parse throughput of the columnar event log against json.loads on the same events.
+#   python -m benchmarks.event_log_parse --data simulated_data.jsonl --repeat 2000
+
+def _get_json(line: str, dotted: str) -> float:
+    value = json.loads(line)
+    for part in dotted.split("."):
+        value = value[part]
+    return value
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="simulated_data.jsonl")
+    parser.add_argument("--repeat", type=int, default=1000, help="replay the file this many times")
+    parser.add_argument("--column", help="numeric column to aggregate (default: first float column)")
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        lines = [line for line in f if line.strip()] * args.repeat
+    events = [json.loads(line) for line in lines[: len(lines) // args.repeat]] * args.repeat
+    schema = schema_for(events[0])
+    column = args.column or next(name for name, kind in schema if kind == "f8")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.evlog")
+        with EventLogWriter(path, schema) as writer:
+            writer.write_many(events)
+
+        json_rows, _ = timed(lambda: [json.loads(line) for line in lines])
+        json_column, _ = timed(lambda: sum(_get_json(line, column) for line in lines))
+        reader_open, reader = timed(lambda: EventLogReader(path))
+        evlog_rows, _ = timed(lambda: list(reader))
+        evlog_column, _ = timed(lambda: float(reader.column(column).sum()))
+        sizes = {"jsonl_bytes": sum(len(line) for line in lines), "evlog_bytes": os.path.getsize(path) + os.path.getsize(path + ".dict")}
+
+    rows = len(lines)
+    print(json.dumps({
+        "rows": rows,
+        "column": column,
+        "json_loads_rows_per_s": round(rows / json_rows),
+        "evlog_rows_per_s": round(rows / evlog_rows),
+        "json_column_scan_rows_per_s": round(rows / json_column),
+        "evlog_column_scan_rows_per_s": round(rows / max(evlog_column, 1e-9)),
+        "evlog_open_ms": round(reader_open * 1000, 3),
+        **sizes,
+    }, indent=2))
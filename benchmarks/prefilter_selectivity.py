@@ -0,0 +1,100 @@
+import argparse
+import json
+import time
+
+import jmespath
+import numpy as np
+
+from benchmarks.retriever_report import latency_summary
+from prefilter_index import PrefilterVectorIndex, _glob_options
+
+# Query latency of RETRIEVER_MODE=prefilter against scoring every vector and filtering the
+# ranked list afterwards, for metadata filters that keep ~50% down to ~0.1% of the rows.
+# Both sides return identical results; the report includes the check.
+#   python -m benchmarks.prefilter_selectivity --rows 100000 --queries 200
+
+def build_rows(rows: int, dimensions: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((rows, dimensions), dtype=np.float32)
+    metadata = [
+        {
+            # 2 locations, so each keeps ~50% of the rows
+            "location": "home" if i % 2 else "office",
+            # 1000 devices, ~0.1% each; device_id % 10 / % 100 give the 10% and 1% groups
+            "device_id": f"device_{i % 1000}",
+            "zone": f"zone_{i % 10}",
+            "room": f"room_{i % 100}",
+            "battery_level": int(rng.integers(0, 101)),
+        }
+        for i in range(rows)
+    ]
+    return vectors, metadata
+
+FILTERS = {
+    "50%": "(location == 'home')",
+    "10%": "(zone == 'zone_3')",
+    "1%": "(room == 'room_42')",
+    "0.1%": "(device_id == 'device_7')",
+    "~5% (range)": "(battery_level < `5`)",
+    "~0.5% (eq + range)": "(zone == 'zone_3' && battery_level >= `95`)",
+}
+
+def post_filter_search(vectors: np.ndarray, metadata, query: np.ndarray, k: int, metadata_filter: str):
+    # The baseline: rank every row, then walk the ranking until k rows pass the filter
+    scores = vectors @ (query / np.linalg.norm(query))
+    results = []
+    for i in np.argsort(-scores, kind="stable"):
+        if jmespath.search(metadata_filter, metadata[i], options=_glob_options) is True:
+            results.append((int(i), float(scores[i]) - 1.0))
+            if len(results) == k:
+                break
+    return results
+
+def run(rows: int, dimensions: int, queries: int, k: int, seed: int = 0):
+    vectors, metadata = build_rows(rows, dimensions, seed)
+    index = PrefilterVectorIndex(dimensions, reserved_space=rows)
+    start = time.perf_counter()
+    for i in range(rows):
+        index.add(i, vectors[i], metadata[i])
+    build_seconds = time.perf_counter() - start
+    normalized = index.vectors[:rows]
+
+    query_vectors = np.random.default_rng(seed + 1).standard_normal((queries, dimensions), dtype=np.float32)
+    report = {"rows": rows, "dimensions": dimensions, "queries": queries, "k": k,
+              "index_build_s": round(build_seconds, 3), "filters": {}}
+    for label, metadata_filter in FILTERS.items():
+        matching = sum(jmespath.search(metadata_filter, m, options=_glob_options) is True for m in metadata)
+        baseline, prefilter, identical = [], [], True
+        for query in query_vectors:
+            t0 = time.perf_counter()
+            expected = post_filter_search(normalized, metadata, query, k, metadata_filter)
+            t1 = time.perf_counter()
+            found = index.search(query, k, metadata_filter)
+            t2 = time.perf_counter()
+            baseline.append(t1 - t0)
+            prefilter.append(t2 - t1)
+            identical = identical and [key for key, _ in expected] == [key for key, _ in found]
+        report["filters"][label] = {
+            "metadata_filter": metadata_filter,
+            "selectivity": round(matching / rows, 5),
+            "post_filter": latency_summary(baseline),
+            "prefilter": latency_summary(prefilter),
+            "speedup_p50": round(latency_summary(baseline)["p50_ms"] / max(latency_summary(prefilter)["p50_ms"], 1e-6), 1),
+            "identical_results": identical,
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of metadata pre-filtering at different filter selectivities.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=384, help="all-MiniLM-L12-v2 produces 384")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.dimensions, args.queries, args.k)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,95 @@
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import requests
+
+# Recall-vs-latency report for the retriever modes in pipeline.py.
+#
+# Start two servers over the same JSONL feed, one exact and one approximate:
+#   RETRIEVER_MODE=brute_force PATHWAY_PORT=8765 python server.py
+#   RETRIEVER_MODE=hnsw        PATHWAY_PORT=8766 python server.py
+# then run:
+#   python -m benchmarks.retriever_report --candidate http://localhost:8766
+
+DEFAULT_QUERIES = [
+    "Recall the most recent sensor interactions at home",
+    "What are the current sensor readings at home?",
+    "How many sensor events occurred in the last hour?",
+    "anxious emotion in the park",
+    "thunder rumbling on the street",
+    "fresh coffee at the office",
+]
+
+def load_queries(path: str) -> List[str]:
+    # Reuses the queries.csv layout written by queryscript.py
+    if not path or not os.path.exists(path):
+        return DEFAULT_QUERIES
+    with open(path, newline="") as csvfile:
+        return [row["query"] for row in csv.DictReader(csvfile) if row.get("query")]
+
+def retrieve(session: requests.Session, base_url: str, query: str, k: int) -> Tuple[List[Dict], float]:
+    start = time.perf_counter()
+    response = session.post(f"{base_url}/v1/retrieve", json={"query": query, "k": k}, timeout=30)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return response.json(), elapsed
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def latency_summary(latencies: List[float]) -> Dict:
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+    }
+
+def run_report(baseline: str, candidate: str, queries: List[str], k: int, repeats: int) -> Dict:
+    session = requests.Session()
+    baseline_latencies, candidate_latencies, recalls = [], [], []
+
+    for query in queries:
+        for _ in range(repeats):
+            exact, exact_time = retrieve(session, baseline, query, k)
+            approx, approx_time = retrieve(session, candidate, query, k)
+            baseline_latencies.append(exact_time)
+            candidate_latencies.append(approx_time)
+
+            # Documents are keyed by their text, which embeds the unique timestamp
+            truth = {doc["text"] for doc in exact}
+            found = {doc["text"] for doc in approx}
+            recalls.append(len(truth & found) / len(truth) if truth else 1.0)
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        "repeats": repeats,
+        "recall_at_k": round(statistics.fmean(recalls), 4),
+        "min_recall_at_k": round(min(recalls), 4),
+        "baseline": {"url": baseline, **latency_summary(baseline_latencies)},
+        "candidate": {"url": candidate, **latency_summary(candidate_latencies)},
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an ANN retriever against the brute-force baseline.")
+    parser.add_argument("--baseline", default="http://localhost:8765", help="server running RETRIEVER_MODE=brute_force")
+    parser.add_argument("--candidate", required=True, help="server running RETRIEVER_MODE=hnsw or lsh")
+    parser.add_argument("--queries", default="queries.csv", help="CSV produced by queryscript.py")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    report = run_report(args.baseline, args.candidate, load_queries(args.queries), args.k, args.repeats)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from event_log import EventLogReader, EventLogWriter, schema_for
+from rule_engine import EventColumns, Rule, RuleEngine, load_rules
+
+# Predictor rule scoring: per-event evaluation against the columnar batch path, on dict
+# events and on an .evlog file, with the built-in rules plus --extra-rules synthetic ones.
+#   python -m benchmarks.rule_scoring --data simulated_data.jsonl --repeat 10000
+
+def synthetic_rules(count: int):
+    """Rules over thresholds, metadata and readings that rarely all hold, so most rows test them all."""
+    rules = []
+    for i in range(count):
+        rules.append(Rule.from_dict({
+            "prediction": f"synthetic {i}",
+            "when": {
+                "intensity": {">": 0.5 + (i % 50) / 100},
+                "metadata.battery_level": {"<": 5 + i % 20},
+                "metadata.location": {"in": ["home", "office", "park"][: 1 + i % 3]},
+                "reading": {"!=": f"reading {i}"},
+            },
+        }))
+    return rules
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="simulated_data.jsonl")
+    parser.add_argument("--repeat", type=int, default=1000, help="replay the file this many times")
+    parser.add_argument("--extra-rules", type=int, default=20)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        events = [json.loads(line) for line in f if line.strip()] * args.repeat
+    engine = RuleEngine(load_rules() + synthetic_rules(args.extra_rules))
+
+    per_event, expected = timed(lambda: [engine.predict(event) for event in events])
+    batch, predictions = timed(lambda: engine.predict_many(events))
+    assert predictions == expected, "batch predictions differ from per-event ones"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.evlog")
+        with EventLogWriter(path, schema_for(events[0])) as writer:
+            writer.write_many(events)
+        reader = EventLogReader(path)
+        evlog, counts = timed(lambda: engine.counts(EventColumns.from_log(reader, engine.fields)))
+
+    rows = len(events)
+    report = {
+        "rows": rows,
+        "rules": len(engine.rules),
+        "per_event_rows_per_s": round(rows / per_event),
+        "batch_rows_per_s": round(rows / batch),
+        "evlog_rows_per_s": round(rows / evlog),
+        "batch_speedup": round(per_event / batch, 1),
+        "predictions": counts,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
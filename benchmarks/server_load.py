@@ -0,0 +1,59 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+import requests
+
+from benchmarks.retriever_report import latency_summary, load_queries
+
+# Load test for the /v1/retrieve endpoint served by server.py, at increasing concurrency.
+#   SERVER_MODE=production python server.py
+#   python -m benchmarks.server_load --concurrency 1 4 16 64 --requests 400
+
+def run_level(url: str, queries, k: int, concurrency: int, total: int) -> dict:
+    sessions = [requests.Session() for _ in range(concurrency)]
+    payloads = list(islice(cycle(queries), total))
+    errors = []
+
+    def worker(index: int):
+        session = sessions[index % concurrency]
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json={"query": payloads[index], "k": k}, timeout=60)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            errors.append(str(e))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(worker, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": len(errors),
+        "throughput_rps": round(total / elapsed, 2),
+        **latency_summary(latencies),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8765/v1/retrieve")
+    parser.add_argument("--queries", default="queries.csv", help="CSV produced by queryscript.py")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--output", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    report = [run_level(args.url, queries, args.k, level, args.requests) for level in args.concurrency]
+    for row in report:
+        print(f"c={row['concurrency']:>3}  rps={row['throughput_rps']:>8}  p50={row['p50_ms']:>8}ms  p99={row['p99_ms']:>8}ms  errors={row['errors']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,62 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.retriever_report import latency_summary
+from time_index import TimePartitionedIndex
+
+# Query latency and partitions touched by the time-partitioned index (time_index.py) as the
+# retained history grows from days to months. Each retention is filled with synthetic events
+# at a fixed rate, then queried three ways: a full-history scan, a last-hour window and a
+# recency-weighted query (1h half-life) with no window at all.
+#   python -m benchmarks.time_window_scaling --days 7 30 90 --interval 30
+
+def build(days: int, interval: float, dimensions: int, seed: int = 0) -> TimePartitionedIndex:
+    rng = np.random.default_rng(seed)
+    rows = int(days * 86400 / interval)
+    vectors = rng.standard_normal((rows, dimensions), dtype=np.float32)
+    index = TimePartitionedIndex(dimensions)
+    end = 1_742_630_000.0
+    for i in range(rows):
+        index.add(i, vectors[i], end - (rows - i) * interval, i)
+    return index
+
+def measure(index: TimePartitionedIndex, queries: np.ndarray, k: int, **window) -> dict:
+    latencies = []
+    scanned = index.partitions_scanned
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k, **window)
+        latencies.append(time.perf_counter() - start)
+    return {
+        **latency_summary(latencies),
+        "partitions_scanned_per_query": round((index.partitions_scanned - scanned) / len(queries), 1),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-window and recency query cost against retained history.")
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30])
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between synthetic events")
+    parser.add_argument("--dimensions", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    queries = np.random.default_rng(1).standard_normal((args.queries, args.dimensions), dtype=np.float32)
+    report = {"interval_s": args.interval, "dimensions": args.dimensions, "k": args.k, "retention": {}}
+    for days in args.days:
+        index = build(days, args.interval, args.dimensions)
+        report["retention"][f"{days}d"] = {
+            "events": len(index),
+            "partitions": len(index.starts),
+            "full_scan": measure(index, queries, args.k),
+            "last_hour": measure(index, queries, args.k, start=index.newest - 3600),
+            "recency_half_life_1h": measure(index, queries, args.k, half_life=3600),
+        }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
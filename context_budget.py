@@ -0,0 +1,238 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tracing
+
+PROMPT_EVENT_TOKENS = int(os.environ.get("PROMPT_EVENT_TOKENS", 600))  # sensor events per LLM call
+PROMPT_MEMORY_TOKENS = int(os.environ.get("PROMPT_MEMORY_TOKENS", 300))  # recalled memories per LLM call
+PROMPT_TOKENIZER = os.environ.get("PROMPT_TOKENIZER", "cl100k_base")  # tiktoken encoding, when installed
+
+# --- Prompt context budgeter ---
+# Turns sensor events into a dense, token-bounded block for the LLM prompt instead of one
+# JSON document per event. Each event becomes one line ("07:33:20 auditory: cars honking |
+# location=park ..."); events repeating the same readings (every text field except the
+# timestamp, event_id and device_id) are folded into one line with a count, time span and
+# numeric ranges. Lines are kept newest first until the token budget is spent, and whatever
+# does not fit is summarized in a single line of counts. Tokens are counted with tiktoken
+# when it is installed and its encoding is available, otherwise estimated. Every call
+# reports how many tokens the plain JSON would have cost.
+
+_SKIP = {"timestamp", "event_id"}
+_UNGROUPED = {"device_id"}  # Differs on nearly every event; listed per line instead
+_ESTIMATE_RE = re.compile(r"\w{1,4}|[^\w\s]")
+SUMMARY_RESERVE = 64  # Tokens held back for the overflow summary line
+
+def _load_tokenizer(name: str) -> Tuple[Callable[[str], int], str]:
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(name)
+        encoding.encode("warm up")  # Fails here if the BPE file cannot be fetched
+        return (lambda text: len(encoding.encode(text, disallowed_special=()))), f"tiktoken:{name}"
+    except Exception:
+        # Roughly one token per word piece of up to four characters or punctuation mark
+        return (lambda text: len(_ESTIMATE_RE.findall(text))), "estimate"
+
+def _number(value: float) -> str:
+    return f"{value:.4g}"
+
+def _clock(timestamp) -> str:
+    try:
+        return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).strftime("%H:%M:%S")
+    except ValueError:
+        return str(timestamp)
+
+def _flatten(event: Dict) -> Dict:
+    flat = {}
+    for key, value in event.items():
+        if key in _SKIP:
+            continue
+        if isinstance(value, dict):
+            flat.update((k, v) for k, v in value.items() if k not in _SKIP)
+        else:
+            flat[key] = value
+    return flat
+
+@dataclass
+class ContextPack:
+    text: str
+    tokens: int
+    raw_tokens: int
+    events: int
+    shown_events: int
+    summarized_events: int
+    tokenizer: str
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+    def describe(self) -> str:
+        return (f"{self.events} events in {self.tokens} tokens ({self.tokenizer}), "
+                f"saved {self.saved_tokens} of {self.raw_tokens}; {self.summarized_events} summarized")
+
+class _Group:
+    __slots__ = ("text_fields", "first", "last", "count", "devices", "numbers", "order")
+
+    def __init__(self, text_fields: Tuple, order: int):
+        self.text_fields = text_fields
+        self.first = self.last = None
+        self.count = 0
+        self.devices: List[str] = []
+        self.numbers: Dict[str, List[float]] = {}
+        self.order = order
+
+    def add(self, event: Dict, flat: Dict, order: int):
+        timestamp = event.get("timestamp")
+        self.first = self.first if self.first is not None else timestamp
+        self.last = timestamp
+        self.order = order
+        self.count += 1
+        device = flat.get("device_id")
+        if device is not None and str(device) not in self.devices:
+            self.devices.append(str(device))
+        for key, value in flat.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.numbers.setdefault(key, []).append(float(value))
+
+    def line(self) -> str:
+        fields = dict(self.text_fields)
+        head = _clock(self.last) if self.count == 1 else f"{_clock(self.first)}-{_clock(self.last)} x{self.count}"
+        sensor, reading = fields.pop("sensor", None), fields.pop("reading", None)
+        parts = [f"{sensor}: {reading}" if sensor is not None and reading is not None else None]
+        parts.append(" ".join(f"{key}={value}" for key, value in fields.items()) or None)
+        if self.devices:
+            parts.append(self.devices[0] if len(self.devices) == 1 else f"{len(self.devices)} devices")
+        numbers = []
+        for key, values in self.numbers.items():
+            low, high = min(values), max(values)
+            numbers.append(f"{key}={_number(low)}" if low == high else f"{key}={_number(low)}..{_number(high)}")
+        parts.append(" ".join(numbers) or None)
+        return f"{head} " + " | ".join(part for part in parts if part)
+
+class ContextBudgeter:
+    def __init__(self, event_tokens: int = PROMPT_EVENT_TOKENS, memory_tokens: int = PROMPT_MEMORY_TOKENS,
+                 tokenizer: str = PROMPT_TOKENIZER):
+        self.event_tokens = event_tokens
+        self.memory_tokens = memory_tokens
+        self.count_tokens, self.tokenizer = _load_tokenizer(tokenizer)
+        self._lock = threading.Lock()  # main.py's LLM workers pack concurrently
+        self.calls = 0
+        self.raw_tokens = 0
+        self.tokens = 0
+        self.last: Optional[ContextPack] = None
+
+    def _groups(self, events: List[Dict]) -> List[_Group]:
+        groups: Dict[Tuple, _Group] = {}
+        for order, event in enumerate(events):
+            flat = _flatten(event)
+            text_fields = tuple(
+                (key, value) for key, value in flat.items()
+                if key not in _UNGROUPED and not (isinstance(value, (int, float)) and not isinstance(value, bool))
+            )
+            group = groups.get(text_fields)
+            if group is None:
+                group = groups[text_fields] = _Group(text_fields, order)
+            group.add(event, flat, order)
+        return sorted(groups.values(), key=lambda g: g.order)
+
+    def _summary(self, groups: List[_Group], top: int) -> str:
+        events = sum(group.count for group in groups)
+        counts = {}
+        for key in ("sensor", "location"):
+            counter = Counter()
+            for group in groups:
+                value = dict(group.text_fields).get(key)
+                if value is not None:
+                    counter[value] += group.count
+            if counter and top:
+                counts[key] = ", ".join(f"{value} x{count}" for value, count in counter.most_common(top))
+        span = f"{_clock(min(str(g.first) for g in groups))}-{_clock(max(str(g.last) for g in groups))}"
+        details = "; ".join(f"{key}s {value}" for key, value in counts.items())
+        return f"(+{events} earlier events {span} not shown" + (f": {details})" if details else ")")
+
+    def pack(self, events: List[Dict], budget: Optional[int] = None, baseline: Optional[str] = None) -> ContextPack:
+        """Dense text for `events` within `budget` tokens; `baseline` is the text it replaces (JSON lines by default)."""
+        with tracing.span("prompt.pack", events=len(events)) as span:
+            pack = self._pack(events, self.event_tokens if budget is None else budget, baseline)
+            span.set(tokens=pack.tokens, raw_tokens=pack.raw_tokens)
+        tracing.count("prompt.tokens", pack.tokens)
+        tracing.count("prompt.saved_tokens", pack.saved_tokens)
+        return pack
+
+    def _pack(self, events: List[Dict], budget: int, baseline: Optional[str]) -> ContextPack:
+        if baseline is None:
+            baseline = "\n".join(json.dumps(event) for event in events)
+        groups = self._groups(events)
+
+        kept: List[Tuple[str, int, int]] = []  # (line, tokens, events), newest first
+        used = 0
+        reserve = SUMMARY_RESERVE if budget > 2 * SUMMARY_RESERVE else 0
+        for index in range(len(groups) - 1, -1, -1):
+            line = groups[index].line()
+            cost = self.count_tokens(line) + 1
+            limit = budget if index == 0 else budget - reserve  # The last group needs no summary after it
+            if used + cost > limit:
+                break
+            kept.append((line, cost, groups[index].count))
+            used += cost
+
+        summary = None
+        while len(kept) < len(groups):
+            overflow = groups[:len(groups) - len(kept)]
+            for top in (3, 1, 0):
+                summary = self._summary(overflow, top)
+                cost = self.count_tokens(summary) + 1
+                if used + cost <= budget:
+                    break
+            if used + cost <= budget or not kept:
+                break
+            _, freed, _ = kept.pop()  # Give up the oldest shown line to make room for the summary
+            used -= freed
+
+        lines = ([summary] if summary else []) + [line for line, _, _ in reversed(kept)]
+        shown = sum(count for _, _, count in kept)
+        text = "\n".join(lines)
+        pack = ContextPack(
+            text=text,
+            tokens=self.count_tokens(text) if text else 0,
+            raw_tokens=self.count_tokens(baseline) if baseline else 0,
+            events=len(events),
+            shown_events=shown,
+            summarized_events=len(events) - shown,
+            tokenizer=self.tokenizer,
+        )
+        with self._lock:
+            self.calls += 1
+            self.raw_tokens += pack.raw_tokens
+            self.tokens += pack.tokens
+            self.last = pack
+        return pack
+
+    def pack_lines(self, text: str, budget: Optional[int] = None) -> ContextPack:
+        """Like pack, for newline-separated JSON events such as EpisodicMemory.retrieve_memory returns."""
+        events = []
+        for line in text.splitlines():
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(event, dict):
+                events.append(event)
+        return self.pack(events, self.memory_tokens if budget is None else budget, baseline=text)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "raw_tokens": self.raw_tokens,
+                "tokens": self.tokens,
+                "saved_tokens": max(0, self.raw_tokens - self.tokens),
+                "tokenizer": self.tokenizer,
+            }
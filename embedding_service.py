@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import tracing
+
+EMBED_SERVICE_SOCKET = os.environ.get("EMBED_SERVICE_SOCKET", "")  # Unix socket of a running service; "" loads locally
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "all-MiniLM-L12-v2")
+EMBED_DEVICE = os.environ.get("EMBED_DEVICE", "cpu")
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", 8192))
+
+# --- Shared embedding service ---
+# One resident SentenceTransformer serves every local process over a Unix socket, so
+# server.py, batch tools and the agents' response cache stop loading a model copy each.
+# Connection threads queue their texts; a single batcher thread gathers what all clients
+# queued within FLUSH_DELAY (up to EMBED_BATCH_SIZE texts), runs the model once for the
+# group and hands each client its rows. Recently embedded texts are memoized.
+# Frames are a 4-byte big-endian length followed by the payload. Requests are JSON
+# ({"texts": [...], "kwargs": {...}} or {"op": "info"}); replies are a JSON header frame,
+# then for embeddings one frame of raw float32 rows.
+# EmbeddingClient has the encode / get_sentence_embedding_dimension interface of
+# SentenceTransformer, and load_model returns one whenever EMBED_SERVICE_SOCKET names a
+# running service for the requested model, or a local model otherwise.
+#   python embedding_service.py --socket /tmp/embeddings.sock
+#   EMBED_SERVICE_SOCKET=/tmp/embeddings.sock python server.py
+
+FLUSH_DELAY = 0.002  # Seconds the first queued request waits for others to join its batch
+_LENGTH = struct.Struct(">I")
+
+def _send(sock: socket.socket, payload: bytes):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding service closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def _recv(sock: socket.socket) -> bytes:
+    return _recv_exact(sock, _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))[0])
+
+class _Request:
+    __slots__ = ("texts", "kwargs", "done", "vectors", "error")
+
+    def __init__(self, texts: List[str], kwargs: Dict):
+        self.texts = texts
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.vectors: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+
+class EmbeddingService:
+    def __init__(self, model: str = EMBED_MODEL, device: str = EMBED_DEVICE,
+                 batch_size: int = EMBED_BATCH_SIZE, cache_size: int = EMBED_CACHE_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model
+        self.model = SentenceTransformer(model, device=device)
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self.clients = 0
+        self.requests = 0
+        self.texts = 0
+        self.encoded = 0
+        self.batches = 0
+        self.memo_hits = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def embed(self, texts: List[str], kwargs: Optional[Dict] = None) -> np.ndarray:
+        """Called from connection threads; blocks until the batcher has run the request."""
+        request = _Request(texts, kwargs or {})
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.vectors
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            queued = len(group[0].texts)
+            deadline = time.monotonic() + FLUSH_DELAY
+            while queued < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                group.append(request)
+                queued += len(request.texts)
+            # Requests with different encode options cannot share a model call
+            by_options: Dict[str, List[_Request]] = {}
+            for request in group:
+                by_options.setdefault(json.dumps(request.kwargs, sort_keys=True), []).append(request)
+            for requests in by_options.values():
+                try:
+                    self._encode(requests)
+                except Exception as e:
+                    for request in requests:
+                        request.error = repr(e)
+                for request in requests:
+                    request.done.set()
+
+    def _encode(self, requests: List[_Request]):
+        kwargs = requests[0].kwargs
+        memoize = not kwargs  # Memoized vectors are only valid for the default options
+        vectors: Dict[str, np.ndarray] = {}
+        pending: List[str] = []
+        for request in requests:
+            for text in request.texts:
+                if text in vectors:
+                    continue
+                vector = self._memo.get(text) if memoize else None
+                if vector is not None:
+                    self._memo.move_to_end(text)
+                    self.memo_hits += 1
+                    vectors[text] = vector
+                else:
+                    pending.append(text)
+                    vectors[text] = None
+        if pending:
+            with tracing.span("embed.service", rows=len(pending), requests=len(requests)):
+                encoded = np.asarray(self.model.encode(pending, batch_size=self.batch_size, **kwargs), dtype=np.float32)
+            self.encoded += len(pending)
+            self.batches += 1
+            for text, vector in zip(pending, encoded):
+                vectors[text] = vector
+                if memoize:
+                    self._memo[text] = vector
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+        for request in requests:
+            self.requests += 1
+            self.texts += len(request.texts)
+            request.vectors = np.stack([vectors[text] for text in request.texts]) if request.texts \
+                else np.empty((0, self.dimensions), dtype=np.float32)
+
+    def info(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "dimensions": self.dimensions,
+            "clients": self.clients,
+            "requests": self.requests,
+            "texts": self.texts,
+            "encoded": self.encoded,
+            "batches": self.batches,
+            "memo_hits": self.memo_hits,
+        }
+
+def make_handler(service: EmbeddingService):
+    class EmbeddingHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            service.clients += 1
+            try:
+                while True:
+                    try:
+                        request = json.loads(_recv(self.request))
+                    except ConnectionError:
+                        return
+                    if request.get("op") == "info":
+                        _send(self.request, json.dumps(service.info()).encode("utf-8"))
+                        continue
+                    try:
+                        vectors = service.embed([str(text) for text in request.get("texts", [])], request.get("kwargs"))
+                    except Exception as e:
+                        _send(self.request, json.dumps({"error": str(e)}).encode("utf-8"))
+                        continue
+                    header = {"rows": int(vectors.shape[0]), "dimensions": int(vectors.shape[1])}
+                    _send(self.request, json.dumps(header).encode("utf-8"))
+                    _send(self.request, vectors.astype(np.float32, copy=False).tobytes())
+            finally:
+                service.clients -= 1
+
+    return EmbeddingHandler
+
+class UnixEmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(socket_path: str, service: EmbeddingService) -> UnixEmbeddingServer:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # Left over from a previous run
+    server = UnixEmbeddingServer(socket_path, make_handler(service))
+    os.chmod(socket_path, 0o600)  # Only processes of the same user may embed
+    return server
+
+class EmbeddingClient:
+    # One connection per calling thread, reopened once if the service restarted in between
+    def __init__(self, socket_path: str = EMBED_SERVICE_SOCKET, timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._dimensions: Optional[int] = None
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _exchange(self, sock: socket.socket, payload: bytes) -> Tuple[Dict, Optional[bytes]]:
+        _send(sock, payload)
+        header = json.loads(_recv(sock))
+        return header, (_recv(sock) if "rows" in header else None)
+
+    def _call(self, request: Dict) -> Tuple[Dict, Optional[bytes]]:
+        payload = json.dumps(request).encode("utf-8")
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                return self._exchange(sock, payload)
+            except (ConnectionError, socket.timeout):
+                sock.close()  # Stale connection; retry once on a fresh one
+        self._local.sock = None
+        sock = self._connect()
+        self._local.sock = sock
+        return self._exchange(sock, payload)
+
+    def info(self) -> Dict:
+        return self._call({"op": "info"})[0]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimensions is None:
+            self._dimensions = self.info()["dimensions"]
+        return self._dimensions
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        """Same result shape as SentenceTransformer.encode; batching happens in the service."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Options that only shape the local return value have no meaning on the wire
+        kwargs = {key: value for key, value in kwargs.items() if key not in ("convert_to_numpy", "show_progress_bar")}
+        header, data = self._call({"texts": texts, "kwargs": kwargs})
+        if "error" in header:
+            raise RuntimeError(f"embedding service: {header['error']}")
+        vectors = np.frombuffer(data, dtype=np.float32).reshape(header["rows"], header["dimensions"])
+        return vectors[0] if single else vectors
+
+def load_model(model: str = EMBED_MODEL, device: str = EMBED_DEVICE, socket_path: str = EMBED_SERVICE_SOCKET):
+    """A client of the shared service when one is running for `model`, else a local SentenceTransformer."""
+    if socket_path:
+        client = EmbeddingClient(socket_path)
+        try:
+            if client.info().get("model") == model:
+                return client
+        except OSError:
+            pass  # Service not running; fall back to a private copy of the model
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model, device=device)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve one shared embedding model over a Unix socket.")
+    parser.add_argument("--socket", default=EMBED_SERVICE_SOCKET or "/tmp/embeddings.sock")
+    parser.add_argument("--model", default=EMBED_MODEL)
+    parser.add_argument("--device", default=EMBED_DEVICE)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    service = EmbeddingService(args.model, args.device, args.batch_size)
+    server = serve(args.socket, service)
+    print(f"Serving {args.model} ({service.dimensions} dimensions) on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pathway as pw
+from pathway.xpacks.llm import embedders
+import tracing
+from embedding_service import load_model
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", 8192))
+EMBED_DEVICE = os.environ.get("EMBED_DEVICE", "cpu")
+FLUSH_DELAY = 0.002  # seconds the first queued row waits for the rest of its minibatch
+
+# --- Batched, memoizing SentenceTransformer embedder ---
+# __wrapped__ is a coroutine, so Pathway runs it on its async executor, where the calls for
+# the rows of one engine minibatch (the time window is the reader's autocommit_duration_ms)
+# are in flight together. Each call only queues its text; a flush gathers everything queued
+# on the loop, up to max_batch_size at a time, and runs the model once for the group on a
+# worker thread. Identical texts, within a batch or seen recently, are embedded only once,
+# and texts stored in an attached snapshot are not embedded at all. With a cache_strategy
+# (pipeline.py passes pw.udfs.DefaultCache), server.run(with_cache=True) also persists each
+# vector on disk, so a restarted production server does not embed repeated texts again.
+class BatchedSentenceTransformerEmbedder(embedders.BaseEmbedder):
+    def __init__(
+        self,
+        model: str = "all-MiniLM-L12-v2",
+        max_batch_size: int = EMBED_BATCH_SIZE,
+        cache_size: int = EMBED_CACHE_SIZE,
+        device: str = EMBED_DEVICE,
+        cache_strategy: Optional[pw.udfs.CacheStrategy] = None,
+        **encode_kwargs,
+    ):
+        super().__init__(cache_strategy=cache_strategy)
+        # A client of the shared embedding service when EMBED_SERVICE_SOCKET names one
+        self.model = load_model(model, device)
+        self.batch_size = max_batch_size
+        self.cache_size = cache_size
+        self.encode_kwargs = encode_kwargs
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Pending rows per event loop; each Pathway worker thread drives its own loop
+        self._queues: Dict[asyncio.AbstractEventLoop, List[Tuple[str, asyncio.Future]]] = {}
+        self._flush_handles: Dict[asyncio.AbstractEventLoop, asyncio.Handle] = {}
+        self.snapshot = None  # Optional VectorSnapshot consulted before the model (vector_snapshot.py)
+        self.memo_hits = 0
+        self.snapshot_hits = 0
+        self.encoded = 0
+        self.batches = 0
+
+    async def __wrapped__(self, input: str, **kwargs) -> np.ndarray:
+        if kwargs:
+            # Per-call encode options cannot share a batch with other rows
+            return (await asyncio.to_thread(self.embed_batch, [input], **kwargs))[0]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(loop, [])
+        queue.append((input, future))
+        if len(queue) >= self.batch_size:
+            self._flush(loop)
+        elif loop not in self._flush_handles:
+            self._flush_handles[loop] = loop.call_later(FLUSH_DELAY, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        handle = self._flush_handles.pop(loop, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self._queues.pop(loop, [])
+        if batch:
+            loop.create_task(self._encode(batch))
+
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            vectors = await asyncio.to_thread(self.embed_batch, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def cached(self, text: str) -> Optional[np.ndarray]:
+        """The vector for `text` if it is memoized, without running the model."""
+        with self._lock:
+            return self._memo.get(text)
+
+    def embed_batch(self, texts: List[str], **kwargs) -> List[np.ndarray]:
+        results: List[np.ndarray] = [None] * len(texts)
+        pending: "OrderedDict[str, List[int]]" = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                vector = self._memo.get(text)
+                if vector is None and self.snapshot is not None:
+                    vector = self.snapshot.lookup(text)
+                    if vector is not None:
+                        self.snapshot_hits += 1
+                        results[i] = vector
+                        continue
+                if vector is not None:
+                    self._memo.move_to_end(text)
+                    self.memo_hits += 1
+                    results[i] = vector
+                else:
+                    pending.setdefault(text, []).append(i)
+
+        tracing.count("embed.rows", len(texts))
+        if pending:
+            unique = list(pending.keys())
+            with tracing.span("embed.model", rows=len(unique)):
+                vectors = self.model.encode(unique, batch_size=self.batch_size, **{**self.encode_kwargs, **kwargs})
+            tracing.count("embed.encoded", len(unique))
+            with self._lock:
+                self.encoded += len(unique)
+                self.batches += 1
+                for text, vector in zip(unique, vectors):
+                    for i in pending[text]:
+                        results[i] = vector
+                    self._memo[text] = vector
+                    self._memo.move_to_end(text)
+                while len(self._memo) > self.cache_size:
+                    self._memo.popitem(last=False)
+        return results
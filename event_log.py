@@ -0,0 +1,409 @@
+import json
+import os
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# --- Columnar binary event log ---
+# An optional alternative to the .jsonl logs. The file starts with a small header holding the
+# schema, followed by fixed-width records: numbers are stored as float64/int64, timestamps
+# as int64 microseconds since the epoch, and strings as uint32 codes into an append-only
+# dictionary kept next to the log (<path>.dict, one JSON string per line). Because every
+# record has the same size, the log can be memory-mapped and read column by column.
+# Events decode to what json.loads gave the writer: float columns flag integral JSON values
+# so 0 comes back as 0, not 0.0, and anything the fixed columns cannot hold (fields outside
+# the schema, values of another type, missing fields, timestamps in other forms) is kept
+# per row as a JSON "extra" through the same dictionary. Rows of the simulators need none.
+
+MAGIC = b"EVLOG2\x00\x00"
+NULL_CODE = 0xFFFFFFFF
+EXTRA = "_extra"  # Per-row dictionary code of {"set": [[path, value], ...], "absent": [path, ...]}
+
+# Field name (dotted for nested metadata) -> column type ("f8", "i8", "ts", "str")
+SENSOR_SCHEMA: List[Tuple[str, str]] = [
+    ("timestamp", "ts"),
+    ("sensor", "str"),
+    ("reading", "str"),
+    ("intensity", "f8"),
+    ("metadata.location", "str"),
+    ("metadata.device_id", "str"),
+    ("metadata.battery_level", "f8"),
+]
+
+STORY_SCHEMA: List[Tuple[str, str]] = [
+    ("event_id", "i8"),
+    ("timestamp", "ts"),
+    ("location", "str"),
+    ("temperature", "f8"),
+    ("humidity", "f8"),
+    ("visual", "str"),
+    ("auditory", "str"),
+    ("olfactory", "str"),
+    ("gustatory", "str"),
+    ("tactile", "str"),
+    ("emotion", "str"),
+    ("metadata.device_id", "str"),
+    ("metadata.battery_level", "f8"),
+]
+
+_NUMPY_TYPES = {"f8": "<f8", "i8": "<i8", "ts": "<i8", "str": "<u4"}
+_TS_NULL = np.iinfo(np.int64).min
+_I8_NULL = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EXACT_INT = 2 ** 53  # Larger integers do not survive float64
+_ABSENT = object()
+
+def schema_for(event: Dict) -> List[Tuple[str, str]]:
+    return SENSOR_SCHEMA if "sensor" in event else STORY_SCHEMA
+
+def record_dtype(schema: List[Tuple[str, str]]) -> np.dtype:
+    # The timestamp zone flag records whether the source string carried "+00:00", and the
+    # float int flag whether the JSON value was an integer
+    fields = [(name, _NUMPY_TYPES[kind]) for name, kind in schema]
+    fields += [(f"{name}.aware", "u1") for name, kind in schema if kind == "ts"]
+    fields += [(f"{name}.int", "u1") for name, kind in schema if kind == "f8"]
+    fields.append((EXTRA, "<u4"))
+    return np.dtype(fields)
+
+def _schema_tree(schema: List[Tuple[str, str]]) -> Dict:
+    # {"timestamp": None, "metadata": {"location": None, ...}}: None marks a column
+    tree: Dict = {}
+    for name, _ in schema:
+        node = tree
+        parts = name.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = None
+    return tree
+
+def _leftovers(value: Dict, tree: Dict, path: List[str], out: List):
+    """[path, value] for every field of `value` that has no column in `tree`."""
+    for key, item in value.items():
+        if key not in tree:
+            out.append([path + [key], item])
+        elif tree[key] is not None:
+            if isinstance(item, dict):
+                _leftovers(item, tree[key], path + [key], out)
+            else:
+                out.append([path + [key], item])  # A value where the schema has an object
+
+def _get(event: Dict, parts: List[str]):
+    """The value at a field path, or _ABSENT with the shortest missing prefix."""
+    value = event
+    for depth, part in enumerate(parts):
+        if not isinstance(value, dict) or part not in value:
+            return _ABSENT, parts[: depth + 1]
+        value = value[part]
+    return value, None
+
+def _encode_timestamp(value: str) -> Optional[Tuple[int, int]]:
+    """(microseconds, aware) for a naive or UTC isoformat() string; None if it would not decode the same."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.isoformat() != value or parsed.utcoffset() not in (None, timedelta(0)):
+        return None
+    aware = parsed.tzinfo is not None
+    if not aware:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds, int(aware)
+
+def _decode_timestamps(micros: np.ndarray, aware: np.ndarray) -> List[Optional[str]]:
+    # Matches datetime.isoformat(), which drops the fraction when it is zero
+    texts = np.datetime_as_string(micros.astype("datetime64[us]"), unit="us").tolist()
+    result = []
+    for text, value, flag in zip(texts, micros.tolist(), aware.tolist()):
+        if value == _TS_NULL:
+            result.append(None)
+            continue
+        if value % 1_000_000 == 0:
+            text = text[:-7]
+        result.append(text + "+00:00" if flag else text)
+    return result
+
+def _read_header(file) -> Tuple[List[Tuple[str, str]], int]:
+    magic = file.read(len(MAGIC))
+    if magic != MAGIC:
+        if magic.startswith(b"EVLOG"):
+            raise ValueError(f"{file.name} was written by an older event_log.py; convert its source again")
+        raise ValueError(f"{file.name} is not an event log")
+    (length,) = struct.unpack("<I", file.read(4))
+    schema = [tuple(field) for field in json.loads(file.read(length))]
+    return schema, len(MAGIC) + 4 + length
+
+class EventLogWriter:
+    def __init__(self, path: str, schema: Optional[List[Tuple[str, str]]] = None):
+        self.path = path
+        self.dict_path = path + ".dict"
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "rb") as f:
+                self.schema, _ = _read_header(f)
+        else:
+            if schema is None:
+                raise ValueError("schema is required for a new event log")
+            self.schema = schema
+        self.dtype = record_dtype(self.schema)
+        self._tree = _schema_tree(self.schema)
+        self._columns = [(name, kind, name.split(".")) for name, kind in self.schema]
+        self._codes: Dict[str, int] = {}
+        if os.path.exists(self.dict_path):
+            with open(self.dict_path, "r", encoding="utf-8") as f:
+                for code, line in enumerate(f):
+                    self._codes[json.loads(line)] = code
+        self._file = open(path, "ab")
+        self._dict_file = open(self.dict_path, "a", encoding="utf-8")
+        if not exists:
+            header = json.dumps(self.schema).encode("utf-8")
+            self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+            self._file.flush()
+
+    def _code(self, value) -> int:
+        if value is None:
+            return NULL_CODE
+        value = str(value)
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._codes)
+            self._codes[value] = code
+            self._dict_file.write(json.dumps(value) + "\n")
+        return code
+
+    def _record(self, records: np.ndarray, row: int, event: Dict):
+        extra: List = []
+        absent: List = []
+        for name, kind, parts in self._columns:
+            value, missing = _get(event, parts)
+            if value is _ABSENT:
+                if missing not in absent:
+                    absent.append(missing)
+                value = None
+            if kind == "str":
+                if value is not None and not isinstance(value, str):
+                    extra.append([parts, value])
+                    value = None
+                records[name][row] = self._code(value)
+            elif kind == "ts":
+                encoded = _encode_timestamp(value) if isinstance(value, str) else None
+                if value is not None and encoded is None:
+                    extra.append([parts, value])
+                records[name][row], records[f"{name}.aware"][row] = encoded or (_TS_NULL, 0)
+            elif kind == "i8":
+                if value is not None and not (isinstance(value, int) and not isinstance(value, bool)
+                                              and _I8_NULL < value <= np.iinfo(np.int64).max):
+                    extra.append([parts, value])
+                    value = None
+                records[name][row] = _I8_NULL if value is None else value
+            else:
+                exact = isinstance(value, float) and value == value
+                integral = isinstance(value, int) and not isinstance(value, bool) and abs(value) <= _EXACT_INT
+                if value is not None and not (exact or integral):
+                    extra.append([parts, value])
+                    value = None
+                records[name][row] = np.nan if value is None else float(value)
+                records[f"{name}.int"][row] = integral
+        _leftovers(event, self._tree, [], extra)
+        records[EXTRA][row] = self._code(json.dumps({"set": extra, "absent": absent})) if extra or absent else NULL_CODE
+
+    def write_many(self, events: List[Dict]):
+        records = np.zeros(len(events), dtype=self.dtype)
+        for row, event in enumerate(events):
+            self._record(records, row, event)
+        # Dictionary entries must be on disk before any record that refers to them
+        self._dict_file.flush()
+        self._file.write(records.tobytes())
+        self._file.flush()
+
+    def write(self, event: Dict):
+        self.write_many([event])
+
+    def close(self):
+        self._file.close()
+        self._dict_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _apply_extra(event: Dict, extra: Dict):
+    for path in extra["absent"]:
+        target = event
+        for part in path[:-1]:
+            target = target[part]
+        target.pop(path[-1], None)
+    for path, value in extra["set"]:
+        target = event
+        for part in path[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[path[-1]] = value
+
+class EventLogReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.schema, self.header_size = _read_header(f)
+        self.dtype = record_dtype(self.schema)
+        self.kinds = dict(self.schema)
+        self._dictionary: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._dict_offset = 0
+        self.records = np.empty(0, dtype=self.dtype)
+        self.refresh()
+
+    def refresh(self) -> int:
+        """Remap the log to pick up records appended since the last call; returns the row count."""
+        count = (os.path.getsize(self.path) - self.header_size) // self.dtype.itemsize
+        if count != len(self.records):
+            self.records = np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.header_size, shape=(count,)) if count else np.empty(0, dtype=self.dtype)
+        self._load_dictionary()
+        return count
+
+    def _load_dictionary(self):
+        if not os.path.exists(self.path + ".dict"):
+            return
+        with open(self.path + ".dict", "rb") as f:
+            f.seek(self._dict_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                value = json.loads(line)
+                self._codes[value] = len(self._dictionary)
+                self._dictionary.append(value)
+                self._dict_offset += len(line)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def column(self, name: str) -> np.ndarray:
+        """Zero-copy view of a column; string columns come back as dictionary codes."""
+        return self.records[name]
+
+    def dictionary(self) -> List[str]:
+        return self._dictionary
+
+    def decode(self, name: str, rows: Optional[slice] = None) -> List:
+        values = self.records[name] if rows is None else self.records[name][rows]
+        kind = self.kinds[name]
+        if kind == "str":
+            dictionary = self._dictionary
+            return [None if code == NULL_CODE else dictionary[code] for code in values.tolist()]
+        if kind == "ts":
+            aware = self.records[f"{name}.aware"] if rows is None else self.records[f"{name}.aware"][rows]
+            return _decode_timestamps(np.asarray(values), np.asarray(aware))
+        if kind == "i8":
+            return [None if value == _I8_NULL else value for value in values.tolist()]
+        integral = self.records[f"{name}.int"] if rows is None else self.records[f"{name}.int"][rows]
+        # NaN marks a missing float
+        return [None if value != value else int(value) if flag else value
+                for value, flag in zip(values.tolist(), integral.tolist())]
+
+    def code_for(self, value: str) -> Optional[int]:
+        # Filters on string columns compare integer codes instead of strings
+        return self._codes.get(value)
+
+    def events(self, rows: Optional[slice] = None) -> List[Dict]:
+        # Decode column by column, then stitch rows together
+        columns = [(name.split("."), self.decode(name, rows)) for name, _ in self.schema]
+        count = len(columns[0][1]) if columns else 0
+        events = [{} for _ in range(count)]
+        for parts, values in columns:
+            if len(parts) == 1:
+                key = parts[0]
+                for event, value in zip(events, values):
+                    event[key] = value
+            else:
+                for event, value in zip(events, values):
+                    target = event
+                    for part in parts[:-1]:
+                        target = target.setdefault(part, {})
+                    target[parts[-1]] = value
+        extras = self.records[EXTRA] if rows is None else self.records[EXTRA][rows]
+        for event, code in zip(events, extras.tolist()):
+            if code != NULL_CODE:
+                _apply_extra(event, json.loads(self._dictionary[code]))
+        return events
+
+    def event(self, row: int) -> Dict:
+        if row < 0:
+            row += len(self.records)
+        return self.events(slice(row, row + 1))[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for start in range(0, len(self.records), 4096):
+            yield from self.events(slice(start, start + 4096))
+
+    def latest_event(self) -> Dict:
+        self.refresh()
+        return self.event(len(self.records) - 1) if len(self.records) else {}
+
+class JsonlWriter:
+    # Same interface as EventLogWriter for the existing .jsonl format
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write_many(self, events: List[Dict]):
+        self._file.write("".join(json.dumps(event) + "\n" for event in events))
+        self._file.flush()
+
+    def write(self, event: Dict):
+        self.write_many([event])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_event_writer(path: str, schema: List[Tuple[str, str]]):
+    """Binary writer for .evlog paths, JSON lines for anything else."""
+    if path.endswith(".evlog"):
+        return EventLogWriter(path, schema)
+    return JsonlWriter(path)
+
+def convert(source: str, target: str, schema: Optional[List[Tuple[str, str]]] = None, batch_size: int = 10000) -> int:
+    """Convert a .jsonl log (or a history/*.json snapshot, which is also one event per line)."""
+    written = 0
+    writer = None
+    batch: List[Dict] = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if writer is None:
+                writer = EventLogWriter(target, schema or schema_for(event))
+            batch.append(event)
+            if len(batch) >= batch_size:
+                writer.write_many(batch)
+                written += len(batch)
+                batch = []
+    if writer is not None:
+        if batch:
+            writer.write_many(batch)
+            written += len(batch)
+        writer.close()
+    return written
+
+if __name__ == "__main__":
+    # python event_log.py simulated_data.jsonl simulated_data.evlog
+    if len(sys.argv) != 3:
+        print("usage: python event_log.py SOURCE.jsonl TARGET.evlog")
+        sys.exit(1)
+    print(f"Converted {convert(sys.argv[1], sys.argv[2])} events into {sys.argv[2]}")
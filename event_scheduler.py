@@ -0,0 +1,194 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from collections import deque
+from typing import Dict, Hashable, Iterator, List, Optional
+
+from sensor_tail import TailReader
+
+EVENT_WATCH = os.environ.get("EVENT_WATCH", "auto")  # auto (inotify when available) or poll
+EVENT_DEBOUNCE_MS = int(os.environ.get("EVENT_DEBOUNCE_MS", 250))
+EVENT_MAX_DELAY_MS = int(os.environ.get("EVENT_MAX_DELAY_MS", 2000))
+EVENT_POLL_INTERVAL_MS = int(os.environ.get("EVENT_POLL_INTERVAL_MS", 200))
+
+# --- File change notifications ---
+# On Linux the watcher asks the kernel (inotify, through libc) to report writes, renames and
+# re-creations of the sensor log, so waiting costs nothing until data arrives. The parent
+# directory is watched rather than the file itself so rotation and late creation are seen
+# too. Anywhere inotify is unavailable it falls back to polling the file's stat.
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+def _load_inotify():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class FileWatcher:
+    def __init__(self, file_path: str, mode: str = EVENT_WATCH, poll_interval: float = EVENT_POLL_INTERVAL_MS / 1000):
+        self.file_path = file_path
+        self.poll_interval = poll_interval
+        self._name = os.fsencode(os.path.basename(file_path))
+        self._fd: Optional[int] = None
+        self._last_stat = self._stat()
+        if mode != "poll":
+            self._fd = self._inotify(os.path.dirname(os.path.abspath(file_path)))
+        self.mode = "inotify" if self._fd is not None else "poll"
+
+    @staticmethod
+    def _inotify(directory: str) -> Optional[int]:
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _drain_inotify(self) -> bool:
+        # Reads every queued notification and reports whether any concerned our file
+        touched = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return touched
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+                touched = touched or name == self._name
+                offset += _EVENT_HEADER.size + length
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the file changes or timeout (seconds) passes; returns True on a change."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._fd is not None:
+                readable, _, _ = select.select([self._fd], [], [], remaining)
+                if readable and self._drain_inotify():
+                    return True
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                stat = self._stat()
+                if stat != self._last_stat:
+                    self._last_stat = stat
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+# --- Event-driven scheduler for the agent loops ---
+# Wakes only when the sensor log grows, drops events it has already handed out and
+# debounces bursts: after the first new event it keeps collecting until the log has been
+# quiet for `debounce` seconds or `max_delay` seconds have passed, so a burst becomes one
+# LLM turn. An event is a repeat if it has the same event_id, timestamp and device (ids
+# alone restart with every simulator run) or, in logs without ids, the same timestamp,
+# sensor and device.
+class EventScheduler:
+    def __init__(
+        self,
+        file_path: str,
+        debounce: float = EVENT_DEBOUNCE_MS / 1000,
+        max_delay: float = EVENT_MAX_DELAY_MS / 1000,
+        watcher: Optional[FileWatcher] = None,
+        seen_capacity: int = 10000,
+    ):
+        self.tail = TailReader(file_path, start_at_end=True)
+        self.watcher = watcher or FileWatcher(file_path)
+        self.tail.read_new()  # Only events appended from now on are scheduled
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._seen = set()
+        self._seen_order = deque()
+        self._seen_capacity = seen_capacity
+        self.duplicates = 0
+
+    @staticmethod
+    def event_key(event: Dict) -> Hashable:
+        metadata = event.get("metadata") or {}
+        if event.get("event_id") is not None:
+            return ("event_id", event["event_id"], event.get("timestamp"), metadata.get("device_id"))
+        return ("timestamp", event.get("timestamp"), event.get("sensor"), metadata.get("device_id"))
+
+    def mark_seen(self, event: Dict) -> bool:
+        """Record an event; returns False if it was already seen."""
+        key = self.event_key(event)
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(key)
+        self._seen_order.append(key)
+        if len(self._seen_order) > self._seen_capacity:
+            self._seen.discard(self._seen_order.popleft())
+        return True
+
+    def _fresh(self) -> List[Dict]:
+        return [event for event in self.tail.read_new() if self.mark_seen(event)]
+
+    def next_batch(self, timeout: Optional[float] = None) -> List[Dict]:
+        """Wait for new events and return them as one debounced batch ([] on timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        batch = self._fresh()  # Anything that arrived while the caller was busy
+        while not batch:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            if self.watcher.wait(remaining):
+                batch = self._fresh()
+
+        first_seen = time.monotonic()
+        while True:
+            remaining = self.max_delay - (time.monotonic() - first_seen)
+            if remaining <= 0 or not self.watcher.wait(min(self.debounce, remaining)):
+                break
+            batch.extend(self._fresh())
+        batch.extend(self._fresh())
+        return batch
+
+    def batches(self) -> Iterator[List[Dict]]:
+        while True:
+            yield self.next_batch()
+
+    async def next_batch_async(self, check_interval: float = 1.0) -> List[Dict]:
+        # The wait runs on a worker thread in short slices so a cancelled caller frees it quickly
+        while True:
+            batch = await asyncio.to_thread(self.next_batch, check_interval)
+            if batch:
+                return batch
+
+    def close(self):
+        self.watcher.close()
+        self.tail.close()
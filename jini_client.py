@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+import tracing
+from jiniai import JiniAI as clientAI
+from response_cache import ResponseCache
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+_STREAM_DONE = object()
+
+# --- JiniAI Client Wrapper ---
+# Always requests a streamed completion. Tokens reach callers as they arrive, through a
+# generator, an on_token callback or an async generator. Chunks are collected in a list
+# and joined once. Each call records time-to-first-token and tokens/sec in call_stats.
+class JiniClient:
+    def __init__(self, model: str = DEFAULT_MODEL, client=None, cache: Optional[ResponseCache] = None):
+        self.client = client or clientAI
+        self.model = model
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.call_stats = deque(maxlen=256)
+
+    @property
+    def last_stats(self) -> Dict:
+        return self.call_stats[-1] if self.call_stats else {}
+
+    def _record(self, start: float, first_token_at: Optional[float], tokens: int, cached: bool):
+        total = time.perf_counter() - start
+        generation = total - (first_token_at or 0.0)
+        tracing.observe("llm.cached" if cached else "llm.call", total, model=self.model, tokens=tokens)
+        if not cached:
+            if first_token_at is not None:
+                tracing.observe("llm.ttft", first_token_at)
+            tracing.count("llm.tokens", tokens)
+        self.call_stats.append({
+            "model": self.model,
+            "cached": cached,
+            "tokens": tokens,
+            "ttft_s": round(first_token_at, 4) if first_token_at is not None else None,
+            "total_s": round(total, 4),
+            "tokens_per_s": round(tokens / generation, 2) if tokens and generation > 0 and not cached else None,
+        })
+
+    def stream(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+        start = time.perf_counter()
+        if self.cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                if on_token:
+                    on_token(cached)
+                self._record(start, time.perf_counter() - start, 1, cached=True)
+                yield cached
+                return
+
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=1,
+            max_tokens=1024,
+            top_p=1,
+            stream=True,
+            stop=None,
+        )
+        parts = []
+        first_token_at = None
+        for chunk in completion:
+            token = chunk.choices[0].delta.content or ""
+            if not token:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            parts.append(token)
+            if on_token:
+                on_token(token)
+            yield token
+
+        # Only reached when the stream ran to completion, so partial answers are never cached
+        self._record(start, first_token_at, len(parts), cached=False)
+        if self.cache:
+            self.cache.put(self.model, prompt, "".join(parts).strip())
+
+    def query(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        return "".join(self.stream(prompt, on_token)).strip()
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        # The client is synchronous, so a worker thread drives it and hands tokens to the loop.
+        # Leaving the generator early (timeout, cancellation) stops the worker at the next token.
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stop.set()  # Event loop already closed
+
+        def produce():
+            try:
+                for token in self.stream(prompt):
+                    if stop.is_set():
+                        break
+                    put(token)
+            except Exception as e:
+                put(e)
+            finally:
+                put(_STREAM_DONE)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    async def aquery(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        parts = []
+        async for token in self.astream(prompt):
+            parts.append(token)
+            if on_token:
+                on_token(token)
+        return "".join(parts).strip()
@@ -1,107 +1,220 @@
+import asyncio
 import json
 import time
 import streamlit as st
-from datetime import datetime
-from typing import List, Dict
-from jiniai import JiniAI as clientAI
-
-# --- JiniAI Client Wrapper ---
-class JiniClient:
-    def __init__(self, model: str = "llama-3.3-70b-versatile"):
-        self.client = clientAI
-        self.model = model
-
-    def query(self, prompt: str) -> str:
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=1,
-            max_tokens=1024,
-            top_p=1,
-            stream=False,
-            stop=None,
-        )
-        return completion.choices[0].message.content.strip()
+from collections import deque
+from typing import Callable, List, Dict, Optional
+from jini_client import JiniClient
+from memory_tiers import TieredMemory
+from response_cache import ResponseCache
+from event_scheduler import EventScheduler
+from context_budget import ContextBudgeter
+
+AGENT_TIMEOUT = 60.0  # seconds allowed per agent turn in respond_async
+HANDOFF_TOKENS = 24  # Llm1 tokens streamed before Llm2 starts on them; 0 waits for Llm1's whole answer
+MAX_IN_FLIGHT = 3  # events whose conversations may overlap in the async loop
+RENDER_INTERVAL = 0.1  # seconds between redraws of a streaming answer
 
 # --- SensorStream for Continuous Data Retrieval ---
 class SensorStream:
     def __init__(self, file_path: str):
         self.file_path = file_path
+        self.scheduler = EventScheduler(file_path)
 
     def get_latest_event(self) -> Dict:
-        try:
-            with open(self.file_path, "r", encoding="utf-8") as file:
-                lines = file.readlines()
-                if lines:
-                    return json.loads(lines[-1])
-        except json.JSONDecodeError:
-            return {}
-        except FileNotFoundError:
-            return {}
-        return {}
-
-# --- Episodic Memory Module ---
-class EpisodicMemory:
-    def __init__(self):
-        self.memory_store: List[Dict] = []
-
-    def add_event(self, event: Dict):
-        self.memory_store.append(event)
-        if len(self.memory_store) > 1000:
-            self.memory_store.pop(0)
+        return self.scheduler.tail.latest_event()
 
-    def retrieve_memory(self, query: str) -> str:
-        relevant_memories = [json.dumps(m) for m in self.memory_store if query.lower() in json.dumps(m).lower()]
-        return "\n".join(relevant_memories[-5:])
+    async def wait_for_events(self) -> List[Dict]:
+        return await self.scheduler.next_batch_async()
 
 # --- Digital Neocortex: Main Integration ---
 class DigitalNeocortex:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, client=None, agent_timeout: float = AGENT_TIMEOUT,
+                 handoff_tokens: int = HANDOFF_TOKENS):
         self.sensors = SensorStream(file_path)
-        self.memory = EpisodicMemory()
-        self.llm1 = JiniClient()
-        self.llm2 = JiniClient()
-        self.opinionAI = JiniClient()
+        self.memory = TieredMemory()
+        self.cache = ResponseCache.from_env()  # Shared by the three agents
+        self.llm1 = JiniClient(client=client, cache=self.cache)
+        self.llm2 = JiniClient(client=client, cache=self.cache)
+        self.opinionAI = JiniClient(client=client, cache=self.cache)
+        self.agent_timeout = agent_timeout
+        self.handoff_tokens = handoff_tokens
+        self.context = ContextBudgeter()  # Bounds the sensor data and memories put in each prompt
         self.previous_sensor_data = ""
 
     def process_event(self, event: Dict):
         self.memory.add_event(event)
 
-    def generate_query(self) -> str:
-        latest_event = self.sensors.get_latest_event()
+    def generate_query(self, events: Optional[List[Dict]] = None) -> str:
+        latest_event = events[-1] if events else self.sensors.get_latest_event()
         if not latest_event:
             return "No new events detected."
         return json.dumps(latest_event, indent=4)
 
-    def respond(self, user_query: str) -> Dict:
-        memory_context = self.memory.retrieve_memory(user_query)
-        real_time_data = json.dumps(self.sensors.get_latest_event(), indent=4) if self.sensors.get_latest_event() else ""
-        
-        llm1_prompt = (
+    def _llm1_prompt(self, real_time_data: str) -> str:
+        return (
             f"Llm1: Hey, just checking out the latest sensor data. Looks like we're experiencing: \n"
             f"{real_time_data}\n\nWhat do you think?"
         )
-        llm1_response = self.llm1.query(llm1_prompt)
-        
-        llm2_prompt = (
+
+    def _llm2_prompt(self, memory_context: str, llm1_response: str) -> str:
+        return (
             f"Llm2: Huh, reminds me of past experiences: {memory_context}\n"
             f"Llm1: {llm1_response}\n"
             f"Llm2: But do you think there's anything unusual here?"
         )
-        llm2_response = self.llm2.query(llm2_prompt)
-        
-        opinionAI_prompt = (
+
+    def _opinionAI_prompt(self, real_time_data: str, llm1_response: str, llm2_response: str) -> str:
+        return (
             f"OpinionAI: Analyzing conversation between Llm1 and Llm2. Identifying gaps between sensory data interpretation and generated story context.\n"
             f"Sensor Data: {real_time_data}\n"
             f"Llm1: {llm1_response}\n"
             f"Llm2: {llm2_response}\n"
             f"Technical Analysis: "
         )
-        opinionAI_response = self.opinionAI.query(opinionAI_prompt)
+
+    def _sensor_context(self, events: Optional[List[Dict]]):
+        # The agents get the compact, budgeted form; SensorData keeps the JSON for display
+        if not events:
+            latest_event = self.sensors.get_latest_event()
+            events = [latest_event] if latest_event else []
+        sensor_data = json.dumps(events[0] if len(events) == 1 else events, indent=4) if events else ""
+        return sensor_data, self.context.pack(events, baseline=sensor_data)
+
+    def _memory_context(self, user_query: str) -> str:
+        return self.context.pack_lines(self.memory.retrieve_memory(user_query)).text
+
+    def respond(self, user_query: str) -> Dict:
+        memory_context = self._memory_context(user_query)
+        sensor_data, pack = self._sensor_context(None)
+        real_time_data = pack.text
+        
+        llm1_response = self.llm1.query(self._llm1_prompt(real_time_data))
+        llm2_response = self.llm2.query(self._llm2_prompt(memory_context, llm1_response))
+        opinionAI_response = self.opinionAI.query(self._opinionAI_prompt(real_time_data, llm1_response, llm2_response))
         
-        return {"Llm1": llm1_response, "Llm2": llm2_response, "OpinionAI": opinionAI_response, "SensorData": real_time_data}
+        return {"Llm1": llm1_response, "Llm2": llm2_response, "OpinionAI": opinionAI_response, "SensorData": sensor_data,
+                "ContextTokens": {"tokens": pack.tokens, "saved": pack.saved_tokens}}
+
+    async def _run_agent(self, name: str, client: JiniClient, prompt: str, timed_out: List[str],
+                         on_token: Optional[Callable[[str, str], None]] = None) -> str:
+        # Tokens are collected as they arrive so a timed-out agent still contributes its partial answer
+        parts = []
+
+        def collect(token: str):
+            parts.append(token)
+            if on_token:
+                on_token(name, token)
+
+        try:
+            await asyncio.wait_for(client.aquery(prompt, on_token=collect), self.agent_timeout)
+        except asyncio.TimeoutError:
+            timed_out.append(name)
+        return "".join(parts).strip()
+
+    async def respond_async(self, user_query: str, on_token: Optional[Callable[[str, str], None]] = None,
+                            events: Optional[List[Dict]] = None) -> Dict:
+        # Llm1's tokens are handed to Llm2 as they stream: once handoff_tokens have arrived (or
+        # Llm1 is done, if sooner) Llm2 starts on that opening while Llm1 keeps generating.
+        # OpinionAI needs both full answers, so it goes last; the memory lookup runs while Llm1
+        # streams, and callers get every token as it arrives. A debounced batch of events is
+        # shown to the agents as one token-budgeted block.
+        sensor_data, pack = self._sensor_context(events)
+        real_time_data = pack.text
+        memory_task = asyncio.ensure_future(asyncio.to_thread(self._memory_context, user_query))
+        timed_out: List[str] = []
+        llm1_parts: List[str] = []
+        handoff = asyncio.Event()
+
+        def llm1_token(agent: str, token: str):
+            llm1_parts.append(token)
+            if self.handoff_tokens and len(llm1_parts) >= self.handoff_tokens:
+                handoff.set()
+            if on_token:
+                on_token(agent, token)
+
+        llm1_task = asyncio.ensure_future(
+            self._run_agent("Llm1", self.llm1, self._llm1_prompt(real_time_data), timed_out, llm1_token)
+        )
+        llm1_task.add_done_callback(lambda _: handoff.set())
+        try:
+            await handoff.wait()
+            llm1_opening = "".join(llm1_parts).strip() + ("" if llm1_task.done() else " ...")
+            memory_context = await memory_task
+            llm2_response = await self._run_agent("Llm2", self.llm2, self._llm2_prompt(memory_context, llm1_opening), timed_out, on_token)
+            llm1_response = await llm1_task
+            opinionAI_response = await self._run_agent(
+                "OpinionAI", self.opinionAI, self._opinionAI_prompt(real_time_data, llm1_response, llm2_response), timed_out, on_token
+            )
+        finally:
+            memory_task.cancel()
+            llm1_task.cancel()
+
+        return {"Llm1": llm1_response, "Llm2": llm2_response, "OpinionAI": opinionAI_response,
+                "SensorData": sensor_data, "TimedOut": timed_out,
+                "ContextTokens": {"tokens": pack.tokens, "saved": pack.saved_tokens}}
 
 # --- Streamlit UI ---
+class ConversationView:
+    # Placeholders are laid out when a conversation starts and filled in as tokens arrive
+    AGENTS = [("Llm1", "Casual Interpretation"), ("Llm2", "Contextual Reflection"), ("OpinionAI", "Technical Analysis")]
+
+    def __init__(self):
+        self.placeholders = {}
+        self.parts = {}
+        self.last_render = {}
+        for column, (name, title) in zip(st.columns(3), self.AGENTS):
+            with column:
+                st.write(f"**{name} ({title}):**")
+                self.placeholders[name] = st.empty()
+            self.parts[name] = []
+            self.last_render[name] = 0.0
+        
+        st.write("---")
+        st.subheader("Live Sensor Data")
+        self.sensor_data = st.empty()
+
+    def on_token(self, agent: str, token: str):
+        self.parts[agent].append(token)
+        now = time.monotonic()
+        if now - self.last_render[agent] >= RENDER_INTERVAL:
+            self.last_render[agent] = now
+            self.placeholders[agent].write("".join(self.parts[agent]))
+
+    def finish(self, responses: Dict):
+        for name, placeholder in self.placeholders.items():
+            placeholder.write(responses[name])
+        self.sensor_data.json(responses["SensorData"])
+
+async def converse(brain: DigitalNeocortex, max_in_flight: int = MAX_IN_FLIGHT):
+    # Each new batch of events starts its conversation right away instead of waiting for the
+    # previous one to finish; answers stream into their own placeholders in arrival order.
+    # The loop sleeps until either the sensor log grows or the oldest conversation completes.
+    in_flight = deque()
+    next_batch = None
+    while True:
+        if next_batch is None:
+            next_batch = asyncio.ensure_future(brain.sensors.wait_for_events())
+        waiting = {next_batch} | ({in_flight[0][2]} if in_flight else set())
+        await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+        if next_batch.done():
+            events = next_batch.result()
+            next_batch = None
+            for event in events:
+                brain.process_event(event)
+            generated_query = brain.generate_query(events)
+            if generated_query != "No new events detected.":
+                view = ConversationView()
+                task = asyncio.ensure_future(brain.respond_async(generated_query, on_token=view.on_token, events=events))
+                in_flight.append((generated_query, view, task))
+
+        while in_flight and (in_flight[0][2].done() or len(in_flight) >= max_in_flight):
+            generated_query, view, task = in_flight.popleft()
+            responses = await task
+            st.session_state.conversation.append((generated_query, responses))
+            view.finish(responses)
+
 def main():
     st.title("AI-Driven Sensor Analysis & Conversation")
     file_path = "simulated_dataM.jsonl"
@@ -110,30 +223,7 @@ def main():
     if "conversation" not in st.session_state:
         st.session_state.conversation = []
     
-    while True:
-        time.sleep(3)
-        latest_event = brain.sensors.get_latest_event()
-        if latest_event:
-            brain.process_event(latest_event)
-            generated_query = brain.generate_query()
-            if generated_query != "No new events detected.":
-                responses = brain.respond(generated_query)
-                st.session_state.conversation.append((generated_query, responses))
-                
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.write("**Llm1 (Casual Interpretation):**")
-                    st.write(responses["Llm1"])
-                with col2:
-                    st.write("**Llm2 (Contextual Reflection):**")
-                    st.write(responses["Llm2"])
-                with col3:
-                    st.write("**OpinionAI (Technical Analysis):**")
-                    st.write(responses["OpinionAI"])
-                
-                st.write("---")
-                st.subheader("Live Sensor Data")
-                st.json(responses["SensorData"])
+    asyncio.run(converse(brain))
 
 if __name__ == "__main__":
     main()
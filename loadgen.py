@@ -0,0 +1,191 @@
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from event_log import EventLogWriter, SENSOR_SCHEMA, STORY_SCHEMA
+
+# --- High-rate load generator for the simulators ---
+# Worker processes each own a slice of the simulated devices and generate events in chunks
+# into a bounded queue. The parent releases events from those chunks as the target rate
+# profile earns credit, in slices of about TICK seconds' worth (so low rates, bursts and
+# ramps are followed closely and --events is never overshot), and appends them through a
+# single buffered file handle, reporting throughput as it goes. Workers run ahead of the
+# writer, so they leave a placeholder where the timestamp goes and the parent stamps each
+# slice as it writes it; timestamps are the time an event reached the file, as for the
+# simulators' own loops.
+#   python script.py --rate 5000 --profile burst --workers 4 --devices 500 --duration 60
+#   python script1.py --rate 0 --events 1000000 --output load.jsonl   (0 = as fast as possible)
+
+PROFILES = ("constant", "burst", "ramp")
+TICK = 0.01  # Seconds of events released per write when throttled
+_STAMP = "\x00timestamp\x00"  # Stands in for the timestamp until the parent writes the event
+_STAMP_JSON = json.dumps(_STAMP)
+
+def parse_args(default_output: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=default_output, help=".jsonl or .evlog file to append to")
+    parser.add_argument("--rate", type=float, help="target events/sec; enables load mode (0 = unthrottled)")
+    parser.add_argument("--profile", choices=PROFILES, default="constant")
+    parser.add_argument("--burst-factor", type=float, default=5.0, help="burst profile: rate multiplier during bursts")
+    parser.add_argument("--burst-every", type=float, default=10.0, help="burst profile: seconds between burst starts")
+    parser.add_argument("--burst-length", type=float, default=2.0, help="burst profile: seconds each burst lasts")
+    parser.add_argument("--ramp-seconds", type=float, default=60.0, help="ramp profile: seconds to reach --rate")
+    parser.add_argument("--workers", type=int, default=max(1, (mp.cpu_count() or 2) - 1))
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--events", type=int, help="stop after this many events")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def target_rate(args: argparse.Namespace, elapsed: float) -> float:
+    if args.profile == "burst" and elapsed % args.burst_every < args.burst_length:
+        return args.rate * args.burst_factor
+    if args.profile == "ramp":
+        return args.rate * min(1.0, elapsed / args.ramp_seconds) if args.ramp_seconds > 0 else args.rate
+    return args.rate
+
+def _sensor_events(worker_id: int, workers: int, devices: List[str], count: int, state: Dict) -> List[Dict]:
+    import script
+
+    events = []
+    for _ in range(count):
+        device = devices[state.setdefault("next", 0) % len(devices)]
+        state["next"] += 1
+        events.append(script.generate_event(device_id=device))
+    return events
+
+def _story_events(worker_id: int, workers: int, devices: List[str], count: int, state: Dict) -> List[Dict]:
+    import script1
+
+    events = []
+    previous = state.setdefault("previous", {})
+    for _ in range(count):
+        device = devices[state.setdefault("next", 0) % len(devices)]
+        event, _ = script1.generate_next_event(previous.get(device), write_story=False)
+        # Globally unique ids without coordination: worker w issues w+1, w+1+W, w+1+2W, ...
+        event["event_id"] = state["next"] * workers + worker_id + 1
+        event["metadata"]["device_id"] = device
+        previous[device] = event
+        state["next"] += 1
+        events.append(event)
+    return events
+
+_GENERATORS = {"sensor": _sensor_events, "story": _story_events}
+
+def _timestamp(source: str) -> str:
+    # Each simulator's own format: script.py writes naive UTC, script1.py UTC with an offset
+    now = datetime.now(timezone.utc)
+    return (now.replace(tzinfo=None) if source == "sensor" else now).isoformat()
+
+def _worker(source: str, worker_id: int, workers: int, device_count: int, seed: int, chunk_size: int, serialize: bool, out: mp.Queue, stop):
+    random.seed(seed * 1_000_003 + worker_id)  # Deterministic content per worker
+    devices = [f"device_{i + 1}" for i in range(worker_id, device_count, workers)] or [f"device_{worker_id + 1}"]
+    generate = _GENERATORS[source]
+    state: Dict = {}
+    while not stop.is_set():
+        events = generate(worker_id, workers, devices, chunk_size, state)
+        for event in events:
+            event["timestamp"] = _STAMP
+        chunk = [json.dumps(event) + "\n" for event in events] if serialize else events
+        while not stop.is_set():
+            try:
+                out.put((len(events), chunk), timeout=0.2)
+                break
+            except queue.Full:
+                continue
+    out.cancel_join_thread()  # Chunks nobody will read must not keep the process alive
+
+def run(source: str, args: argparse.Namespace) -> Dict:
+    binary = args.output.endswith(".evlog")
+    chunks: mp.Queue = mp.Queue(maxsize=4 * args.workers)
+    stop = mp.Event()
+    processes = [
+        mp.Process(
+            target=_worker,
+            args=(source, worker_id, args.workers, args.devices, args.seed, args.chunk_size, not binary, chunks, stop),
+            daemon=True,
+        )
+        for worker_id in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    schema = SENSOR_SCHEMA if source == "sensor" else STORY_SCHEMA
+    writer = EventLogWriter(args.output, schema) if binary else open(args.output, "a", encoding="utf-8", buffering=1 << 20)
+    written = 0
+    credit = 0.0
+    pending: List = []  # Events (or JSON lines) of the current chunk not yet written
+    offset = 0
+    start = last_tick = last_report = time.perf_counter()
+    reported = 0
+    try:
+        while True:
+            now = time.perf_counter()
+            elapsed = now - start
+            if (args.duration and elapsed >= args.duration) or (args.events and written >= args.events):
+                break
+
+            allowed = args.events - written if args.events else args.chunk_size
+            if args.rate:
+                rate = target_rate(args, elapsed)
+                step = max(1.0, min(args.chunk_size, rate * TICK))
+                # Credit is capped so a stalled producer is not followed by an unbounded burst
+                credit = min(credit + rate * (now - last_tick), max(step, args.chunk_size))
+                last_tick = now
+                if credit < step:
+                    time.sleep(min(0.05, (step - credit) / max(rate, 1e-9)))
+                    continue
+                allowed = min(allowed, int(credit))
+
+            if offset >= len(pending):
+                try:
+                    _, pending = chunks.get(timeout=10)
+                except queue.Empty:
+                    print("[loadgen] workers stopped producing", file=sys.stderr)
+                    break
+                offset = 0
+            batch = pending[offset:offset + allowed]
+            offset += len(batch)
+            stamp = _timestamp(source)
+            if binary:
+                for event in batch:
+                    event["timestamp"] = stamp
+                writer.write_many(batch)
+            else:
+                writer.write("".join(batch).replace(_STAMP_JSON, json.dumps(stamp)))
+                writer.flush()
+            written += len(batch)
+            credit -= len(batch)
+
+            if now - last_report >= 1.0:
+                print(f"[loadgen] {written} events, {round((written - reported) / (now - last_report))} events/s", file=sys.stderr)
+                last_report, reported = now, written
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - start
+        stop.set()
+        writer.close()
+        for process in processes:
+            process.join(timeout=1)
+
+    summary = {
+        "source": source,
+        "output": args.output,
+        "profile": args.profile,
+        "target_rate": args.rate,
+        "workers": args.workers,
+        "devices": args.devices,
+        "events": written,
+        "seconds": round(elapsed, 3),
+        "events_per_s": round(written / elapsed, 1) if elapsed else 0.0,
+    }
+    print(json.dumps(summary))
+    return summary
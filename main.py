@@ -1,76 +1,50 @@
-import json
-import time
-import os
-from datetime import datetime
-from typing import List, Dict
-from jiniai import JiniAI as clientAI
-import random
+import threading
+from typing import Callable, List, Dict, Optional, Tuple
+from jini_client import JiniClient as StreamingJiniClient
+from memory_tiers import TieredMemory
+from event_scheduler import EventScheduler
+from context_budget import ContextBudgeter, ContextPack
+from work_queue import BoundedEventQueue, WorkerPool
+from rule_engine import NO_PREDICTION, RuleEngine
+from anomaly_detector import LLM_TRIGGER, AnomalyDetector
+import tracing
 
 # --- JinIAI Client Wrapper ---
-class JiniClient:
-    def __init__(self, model: str = "llama-3.3-70b-versatile"):
-        self.client = clientAI
-        self.model = model
-
-    def query(self, user_query: str, context: str, real_time_data: str) -> str:
+class JiniClient(StreamingJiniClient):
+    def query(self, user_query: str, context: str, real_time_data: str,
+              on_token: Optional[Callable[[str], None]] = None) -> str:
         prompt = context + "\n" + real_time_data + "\n" + user_query
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=1,
-            max_tokens=1024,
-            top_p=1,
-            stream=True,
-            stop=None,
-        )
-        response = ""
-        for chunk in completion:
-            response_chunk = chunk.choices[0].delta.content or ""
-            response += response_chunk
-        return response
+        return super().query(prompt, on_token=on_token)
 
 # --- SensorStream for Continuous Data Retrieval ---
 class SensorStream:
     def __init__(self, file_path: str):
         self.file_path = file_path
-        self._file = open(file_path, "r", encoding="utf-8")
-        self._file.seek(0, os.SEEK_END)
+        # No debounce: events are handed to the work queue as they land, and batched there
+        self.scheduler = EventScheduler(file_path, debounce=0.0, max_delay=0.0)
 
     def get_latest_events(self) -> List[Dict]:
-        events = []
-        while True:
-            line = self._file.readline()
-            if not line:
-                break
-            try:
-                event = json.loads(line)
-                events.append(event)
-            except json.JSONDecodeError:
-                continue
-        return events
-
-# --- Episodic Memory Module ---
-class EpisodicMemory:
-    def __init__(self):
-        self.memory_store: List[Dict] = []
-
-    def add_event(self, event: Dict):
-        self.memory_store.append(event)
-        if len(self.memory_store) > 1000:
-            self.memory_store.pop(0)
+        return self.scheduler.tail.read_new()
 
-    def retrieve_memory(self, query: str) -> str:
-        relevant_memories = [json.dumps(m) for m in self.memory_store if query.lower() in json.dumps(m).lower()]
-        return "\n".join(relevant_memories[-5:])
+    def wait_for_events(self, timeout: Optional[float] = None) -> List[Dict]:
+        return self.scheduler.next_batch(timeout)
 
 # --- Predictive Processing Module ---
+# Rules live in rule_engine.py (DEFAULT_RULES, or a JSON file named by PREDICTOR_RULES);
+# a batch of new events is scored in one columnar pass.
 class Predictor:
+    def __init__(self, engine: Optional[RuleEngine] = None):
+        self.engine = engine or RuleEngine()
+
     def predict(self, event: Dict) -> str:
-        if event["sensor"] == "visual" and "dark" in event["reading"]:
-            return "It might rain soon. Take an umbrella."
-        elif event["sensor"] == "emotion" and event["reading"] == "anxious":
-            return "You seem anxious. Try some breathing exercises."
-        return "No strong prediction."
+        return self.engine.predict(event)
+
+    def predict_batch(self, events: List[Dict]) -> List[str]:
+        return self.engine.predict_many(events)
+
+    def is_anomaly(self, event: Dict) -> bool:
+        """Events with a strong prediction jump the work queue."""
+        return self.predict(event) != NO_PREDICTION
 
 # --- Emotion-Aware Decision Making Module ---
 class EmotionAwareDecision:
@@ -81,72 +55,110 @@ class EmotionAwareDecision:
         bias = self.emotion_bias.get(emotion, "neutral")
         return f"Based on your {emotion} mood, I suggest a {bias} approach to your decision."
 
+def print_token(token: str):
+    print(token, end="", flush=True)
+
 # --- Digital Neocortex: Main Integration ---
 class DigitalNeocortex:
     def __init__(self, file_path: str):
         self.sensors = SensorStream(file_path)
-        self.memory = EpisodicMemory()
+        self.memory = TieredMemory()
         self.predictor = Predictor()
+        self.detector = AnomalyDetector()  # EWMA z-scores per device_id and per location
         self.decision_maker = EmotionAwareDecision()
         self.jini_client = JiniClient()
-        self.previous_sensor_data = ""
+        self.context = ContextBudgeter()  # Bounds the sensor data and memories put in each prompt
+        # Events waiting for an LLM turn; bounded, with WORK_QUEUE_POLICY shedding under bursts
+        self.queue = BoundedEventQueue(is_priority=self.predictor.is_anomaly)
+        self.workers: Optional[WorkerPool] = None
+        self._print_lock = threading.Lock()
 
-    def process_event(self, event: Dict):
+    def process_event(self, event: Dict, prediction: Optional[str] = None):
         self.memory.add_event(event)
-        prediction = self.predictor.predict(event)
+        if prediction is None:
+            prediction = self.predictor.predict(event)
         print(f"Prediction: {prediction}")
+        metadata = event.get("metadata") or {}
+        if metadata.get("anomaly"):
+            print(f"Anomaly: {metadata['anomaly_fields']} (z={metadata['anomaly_z']})")
 
-    def generate_query(self) -> str:
-        sensor_data = self.sensors.get_latest_events()
-        if not sensor_data and not self.previous_sensor_data:
+    def generate_query(self, events: Optional[List[Dict]] = None) -> str:
+        sensor_data = events if events is not None else self.sensors.get_latest_events()
+        if not sensor_data:
             return "What is the current situation?"
         
-        if sensor_data:
-            latest_event = sensor_data[-1]
-        elif self.previous_sensor_data:
-            try:
-                parsed_data = json.loads(self.previous_sensor_data)
-                latest_event = parsed_data[-1] if isinstance(parsed_data, list) else parsed_data
-            except json.JSONDecodeError:
-                latest_event = {}
-        else:
-            latest_event = {}
+        latest_event = sensor_data[-1]
         
         return f"How does {latest_event.get('sensor', 'unknown')} data impact decision-making?"
 
-    def respond(self, user_query: str) -> str:
-        memory_context = self.memory.retrieve_memory(user_query)
-        real_time_data = "\n".join([json.dumps(event) for event in self.sensors.get_latest_events()])
-        if real_time_data:
-            self.previous_sensor_data = real_time_data
-        response = self.jini_client.query(user_query, memory_context, real_time_data)
-        return response
-
-    def run(self):
-        while True:
+    def respond(self, user_query: str, on_token: Optional[Callable[[str], None]] = None,
+                events: Optional[List[Dict]] = None) -> Tuple[str, ContextPack]:
+        """The LLM's answer and the packed sensor context it was given."""
+        # Worker threads call this concurrently, so the turn's context is returned, not stored
+        with tracing.span("agent.memory"):
+            memory_context = self.context.pack_lines(self.memory.retrieve_memory(user_query)).text
+        if events is None:
             events = self.sensors.get_latest_events()
-            for event in events:
-                print(f"Processing event: {event}")
-                self.process_event(event)
-            
-            generated_query = self.generate_query()
+        pack = self.context.pack(events)
+        with tracing.span("agent.llm", events=len(events)):
+            response = self.jini_client.query(user_query, memory_context, pack.text, on_token=on_token)
+        return response, pack
+
+    def answer(self, events: List[Dict]):
+        """One pair of LLM turns for a batch taken from the work queue."""
+        generated_query = self.generate_query(events)
+        # One worker streams tokens to the terminal; with several, each answer is printed whole
+        stream = self.workers is None or self.workers.size == 1
+        on_token = print_token if stream else None
+        if stream:
             print(f"Generated Query: {generated_query}")
-            response_1 = self.respond(generated_query+"\n\n You are a human, and if any sensory data is given, then you are in a simulated environment. If no sensory data is given, react like any human would. dont mention anything about receiving any data or not, just respond to whatever is asked as usual.")
-            print("First LLM Response:", response_1)
-            
-            time.sleep(random.uniform(3, 4))
-            
-            updated_events = self.sensors.get_latest_events()
-            real_time_update = "\n".join([json.dumps(event) for event in updated_events])
-            if real_time_update:
-                self.previous_sensor_data = real_time_update
-            response_2 = self.jini_client.query(response_1, self.previous_sensor_data+"\n\n You are a human, and if any sensory data is given, then you are in a simulated environment. If no sensory data is given, react like any human would.dont mention anything about receiving any data or not, just respond to whatever is asked as usual.","")
-            print("Second LLM Response:", response_2)
-            
-            time.sleep(random.uniform(3, 4))
+            print("First LLM Response: ", end="", flush=True)
+        response_1, pack = self.respond(generated_query+"\n\n You are a human, and if any sensory data is given, then you are in a simulated environment. If no sensory data is given, react like any human would. dont mention anything about receiving any data or not, just respond to whatever is asked as usual.", on_token=on_token, events=events)
+        context = pack.describe()
+        sensor_data = pack.text
+
+        # Events that queued up during the first answer are folded into the second one
+        updated_events = self.queue.get_batch(timeout=0)
+        if updated_events:
+            sensor_data = self.context.pack(updated_events).text
+        if stream:
+            print()
+            print(f"Context: {context}")
+            print("Second LLM Response: ", end="", flush=True)
+        response_2 = self.jini_client.query(response_1, sensor_data+"\n\n You are a human, and if any sensory data is given, then you are in a simulated environment. If no sensory data is given, react like any human would.dont mention anything about receiving any data or not, just respond to whatever is asked as usual.","", on_token=on_token)
+        with self._print_lock:
+            if not stream:
+                print(f"Generated Query: {generated_query}")
+                print(f"First LLM Response: {response_1}")
+                print(f"Context: {context}")
+                print(f"Second LLM Response: {response_2}", end="")
+            print()
+            print(f"Queue: {self.queue.stats()}")
+
+    def run(self):
+        # This thread only tails the log: new events go to memory and the bounded work queue,
+        # and LLM_WORKERS worker threads answer them in batches (work_queue.py), so a burst is
+        # shed or coalesced there instead of growing the prompt and the backlog. Unless
+        # LLM_TRIGGER=all, only anomalies and events the rules predict on are queued at all
+        self.workers = WorkerPool(self.queue, self.answer).start()
+        try:
+            while True:
+                events = self.sensors.wait_for_events(timeout=1.0)
+                flags = [self.detector.annotate(event) for event in events]  # Rules can test metadata.anomaly
+                predictions = self.predictor.predict_batch(events)
+                for event, flag, prediction in zip(events, flags, predictions):
+                    urgent = flag["anomaly"] or prediction != NO_PREDICTION
+                    with self._print_lock:
+                        print(f"Processing event: {event}")
+                        self.process_event(event, prediction)
+                    if urgent or LLM_TRIGGER == "all":
+                        self.queue.put(event, priority=urgent)
+        finally:
+            self.queue.close()
 
 # --- Main Execution ---
 if __name__ == "__main__":
     file_path = "simulated_data.jsonl"
+    tracing.serve_metrics_from_env()
     brain = DigitalNeocortex(file_path)
     brain.run()
\ No newline at end of file
@@ -1,70 +1,41 @@
 import json
-import time
-import os
-import sys
-from datetime import datetime, timezone
-from typing import List, Dict
-from jiniai import JiniAI as clientAI
-import random
+from typing import Callable, List, Dict, Optional
+from jini_client import JiniClient as StreamingJiniClient
+from memory_tiers import TieredMemory
+from event_scheduler import EventScheduler
+from context_budget import ContextBudgeter
+import tracing
 
 # --- JinIAI Client Wrapper ---
-class JiniClient:
-    def __init__(self, model: str = "llama-3.3-70b-versatile"):
-        self.client = clientAI
-        self.model = model
-
-    def query(self, user_query: str, context: str, real_time_data: str) -> str:
+class JiniClient(StreamingJiniClient):
+    def query(self, user_query: str, context: str, real_time_data: str,
+              on_token: Optional[Callable[[str], None]] = None) -> str:
         prompt = context + "\n" + real_time_data + "\n" + user_query
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=1,
-            max_tokens=1024,
-            top_p=1,
-            stream=True,
-            stop=None,
-        )
-        response = ""
-        for chunk in completion:
-            response_chunk = chunk.choices[0].delta.content or ""
-            response += response_chunk
-        return response
+        return super().query(prompt, on_token=on_token)
 
 # --- SensorStream for Continuous Data Retrieval ---
 class SensorStream:
     def __init__(self, file_path: str):
         self.file_path = file_path
+        self.scheduler = EventScheduler(file_path)
 
     def get_latest_event(self) -> Dict:
-        with open(self.file_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            if lines:
-                try:
-                    return json.loads(lines[-1])
-                except json.JSONDecodeError:
-                    return {}
-        return {}
+        return self.scheduler.tail.latest_event()
 
-# --- Episodic Memory Module ---
-class EpisodicMemory:
-    def __init__(self):
-        self.memory_store: List[Dict] = []
+    def wait_for_events(self, timeout: Optional[float] = None) -> List[Dict]:
+        return self.scheduler.next_batch(timeout)
 
-    def add_event(self, event: Dict):
-        self.memory_store.append(event)
-        if len(self.memory_store) > 1000:
-            self.memory_store.pop(0)
-
-    def retrieve_memory(self, query: str) -> str:
-        relevant_memories = [json.dumps(m) for m in self.memory_store if query.lower() in json.dumps(m).lower()]
-        return "\n".join(relevant_memories[-5:])
+def print_token(token: str):
+    print(token, end="", flush=True)
 
 # --- Digital Neocortex: Main Integration ---
 class DigitalNeocortex:
     def __init__(self, file_path: str):
         self.sensors = SensorStream(file_path)
-        self.memory = EpisodicMemory()
+        self.memory = TieredMemory()
         self.jini_client = JiniClient()
+        self.context = ContextBudgeter()  # Bounds the sensor data and memories put in each prompt
+        self.last_context = None
         self.previous_sensor_data = ""
         self.running = True
 
@@ -72,34 +43,50 @@ class DigitalNeocortex:
         self.memory.add_event(event)
         print(f"Processing event: {event}")
 
-    def generate_query(self) -> str:
-        latest_event = self.sensors.get_latest_event()
+    def generate_query(self, events: Optional[List[Dict]] = None) -> str:
+        latest_event = events[-1] if events else self.sensors.get_latest_event()
         if not latest_event:
             return "No new events detected."
         return json.dumps(latest_event)
 
-    def respond(self, user_query: str) -> str:
-        memory_context = self.memory.retrieve_memory(user_query)
-        real_time_data = json.dumps(self.sensors.get_latest_event()) if self.sensors.get_latest_event() else ""
+    def respond(self, user_query: str, on_token: Optional[Callable[[str], None]] = None,
+                events: Optional[List[Dict]] = None) -> str:
+        with tracing.span("agent.memory"):
+            memory_context = self.context.pack_lines(self.memory.retrieve_memory(user_query)).text
+        if not events:
+            latest_event = self.sensors.get_latest_event()
+            events = [latest_event] if latest_event else []
+        self.last_context = self.context.pack(events)
+        real_time_data = self.last_context.text
         if real_time_data:
             self.previous_sensor_data = real_time_data
-        response = self.jini_client.query(user_query, memory_context, real_time_data)
+        with tracing.span("agent.llm", events=len(events)):
+            response = self.jini_client.query(user_query, memory_context, real_time_data, on_token=on_token)
         return response
 
     def run(self):
+        # The event already in the log is answered once; after that the loop wakes only when new
+        # events are appended, and a burst of them is answered in one LLM turn
+        latest_event = self.sensors.get_latest_event()
+        events = [latest_event] if latest_event and self.sensors.scheduler.mark_seen(latest_event) else []
         while self.running:
-            time.sleep(3)
-            latest_event = self.sensors.get_latest_event()
-            if latest_event:
-                self.process_event(latest_event)
-                generated_query = self.generate_query()
-                if generated_query != "No new events detected.":
-                    print(f"Generated Query: {generated_query}")
-                    response = self.respond(generated_query)
-                    print(f"LLM Response: {response}")
+            if not events:
+                events = self.sensors.wait_for_events(timeout=1.0)
+                continue
+            for event in events:
+                self.process_event(event)
+            generated_query = self.generate_query(events)
+            if generated_query != "No new events detected.":
+                print(f"Generated Query: {generated_query}")
+                print("LLM Response: ", end="", flush=True)
+                self.respond(generated_query, on_token=print_token, events=events)
+                print()
+                print(f"Context: {self.last_context.describe()}")
+            events = []
 
 # --- Main Execution ---
 if __name__ == "__main__":
     file_path = "simulated_dataM.jsonl"
+    tracing.serve_metrics_from_env()
     brain = DigitalNeocortex(file_path)
     brain.run()
@@ -2,66 +2,38 @@ import json
 import time
 import streamlit as st
 from datetime import datetime
-from typing import List, Dict
-from jiniai import JiniAI as clientAI
-
-# --- JiniAI Client Wrapper ---
-class JiniClient:
-    def __init__(self, model: str = "llama-3.3-70b-versatile"):
-        self.client = clientAI
-        self.model = model
-
-    def query(self, prompt: str) -> str:
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=1,
-            max_tokens=1024,
-            top_p=1,
-            stream=False,
-            stop=None,
-        )
-        return completion.choices[0].message.content.strip()
+from typing import Callable, List, Dict, Optional
+from jini_client import JiniClient
+from memory_tiers import TieredMemory
+from response_cache import ResponseCache
+from sensor_tail import TailReader
+from context_budget import ContextBudgeter
 
 # --- SensorStream for Continuous Data Retrieval ---
 class SensorStream:
     def __init__(self, file_path: str):
         self.file_path = file_path
+        self._tail = TailReader(file_path)
 
     def get_latest_event(self) -> Dict:
-        try:
-            with open(self.file_path, "r", encoding="utf-8") as file:
-                lines = file.readlines()
-                if lines:
-                    return json.loads(lines[-1])
-        except json.JSONDecodeError:
-            return {}
-        except FileNotFoundError:
-            return {}
-        return {}
+        return self._tail.latest_event()
 
-# --- Episodic Memory Module ---
-class EpisodicMemory:
-    def __init__(self):
-        self.memory_store: List[Dict] = []
+    def get_new_events(self) -> List[Dict]:
+        return self._tail.read_new()
 
-    def add_event(self, event: Dict):
-        self.memory_store.append(event)
-        if len(self.memory_store) > 1000:
-            self.memory_store.pop(0)
-
-    def retrieve_memory(self, query: str) -> str:
-        relevant_memories = [json.dumps(m) for m in self.memory_store if query.lower() in json.dumps(m).lower()]
-        return "\n".join(relevant_memories[-5:])
+def _tagged(on_token: Optional[Callable[[str, str], None]], agent: str) -> Optional[Callable[[str], None]]:
+    return (lambda token: on_token(agent, token)) if on_token else None
 
 # --- Digital Neocortex: Main Integration ---
 class DigitalNeocortex:
     def __init__(self, file_path: str):
         self.sensors = SensorStream(file_path)
-        self.memory = EpisodicMemory()
-        self.llm1 = JiniClient()
-        self.llm2 = JiniClient()
-        self.opinionAI = JiniClient()
+        self.memory = TieredMemory()
+        self.cache = ResponseCache.from_env()  # Shared by the three agents
+        self.llm1 = JiniClient(cache=self.cache)
+        self.llm2 = JiniClient(cache=self.cache)
+        self.opinionAI = JiniClient(cache=self.cache)
+        self.context = ContextBudgeter()  # Bounds the sensor data and memories put in each prompt
         self.previous_sensor_data = ""
 
     def process_event(self, event: Dict):
@@ -73,22 +45,26 @@ class DigitalNeocortex:
             return "No new events detected."
         return json.dumps(latest_event, indent=4)
 
-    def respond(self, user_query: str) -> Dict:
-        memory_context = self.memory.retrieve_memory(user_query)
-        real_time_data = json.dumps(self.sensors.get_latest_event(), indent=4) if self.sensors.get_latest_event() else ""
+    def respond(self, user_query: str, on_token: Optional[Callable[[str, str], None]] = None) -> Dict:
+        # on_token(agent, token) receives every token as it streams in
+        memory_context = self.context.pack_lines(self.memory.retrieve_memory(user_query)).text
+        latest_event = self.sensors.get_latest_event()
+        sensor_data = json.dumps(latest_event, indent=4) if latest_event else ""
+        pack = self.context.pack([latest_event] if latest_event else [], baseline=sensor_data)
+        real_time_data = pack.text
         
         llm1_prompt = (
             f"Llm1: Hey, just checking out the latest sensor data. Looks like we're experiencing: \n"
             f"{real_time_data}\n\nWhat do you think?"
         )
-        llm1_response = self.llm1.query(llm1_prompt)
+        llm1_response = self.llm1.query(llm1_prompt, on_token=_tagged(on_token, "Llm1"))
         
         llm2_prompt = (
             f"Llm2: Huh, reminds me of past experiences: {memory_context}\n"
             f"Llm1: {llm1_response}\n"
             f"Llm2: But do you think there's anything unusual here?"
         )
-        llm2_response = self.llm2.query(llm2_prompt)
+        llm2_response = self.llm2.query(llm2_prompt, on_token=_tagged(on_token, "Llm2"))
         
         opinionAI_prompt = (
             f"OpinionAI: Analyzing conversation between Llm1 and Llm2. Identifying gaps between sensory data interpretation and generated story context.\n"
@@ -97,9 +73,10 @@ class DigitalNeocortex:
             f"Llm2: {llm2_response}\n"
             f"Technical Analysis: "
         )
-        opinionAI_response = self.opinionAI.query(opinionAI_prompt)
+        opinionAI_response = self.opinionAI.query(opinionAI_prompt, on_token=_tagged(on_token, "OpinionAI"))
         
-        return {"Llm1": llm1_response, "Llm2": llm2_response, "OpinionAI": opinionAI_response, "SensorData": real_time_data}
+        return {"Llm1": llm1_response, "Llm2": llm2_response, "OpinionAI": opinionAI_response, "SensorData": sensor_data,
+                "ContextTokens": {"tokens": pack.tokens, "saved": pack.saved_tokens}}
 
 # --- Streamlit UI ---
 def main():
@@ -117,19 +94,30 @@ def main():
             brain.process_event(latest_event)
             generated_query = brain.generate_query()
             if generated_query != "No new events detected.":
-                responses = brain.respond(generated_query)
-                st.session_state.conversation.append((generated_query, responses))
-                
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.write("**Llm1 (Casual Interpretation):**")
-                    st.write(responses["Llm1"])
+                    llm1_box = st.empty()
                 with col2:
                     st.write("**Llm2 (Contextual Reflection):**")
-                    st.write(responses["Llm2"])
+                    llm2_box = st.empty()
                 with col3:
                     st.write("**OpinionAI (Technical Analysis):**")
-                    st.write(responses["OpinionAI"])
+                    opinion_box = st.empty()
+                boxes = {"Llm1": llm1_box, "Llm2": llm2_box, "OpinionAI": opinion_box}
+                streamed = {name: [] for name in boxes}
+                last_render = [0.0]
+
+                def show_token(agent: str, token: str):
+                    streamed[agent].append(token)
+                    if time.monotonic() - last_render[0] >= 0.1:
+                        last_render[0] = time.monotonic()
+                        boxes[agent].write("".join(streamed[agent]))
+
+                responses = brain.respond(generated_query, on_token=show_token)
+                st.session_state.conversation.append((generated_query, responses))
+                for name, box in boxes.items():
+                    box.write(responses[name])
                 
                 st.write("---")
                 st.subheader("Live Sensor Data")
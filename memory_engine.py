@@ -0,0 +1,109 @@
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+DEFAULT_CAPACITY = int(os.environ.get("EPISODIC_MEMORY_CAPACITY", 1000))
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+# --- Episodic Memory Module ---
+# Ring buffer of events with the serialized and lowercased text cached at insert time,
+# plus an inverted token index. Eviction overwrites the oldest slot and unindexes only
+# that event, so inserts cost the same at any capacity. on_evict, if given, receives the
+# serialized form of every event pushed out (memory_tiers.py archives them).
+class EpisodicMemory:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_results: int = 5,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.max_results = max_results
+        self.on_evict = on_evict
+        # Each slot holds (seq, serialized, lowered, tokens)
+        self._slots: List[Optional[Tuple[int, str, str, Set[str]]]] = [None] * capacity
+        self._next_seq = 0
+        self._index: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return min(self._next_seq, self.capacity)
+
+    def add_event(self, event: Dict):
+        seq = self._next_seq
+        slot = seq % self.capacity
+        evicted = self._slots[slot]
+        if evicted is not None:
+            self._unindex(evicted[0], evicted[3])
+            if self.on_evict is not None:
+                self.on_evict(evicted[1])
+
+        serialized = json.dumps(event)
+        lowered = serialized.lower()
+        tokens = set(_TOKEN_RE.findall(lowered))
+        self._slots[slot] = (seq, serialized, lowered, tokens)
+        for token in tokens:
+            self._index.setdefault(token, set()).add(seq)
+        self._next_seq += 1
+
+    def _unindex(self, seq: int, tokens: Set[str]):
+        for token in tokens:
+            postings = self._index.get(token)
+            if postings is None:
+                continue
+            postings.discard(seq)
+            if not postings:
+                del self._index[token]
+
+    def _entry(self, seq: int) -> Tuple[int, str, str, Set[str]]:
+        return self._slots[seq % self.capacity]
+
+    def _newest_first(self):
+        oldest = max(0, self._next_seq - self.capacity)
+        for seq in range(self._next_seq - 1, oldest - 1, -1):
+            yield seq
+
+    @staticmethod
+    def _whole_tokens(query: str) -> List[str]:
+        # A token with a delimiter on both sides inside the query must also be a whole
+        # token of any event text that contains the query as a substring.
+        tokens = []
+        for match in _TOKEN_RE.finditer(query):
+            if match.start() > 0 and match.end() < len(query):
+                tokens.append(match.group())
+        return tokens
+
+    def _candidates(self, tokens: List[str], match_all: bool = True):
+        postings = [self._index.get(token, set()) for token in set(tokens)]
+        if match_all:
+            postings.sort(key=len)
+            seqs = set(postings[0]) if postings else set()
+            for other in postings[1:]:
+                seqs &= other
+                if not seqs:
+                    break
+        else:
+            seqs = set().union(*postings) if postings else set()
+        return sorted(seqs, reverse=True)
+
+    def retrieve_memory(self, query: str) -> str:
+        """Return the most recent events whose JSON contains the query (case-insensitive)."""
+        query = query.lower()
+        whole_tokens = self._whole_tokens(query)
+        seqs = self._candidates(whole_tokens) if whole_tokens else self._newest_first()
+
+        matches = []
+        for seq in seqs:
+            _, serialized, lowered, _ = self._entry(seq)
+            if query in lowered:
+                matches.append(serialized)
+                if len(matches) == self.max_results:
+                    break
+        return "\n".join(reversed(matches))
+
+    def retrieve_keywords(self, query: str, match_all: bool = False) -> str:
+        """Return the most recent events sharing any (or every) keyword with the query."""
+        tokens = _TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return ""
+        seqs = self._candidates(tokens, match_all=match_all)[: self.max_results]
+        return "\n".join(self._entry(seq)[1] for seq in reversed(seqs))
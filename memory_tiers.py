@@ -0,0 +1,449 @@
+import atexit
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import tracing
+from memory_engine import DEFAULT_CAPACITY, EpisodicMemory
+
+MEMORY_WINDOW_SECONDS = float(os.environ.get("MEMORY_WINDOW_SECONDS", 600))  # span of one warm summary
+MEMORY_WARM_WINDOWS = int(os.environ.get("MEMORY_WARM_WINDOWS", 1000))  # summaries kept in RAM
+MEMORY_ARCHIVE_DIR = os.environ.get("MEMORY_ARCHIVE_DIR", "memory_archive")  # gitignored
+MEMORY_ARCHIVE_EVENTS = int(os.environ.get("MEMORY_ARCHIVE_EVENTS", 50000))  # events per archive file
+MEMORY_COLD_WINDOWS = int(os.environ.get("MEMORY_COLD_WINDOWS", 32))  # archived windows read per lookup
+MEMORY_COMPACT_SECONDS = float(os.environ.get("MEMORY_COMPACT_SECONDS", 1.0))
+MEMORY_SUMMARY_RESULTS = int(os.environ.get("MEMORY_SUMMARY_RESULTS", 2))  # window summaries per lookup
+
+# --- Tiered episodic memory ---
+# Three tiers behind the EpisodicMemory interface. The hot tier is an EpisodicMemory ring
+# buffer of raw events. Events it evicts are handed to a background compactor, which
+# appends them to a cold archive (MEMORY_ARCHIVE_DIR/events_*.json, one JSON event per
+# line like the history/ snapshots) and folds them into a warm summary per
+# MEMORY_WINDOW_SECONDS window: event count, time span, the most common value of each text
+# field, numeric ranges, the vocabulary seen, and the byte range the window occupies in its
+# archive. Summaries are
+# also appended to a sidecar (<archive>.idx), so a restart reloads the warm tier without
+# rereading the archives.
+# A lookup searches the hot tier first, then events awaiting compaction, then archived
+# windows newest first. The warm vocabulary rules out windows that cannot contain the
+# query, down to the partial words at its edges, and at most MEMORY_COLD_WINDOWS windows
+# are read from disk, each with a single seek. Raw matches keep the EpisodicMemory format (JSON lines, oldest first); older
+# matching windows beyond max_results are added as summary lines. RAM stays bounded by
+# the hot capacity, MEMORY_WARM_WINDOWS summaries and the compaction backlog.
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+# The vocabulary keeps the digit-free runs of every token ("device_7" gives "device_"), so
+# timestamps and numbers add nothing, yet any digit-free piece of a token can be matched
+_WORD_RE = re.compile(r"[a-z_]+")
+_SKIP = {"timestamp", "event_id", "device_id"}
+MAX_VALUES = 16  # Distinct values counted per text field and window
+MAX_TOKENS = 1024  # Past this the window's vocabulary is dropped and it is always read
+COMPACT_BATCH = 256  # Backlog that wakes the compactor early
+BACKLOG_LIMIT = 8 * COMPACT_BATCH  # Past this add_event compacts inline instead of queueing
+
+def event_time(event: Dict) -> float:
+    value = event.get("timestamp")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return time.time()
+    if parsed.tzinfo is None:  # Naive times are UTC, as script.py's utcnow() writes them
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def substring_terms(query: str) -> List[Tuple[str, str]]:
+    """What each token of a lowered query requires of an event text that contains the query."""
+    # "red apple": some event token ends with "red" and the next one starts with "apple"; a
+    # token with delimiters on both sides is a whole event token, and a query without any
+    # delimiter only has to appear inside one
+    terms = []
+    for match in _TOKEN_RE.finditer(query):
+        after, before = match.start() > 0, match.end() < len(query)
+        kind = "whole" if after and before else "suffix" if before else "prefix" if after else "infix"
+        terms.append((kind, match.group()))
+    return terms
+
+def _fields(event: Dict) -> Iterable[Tuple[str, object]]:
+    for key, value in event.items():
+        if isinstance(value, dict):
+            yield from ((k, v) for k, v in value.items() if k not in _SKIP)
+        elif key not in _SKIP:
+            yield key, value
+
+def _number(value: float) -> str:
+    return f"{value:.4g}"
+
+class WindowSummary:
+    __slots__ = ("bucket", "start", "end", "count", "path", "offset", "length", "values", "numbers", "tokens")
+
+    def __init__(self, bucket: int, path: str, offset: int):
+        self.bucket = bucket
+        self.start = self.end = None
+        self.count = 0
+        self.path = path
+        self.offset = offset
+        self.length = 0
+        self.values: Dict[str, Counter] = {}
+        self.numbers: Dict[str, List[float]] = {}  # field -> [min, max]
+        self.tokens: Optional[Set[str]] = set()
+
+    def add(self, event: Dict, timestamp: float, lowered: str, size: int):
+        self.start = timestamp if self.start is None else min(self.start, timestamp)
+        self.end = timestamp if self.end is None else max(self.end, timestamp)
+        self.count += 1
+        self.length += size
+        for key, value in _fields(event):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                bounds = self.numbers.get(key)
+                if bounds is None:
+                    self.numbers[key] = [float(value), float(value)]
+                else:
+                    bounds[0], bounds[1] = min(bounds[0], value), max(bounds[1], value)
+            elif isinstance(value, str):
+                counter = self.values.setdefault(key, Counter())
+                if value in counter or len(counter) < MAX_VALUES:
+                    counter[value] += 1
+        if self.tokens is not None:
+            self.tokens.update(_WORD_RE.findall(lowered))
+            if len(self.tokens) > MAX_TOKENS:
+                self.tokens = None
+
+    def may_contain(self, tokens: List[str], match_all: bool = True) -> bool:
+        if self.tokens is None or not tokens:
+            return True
+        words = [token for token in tokens if _WORD_RE.fullmatch(token)]
+        if not words:
+            return True  # Only numeric tokens, which the vocabulary does not record
+        if match_all:
+            return all(token in self.tokens for token in words)
+        return len(words) < len(tokens) or any(token in self.tokens for token in words)
+
+    def may_contain_text(self, terms: List[Tuple[str, str]]) -> bool:
+        """Whether the window can hold a substring match, given the query's substring_terms()."""
+        if self.tokens is None:
+            return True
+        for kind, token in terms:
+            if not _WORD_RE.fullmatch(token):
+                continue  # A token with digits may sit across runs the vocabulary splits
+            if kind == "whole":
+                found = token in self.tokens
+            elif kind == "suffix":
+                found = any(word.endswith(token) for word in self.tokens)
+            elif kind == "prefix":
+                found = any(word.startswith(token) for word in self.tokens)
+            else:
+                found = any(token in word for word in self.tokens)
+            if not found:
+                return False
+        return True
+
+    def record(self) -> Dict:
+        return {
+            "bucket": self.bucket, "start": self.start, "end": self.end, "count": self.count,
+            "path": os.path.basename(self.path), "offset": self.offset, "length": self.length,
+            "values": {key: dict(counter) for key, counter in self.values.items()},
+            "numbers": self.numbers,
+            "tokens": sorted(self.tokens) if self.tokens is not None else None,
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict, directory: str) -> "WindowSummary":
+        summary = cls(record["bucket"], os.path.join(directory, record["path"]), record["offset"])
+        summary.start, summary.end = record["start"], record["end"]
+        summary.count, summary.length = record["count"], record["length"]
+        summary.values = {key: Counter(values) for key, values in record["values"].items()}
+        summary.numbers = record["numbers"]
+        summary.tokens = set(record["tokens"]) if record["tokens"] is not None else None
+        return summary
+
+    def describe(self, matches: int) -> Dict:
+        """The window as one event-shaped dict, for prompts next to raw events."""
+        start, end = (datetime.fromtimestamp(t, timezone.utc) for t in (self.start, self.end))
+        span = f"{start:%Y-%m-%d %H:%M}-{end:%H:%M} UTC"
+        summary = {
+            "timestamp": end.isoformat(),
+            "summary": f"{matches} of {self.count} events matched {span}",
+        }
+        for key, counter in self.values.items():
+            summary[key] = ", ".join(f"{value} x{count}" for value, count in counter.most_common(3))
+        for key, (low, high) in self.numbers.items():
+            summary[key] = _number(low) if low == high else f"{_number(low)}..{_number(high)}"
+        return summary
+
+    def read(self) -> List[str]:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(self.length)
+        except OSError:
+            return []  # Archive removed or moved; the summary is all that is left
+        return data.decode("utf-8", "replace").splitlines()
+
+class ColdArchive:
+    # Appends events to history-style JSON-lines files and window summaries to their sidecars
+    def __init__(self, directory: str = MEMORY_ARCHIVE_DIR, max_events: int = MEMORY_ARCHIVE_EVENTS):
+        self.directory = directory
+        self.max_events = max_events
+        self.path: Optional[str] = None
+        self._file = None
+        self._events = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path, suffix = os.path.join(self.directory, f"events_{stamp}.json"), 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"events_{stamp}_{suffix}.json")
+            suffix += 1
+        self.path, self._file, self._events = path, open(path, "ab"), 0
+
+    def offset(self) -> int:
+        if self._file is None:
+            self._open()
+        return self._file.tell()
+
+    def append(self, data: bytes):
+        self._file.write(data)
+        self._events += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close_window(self, summary: WindowSummary):
+        with open(summary.path + ".idx", "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary.record()) + "\n")
+        if self._events >= self.max_events:
+            self.close()  # Windows never span two archives, so rotate only between them
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def load_summaries(directory: str, limit: int) -> List[WindowSummary]:
+    """The newest `limit` window summaries found in the sidecars under `directory`, oldest first."""
+    summaries: List[WindowSummary] = []
+    for index_path in sorted(glob.glob(os.path.join(directory, "events_*.json.idx")), reverse=True):
+        with open(index_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        summaries[:0] = [WindowSummary.from_record(record, directory) for record in records]
+        if len(summaries) >= limit:
+            break
+    return summaries[-limit:] if limit else []
+
+def index_archive(path: str, window_seconds: float = MEMORY_WINDOW_SECONDS) -> int:
+    """Write the sidecar for an existing snapshot (such as history/events_*.json); returns windows indexed."""
+    windows = 0
+    summary: Optional[WindowSummary] = None
+    offset = 0
+    with open(path, "rb") as source, open(path + ".idx", "w", encoding="utf-8") as sidecar:
+        for raw in source:
+            try:
+                event = json.loads(raw)
+            except json.JSONDecodeError:
+                if summary is not None:
+                    summary.length += len(raw)  # Keep the byte range contiguous
+                offset += len(raw)
+                continue
+            timestamp = event_time(event)
+            bucket = int(timestamp // window_seconds)
+            if summary is not None and bucket > summary.bucket:
+                sidecar.write(json.dumps(summary.record()) + "\n")
+                windows += 1
+                summary = None
+            if summary is None:
+                summary = WindowSummary(bucket, path, offset)
+            summary.add(event, timestamp, raw.decode("utf-8", "replace").lower(), len(raw))
+            offset += len(raw)
+        if summary is not None:
+            sidecar.write(json.dumps(summary.record()) + "\n")
+            windows += 1
+    return windows
+
+class TieredMemory:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_results: int = 5,
+                 archive_dir: str = MEMORY_ARCHIVE_DIR, window_seconds: float = MEMORY_WINDOW_SECONDS,
+                 warm_windows: int = MEMORY_WARM_WINDOWS, cold_windows: int = MEMORY_COLD_WINDOWS,
+                 summary_results: int = MEMORY_SUMMARY_RESULTS, compact_seconds: float = MEMORY_COMPACT_SECONDS):
+        self.max_results = max_results
+        self.window_seconds = window_seconds
+        self.cold_windows = cold_windows
+        self.summary_results = summary_results
+        self.hot = EpisodicMemory(capacity, max_results, on_evict=self._evicted)
+        self.archive = ColdArchive(archive_dir)
+        self.warm: "deque[WindowSummary]" = deque(load_summaries(archive_dir, warm_windows), maxlen=warm_windows)
+        self._open: Optional[WindowSummary] = None
+        self._backlog: "deque[str]" = deque()
+        self._hot_lock = threading.Lock()
+        self._lock = threading.Lock()  # Guards the backlog, the open window, the warm tier and the archive
+        self._wake = threading.Event()
+        self._closed = False
+        self.compacted = 0
+        self.cold_reads = 0
+        self._compactor = threading.Thread(target=self._run, args=(compact_seconds,), daemon=True)
+        self._compactor.start()
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        return len(self.hot) + len(self._backlog) + self.compacted
+
+    # --- Compaction ---
+    def _evicted(self, serialized: str):
+        self._backlog.append(serialized)
+        if len(self._backlog) >= BACKLOG_LIMIT:
+            self.compact()  # The compactor is behind; do the work here rather than grow the backlog
+        elif len(self._backlog) >= COMPACT_BATCH:
+            self._wake.set()
+
+    def _run(self, interval: float):
+        while not self._closed:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.compact()
+
+    def _close_window(self):
+        self.archive.close_window(self._open)
+        self.warm.append(self._open)
+        self._open = None
+
+    def compact(self) -> int:
+        """Move queued evictions into the cold archive and the warm summaries."""
+        with self._lock:
+            moved = 0
+            while self._backlog:
+                serialized = self._backlog[0]
+                event = json.loads(serialized)
+                timestamp = event_time(event)
+                bucket = int(timestamp // self.window_seconds)
+                if self._open is not None and bucket > self._open.bucket:
+                    self._close_window()
+                if self._open is None:
+                    offset = self.archive.offset()
+                    self._open = WindowSummary(bucket, self.archive.path, offset)
+                data = (serialized + "\n").encode("utf-8")
+                self.archive.append(data)
+                self._open.add(event, timestamp, serialized.lower(), len(data))
+                self._backlog.popleft()  # Only now, so a concurrent lookup still finds it in the backlog
+                moved += 1
+            if moved:
+                self.archive.flush()
+                self.compacted += moved
+            return moved
+
+    def close(self):
+        """Archive everything still held in RAM, including the hot tier, and stop the compactor."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._compactor.join(timeout=5)
+        with self._hot_lock:
+            self._backlog.extend(self.hot._entry(seq)[1] for seq in reversed(list(self.hot._newest_first())))
+        self.compact()
+        with self._lock:
+            if self._open is not None:
+                self._close_window()
+            self.archive.close()
+
+    # --- Retrieval ---
+    def add_event(self, event: Dict):
+        with self._hot_lock:
+            self.hot.add_event(event)
+
+    def _search(self, query: str, tokens: List[str], match_all: bool, keywords: bool) -> Tuple[List[str], List[Dict]]:
+        """Up to max_results raw matches newest first, plus summaries of older matching windows."""
+        def matches(lowered: str) -> bool:
+            if not keywords:
+                return query in lowered
+            found = set(_TOKEN_RE.findall(lowered))
+            return all(t in found for t in tokens) if match_all else any(t in found for t in tokens)
+
+        with self._hot_lock:
+            hot = self.hot.retrieve_keywords(query, match_all) if keywords else self.hot.retrieve_memory(query)
+        raw = list(reversed(hot.splitlines())) if hot else []
+        with self._lock:
+            backlog = list(self._backlog)
+            windows = ([self._open] if self._open is not None else []) + list(reversed(self.warm))
+
+        for serialized in reversed(backlog):
+            if len(raw) == self.max_results:
+                break
+            if matches(serialized.lower()):
+                raw.append(serialized)
+
+        if keywords:
+            may_contain = lambda window: window.may_contain(tokens, match_all)
+        else:
+            terms = substring_terms(query)
+            may_contain = lambda window: window.may_contain_text(terms)
+
+        summaries: List[Dict] = []
+        reads = 0
+        with tracing.span("memory.cold", windows=len(windows)) as span:
+            raw, summaries, reads = self._search_cold(windows, raw, may_contain, matches)
+            span.set(reads=reads)
+        self.cold_reads += reads
+        tracing.count("memory.cold_reads", reads)
+        return raw, summaries
+
+    def _search_cold(self, windows: List[WindowSummary], raw: List[str], may_contain,
+                     matches) -> Tuple[List[str], List[Dict], int]:
+        summaries: List[Dict] = []
+        reads = 0
+        for window in windows:
+            if len(summaries) == self.summary_results or reads == self.cold_windows:
+                break
+            if not may_contain(window):
+                continue
+            reads += 1
+            found = [line for line in reversed(window.read()) if line and matches(line.lower())]
+            taken = min(len(found), self.max_results - len(raw))
+            raw.extend(found[:taken])
+            if len(found) > taken:
+                summaries.append(window.describe(len(found)))
+        return raw, summaries, reads
+
+    def _format(self, raw: List[str], summaries: List[Dict]) -> str:
+        lines = [json.dumps(summary) for summary in reversed(summaries)] + list(reversed(raw))
+        return "\n".join(lines)
+
+    def retrieve_memory(self, query: str) -> str:
+        """Like EpisodicMemory.retrieve_memory, across all tiers; older matching windows come first as summaries."""
+        query = query.lower()
+        with tracing.span("memory.retrieve"):
+            return self._format(*self._search(query, [], True, keywords=False))
+
+    def retrieve_keywords(self, query: str, match_all: bool = False) -> str:
+        tokens = _TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return ""
+        with tracing.span("memory.retrieve", keywords=len(tokens)):
+            return self._format(*self._search(query.lower(), tokens, match_all, keywords=True))
+
+    def stats(self) -> Dict:
+        return {
+            "hot_events": len(self.hot),
+            "backlog": len(self._backlog),
+            "warm_windows": len(self.warm) + (self._open is not None),
+            "archived_events": self.compacted,
+            "archive": self.archive.path,
+            "cold_reads": self.cold_reads,
+        }
+
+if __name__ == "__main__":
+    # python memory_tiers.py history/events_*.json
+    if len(sys.argv) < 2:
+        print("usage: python memory_tiers.py SNAPSHOT.json [SNAPSHOT.json ...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        print(f"Indexed {index_archive(path)} windows of {path} into {path}.idx")
@@ -1,7 +1,36 @@
+import os
+
 import pathway as pw
-from pathway.xpacks.llm import embedders
-from pathway.stdlib.indexing.nearest_neighbors import BruteForceKnnFactory
+from pathway.stdlib.indexing.nearest_neighbors import (
+    BruteForceKnnFactory,
+    LshKnnFactory,
+    UsearchKnnFactory,
+)
 from pathway.xpacks.llm.document_store import DocumentStore
+from embedding_service import EMBED_MODEL
+from embedding_stage import BatchedSentenceTransformerEmbedder
+from prefilter_index import PrefilterKnnFactory
+from time_index import TimePartitionedIndex, index_events, parse_timestamp, recent_query_handler
+from vector_snapshot import PIPELINE_SNAPSHOT_DIR, SnapshotCheckpointer, VectorSnapshot, document_text
+from window_stats import WindowAggregator, aggregate_events, aggregate_query_handler
+from anomaly_detector import AnomalyDetector
+
+DATA_PATH = os.environ.get("PIPELINE_DATA_PATH", "simulated_data.jsonl")
+# Rows read within this window are committed, and therefore embedded, together
+INGEST_WINDOW_MS = int(os.environ.get("INGEST_WINDOW_MS", 1500))
+
+# Retriever mode is picked at startup: "brute_force" (exact), "hnsw" (usearch graph index)
+# "lsh" (bucketed, IVF-style) or "prefilter" (exact, narrows candidates with metadata indexes
+# before scoring). Run benchmarks/retriever_report.py and benchmarks/prefilter_selectivity.py
+# to compare them.
+RETRIEVER_MODE = os.environ.get("RETRIEVER_MODE", "brute_force")
+RESERVED_SPACE = int(os.environ.get("RETRIEVER_RESERVED_SPACE", 1000))
+HNSW_CONNECTIVITY = int(os.environ.get("HNSW_CONNECTIVITY", 0))  # 0 lets usearch pick
+HNSW_EXPANSION_ADD = int(os.environ.get("HNSW_EXPANSION_ADD", 0))
+HNSW_EXPANSION_SEARCH = int(os.environ.get("HNSW_EXPANSION_SEARCH", 0))
+LSH_BUCKET_LENGTH = float(os.environ.get("LSH_BUCKET_LENGTH", 10.0))
+LSH_N_OR = int(os.environ.get("LSH_N_OR", 20))
+LSH_N_AND = int(os.environ.get("LSH_N_AND", 10))
 
 # Define schema (keep reading as a string)
 class InputSchema(pw.Schema):
@@ -13,10 +42,11 @@ class InputSchema(pw.Schema):
 
 # Read the JSONL file in streaming mode and explicitly convert "reading" to a string
 data_source = pw.io.jsonlines.read(
-    "simulated_data.jsonl",
+    DATA_PATH,
     schema=InputSchema,
     with_metadata=True,
-    mode="streaming"   # Enable streaming mode
+    mode="streaming",   # Enable streaming mode
+    autocommit_duration_ms=INGEST_WINDOW_MS,
 ).select(
     timestamp=pw.this.timestamp,
     sensor=pw.this.sensor,
@@ -25,19 +55,82 @@ data_source = pw.io.jsonlines.read(
     metadata=pw.this.metadata
 )
 
-# Assemble the DocumentStore by creating a 'data' column (as bytes) and mapping metadata.
-data_source = data_source.select(
-    data = pw.apply(
-        lambda ts, sensor, reading, intensity: 
-            f"Timestamp: {ts} | Sensor: {sensor} | Reading: {reading} | Intensity: {intensity}".encode("utf-8"),
-        pw.this.timestamp, pw.this.sensor, pw.this.reading, pw.this.intensity
+# Windowed counts and stats per sensor / location / device_id, served by server.py as
+# /v1/aggregate; "how many events in the last hour" never needs the LLM or vector search
+window_aggregator = WindowAggregator()
+aggregate_events(window_aggregator, data_source)
+aggregate_retrieve = aggregate_query_handler(window_aggregator)
+
+# Online EWMA z-scores per device_id and per location (anomaly_detector.py). Rows are scored as
+# the engine commits them, so within one INGEST_WINDOW_MS minibatch order is not guaranteed
+anomaly_detector = AnomalyDetector()
+
+def event_metadata(metadata: pw.Json, timestamp: str, sensor: str, reading: str, intensity: float) -> pw.Json:
+    metadata = metadata.value
+    flags = anomaly_detector.score({"sensor": sensor, "reading": reading, "intensity": intensity, "metadata": metadata})
+    return pw.Json({**metadata, "ts": parse_timestamp(timestamp), **flags})
+
+# Every event's document text; the timestamp is also parsed into metadata["ts"] (epoch
+# seconds), so with RETRIEVER_MODE=prefilter a filter like ts >= `1742630000` bounds it.
+# Anomaly flags join the metadata too: a metadata_filter of just `anomaly` keeps flagged events
+events = data_source.select(
+    text=pw.apply(document_text, pw.this.timestamp, pw.this.sensor, pw.this.reading, pw.this.intensity),
+    timestamp=pw.this.timestamp,
+    metadata=pw.apply_with_type(
+        event_metadata,
+        pw.Json, pw.this.metadata, pw.this.timestamp, pw.this.sensor, pw.this.reading, pw.this.intensity
     ),
-    _metadata = pw.this.metadata
 )
 
-# Set up embedder and retriever factory
-embedder = embedders.SentenceTransformerEmbedder(model="all-MiniLM-L12-v2")
-retriever_factory = BruteForceKnnFactory(embedder=embedder)
+# Assemble the DocumentStore by creating a 'data' column (as bytes) and mapping metadata.
+data_source = events.select(
+    data=pw.apply(lambda text: text.encode("utf-8"), pw.this.text),
+    _metadata=pw.this.metadata
+)
+
+# Set up embedder and retriever factory; rows are embedded in batches of EMBED_BATCH_SIZE.
+# DefaultCache only stores vectors when the server runs with_cache (SERVER_MODE=production);
+# the cache is named after the model so switching models never reuses stale vectors
+embedder = BatchedSentenceTransformerEmbedder(
+    model=EMBED_MODEL,
+    cache_strategy=pw.udfs.DefaultCache(name="embeddings_" + EMBED_MODEL.replace("/", "_")),
+)
+
+# Vectors computed by earlier runs are memory-mapped from PIPELINE_SNAPSHOT_DIR, so a restart
+# only runs the model on rows appended after the last checkpoint (vector_snapshot.py)
+snapshot_checkpointer = None
+if PIPELINE_SNAPSHOT_DIR:
+    embedder.snapshot = VectorSnapshot(PIPELINE_SNAPSHOT_DIR, DATA_PATH, EMBED_MODEL, embedder.get_embedding_dimension())
+    snapshot_checkpointer = SnapshotCheckpointer(embedder.snapshot, embedder).start()
+
+def build_retriever_factory(mode: str, embedder):
+    if mode == "brute_force":
+        return BruteForceKnnFactory(embedder=embedder, reserved_space=RESERVED_SPACE)
+    if mode == "hnsw":
+        return UsearchKnnFactory(
+            embedder=embedder,
+            reserved_space=RESERVED_SPACE,
+            connectivity=HNSW_CONNECTIVITY,
+            expansion_add=HNSW_EXPANSION_ADD,
+            expansion_search=HNSW_EXPANSION_SEARCH,
+        )
+    if mode == "lsh":
+        return LshKnnFactory(
+            embedder=embedder,
+            dimensions=embedder.get_embedding_dimension(),
+            bucket_length=LSH_BUCKET_LENGTH,
+            n_or=LSH_N_OR,
+            n_and=LSH_N_AND,
+        )
+    if mode == "prefilter":
+        return PrefilterKnnFactory(
+            embedder=embedder,
+            dimensions=embedder.get_embedding_dimension(),
+            reserved_space=RESERVED_SPACE,
+        )
+    raise ValueError(f"Unknown RETRIEVER_MODE {mode!r}, expected brute_force, hnsw, lsh or prefilter")
+
+retriever_factory = build_retriever_factory(RETRIEVER_MODE, embedder)
 
 # Create the DocumentStore
 store = DocumentStore(
@@ -45,6 +138,13 @@ store = DocumentStore(
     retriever_factory=retriever_factory,
 )
 
+# Time-partitioned copy of the events for window / recency-weighted recall, served by
+# server.py as /v1/retrieve_recent. The embedder memoizes texts, so the DocumentStore and
+# this index share one model call per event.
+time_index = TimePartitionedIndex(embedder.get_embedding_dimension())
+index_events(time_index, events, embedder)
+recent_retrieve = recent_query_handler(time_index, embedder)
+
 # Optional: If you run pipeline.py directly, you can run the computation.
 if __name__ == "__main__":
     # Optionally print some debug info
@@ -0,0 +1,404 @@
+import bisect
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import jmespath
+import numpy as np
+import pathway as pw
+from pathway.stdlib.indexing.colnames import _INDEX_REPLY
+from pathway.stdlib.indexing.data_index import InnerIndex
+from pathway.stdlib.indexing.nearest_neighbors import KnnIndexFactory
+from pathway.stdlib.ml.classifiers._knn_lsh import _glob_options  # globmatch(), as DocumentStore uses it
+
+import tracing
+
+# --- Metadata pre-filter index ---
+# Retrieval queries nearly always carry a metadata_filter (location == 'home', ...). Instead of
+# scoring every vector and filtering afterwards, the index keeps a hash index (value -> rows)
+# for every scalar metadata field and a sorted index (value, row) for numeric ones. The
+# indexable part of a filter (equalities and numeric ranges joined by &&) picks the candidate
+# rows first; the kNN then scores only those, and anything the indexes cannot answer
+# (!=, ||, globmatch, ...) is checked with JMESPath on the best-scoring candidates until k
+# rows pass. Filters mean exactly what they mean to JMESPath, as in the other retriever
+# modes: DocumentStore rewrites `literals` into 'raw strings' before the filter gets here, so
+# device_id == `7` matches only the string "7" and a numeric bound is written
+# battery_level > to_number(`50`). A comparison JMESPath cannot evaluate matches nothing.
+
+_PATH = r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*"
+_RAW = r"'(?:\\.|[^'\\])*'"
+_TERM = re.compile(rf"^({_PATH})\s*(==|<=|>=|<|>)\s*({_RAW}|`(?:\\.|[^`\\])*`|to_number\(\s*{_RAW}\s*\))$")
+_NO_VALUE = object()
+
+def _value_key(value) -> Optional[Hashable]:
+    # JMESPath equality never treats booleans as numbers, so they get their own key space
+    if isinstance(value, bool):
+        return ("b", value)
+    if isinstance(value, (int, float)):
+        return ("n", float(value))
+    if isinstance(value, str):
+        return ("s", value)
+    if value is None:
+        return ("null", None)
+    return None  # Lists and objects are not indexed
+
+def _split_top_level(expression: str, operator: str) -> List[str]:
+    parts, depth, quote, start, i = [], 0, None, 0, 0
+    while i < len(expression):
+        char = expression[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "'`\"":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif depth == 0 and expression.startswith(operator, i):
+            parts.append(expression[start:i])
+            start = i + len(operator)
+            i += len(operator)
+            continue
+        i += 1
+    parts.append(expression[start:])
+    return [part.strip() for part in parts]
+
+def _strip_parens(expression: str) -> str:
+    while expression.startswith("(") and expression.endswith(")"):
+        inner = expression[1:-1].strip()
+        depth = 0
+        for char in inner:  # "(a) && (b)" must keep its parentheses
+            depth += char == "("
+            depth -= char == ")"
+            if depth < 0:
+                return expression
+        expression = inner
+    return expression
+
+def _literal(token: str):
+    # JMESPath evaluates the literal itself, so '7' stays a string and to_number('7') is 7
+    try:
+        return jmespath.search(token, None)
+    except jmespath.exceptions.JMESPathError:
+        return _NO_VALUE
+
+@lru_cache(maxsize=1024)
+def plan_filter(expression: Optional[str]) -> Tuple[Tuple, Optional[jmespath.parser.ParsedResult]]:
+    """Split a JMESPath filter into index predicates and a compiled residual expression (or None)."""
+    if not expression:
+        return (), None
+    predicates, residual = [], []
+
+    def visit(part: str):
+        part = _strip_parens(part)
+        conjuncts = _split_top_level(part, "&&")
+        if len(conjuncts) > 1:
+            for conjunct in conjuncts:
+                visit(conjunct)
+            return
+        match = _TERM.match(part)
+        if match:
+            path, op, token = match.groups()
+            value = _literal(token)
+            # null is left to JMESPath, which also matches it against missing fields
+            if op == "==" and value is not _NO_VALUE and value is not None and _value_key(value) is not None:
+                predicates.append(("eq", path, (_value_key(value),)))
+                return
+            # Only numbers order numerically; strings compare as strings, which has no index
+            if op != "==" and _value_key(value) is not None and _value_key(value)[0] == "n" and math.isfinite(value):
+                predicates.append(("range", path, op, float(value)))
+                return
+        residual.append(f"({part})")
+
+    visit(expression.strip())
+    return tuple(predicates), jmespath.compile(" && ".join(residual)) if residual else None
+
+class MetadataIndex:
+    def __init__(self):
+        self.hash: Dict[str, Dict[Hashable, set]] = {}
+        # field -> parallel sorted lists of values and row slots
+        self.sorted_values: Dict[str, List[float]] = {}
+        self.sorted_slots: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def _fields(metadata, prefix: str = ""):
+        for name, value in (metadata or {}).items():
+            path = prefix + name
+            if isinstance(value, dict):
+                yield from MetadataIndex._fields(value, path + ".")
+            else:
+                yield path, value
+
+    def add(self, slot: int, metadata: Dict):
+        for path, value in self._fields(metadata):
+            key = _value_key(value)
+            if key is None:
+                continue
+            self.hash.setdefault(path, {}).setdefault(key, set()).add(slot)
+            if key[0] == "n":
+                values = self.sorted_values.setdefault(path, [])
+                slots = self.sorted_slots.setdefault(path, [])
+                position = bisect.bisect_right(values, key[1])
+                values.insert(position, key[1])
+                slots.insert(position, slot)
+
+    def remove(self, slot: int, metadata: Dict):
+        for path, value in self._fields(metadata):
+            key = _value_key(value)
+            if key is None:
+                continue
+            rows = self.hash.get(path, {}).get(key)
+            if rows is not None:
+                rows.discard(slot)
+                if not rows:
+                    del self.hash[path][key]
+            if key[0] == "n":
+                values, slots = self.sorted_values[path], self.sorted_slots[path]
+                lo, hi = bisect.bisect_left(values, key[1]), bisect.bisect_right(values, key[1])
+                position = slots.index(slot, lo, hi)
+                del values[position]
+                del slots[position]
+
+    def _rows(self, predicate: Tuple) -> np.ndarray:
+        if predicate[0] == "eq":
+            _, path, keys = predicate
+            values = self.hash.get(path, {})
+            return np.fromiter(set().union(*(values.get(key, ()) for key in keys)), dtype=np.int64)
+        _, path, op, bound = predicate
+        values, slots = self.sorted_values.get(path, []), self.sorted_slots.get(path, [])
+        if op == ">":
+            lo, hi = bisect.bisect_right(values, bound), len(values)
+        elif op == ">=":
+            lo, hi = bisect.bisect_left(values, bound), len(values)
+        elif op == "<":
+            lo, hi = 0, bisect.bisect_left(values, bound)
+        else:
+            lo, hi = 0, bisect.bisect_right(values, bound)
+        return np.asarray(slots[lo:hi], dtype=np.int64)
+
+    def _estimate(self, predicate: Tuple) -> int:
+        if predicate[0] == "eq":
+            values = self.hash.get(predicate[1], {})
+            return sum(len(values.get(key, ())) for key in predicate[2])
+        return len(self.sorted_values.get(predicate[1], []))  # Ranges are narrowed last
+
+    def candidates(self, predicates: Tuple) -> Optional[np.ndarray]:
+        """Row slots satisfying every predicate, or None when there is nothing to narrow by."""
+        if not predicates:
+            return None
+        result = None
+        for predicate in sorted(predicates, key=self._estimate):
+            rows = self._rows(predicate)
+            result = np.unique(rows) if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+class PrefilterVectorIndex:
+    def __init__(self, dimensions: int, reserved_space: int = 1000):
+        self.dimensions = dimensions
+        self.vectors = np.zeros((max(1, reserved_space), dimensions), dtype=np.float32)
+        self.alive = np.zeros(max(1, reserved_space), dtype=bool)
+        self.keys: List = [None] * max(1, reserved_space)
+        self.metadata: List[Optional[Dict]] = [None] * max(1, reserved_space)
+        self.slot_of: Dict = {}
+        self.size = 0  # High-water mark of used slots
+        self.free: List[int] = []
+        self.metadata_index = MetadataIndex()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def _grow(self):
+        capacity = len(self.vectors) * 2
+        self.vectors = np.resize(self.vectors, (capacity, self.dimensions))
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        self.keys.extend([None] * (capacity - len(self.keys)))
+        self.metadata.extend([None] * (capacity - len(self.metadata)))
+
+    def add(self, key, vector, metadata: Optional[Dict]):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        with self._lock:
+            if key in self.slot_of:
+                self.remove(key)
+            if self.free:
+                slot = self.free.pop()
+            else:
+                if self.size == len(self.vectors):
+                    self._grow()
+                slot = self.size
+                self.size += 1
+            self.vectors[slot] = vector / norm if norm else vector
+            self.alive[slot] = True
+            self.keys[slot] = key
+            self.metadata[slot] = metadata
+            self.slot_of[key] = slot
+            self.metadata_index.add(slot, metadata)
+
+    def remove(self, key):
+        with self._lock:
+            slot = self.slot_of.pop(key, None)
+            if slot is None:
+                return
+            self.metadata_index.remove(slot, self.metadata[slot])
+            self.alive[slot] = False
+            self.keys[slot] = None
+            self.metadata[slot] = None
+            self.free.append(slot)
+
+    def search(self, vector, k: int, metadata_filter: Optional[str] = None) -> List[Tuple[object, float]]:
+        """Top-k (key, score) pairs; score is cosine similarity - 1, as for BruteForceKnn."""
+        if k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        try:
+            predicates, residual = plan_filter(metadata_filter)
+        except jmespath.exceptions.JMESPathError:
+            return []  # An unparsable filter matches nothing rather than failing the query stream
+        with self._lock:
+            candidates = self.metadata_index.candidates(predicates)
+            if candidates is None:
+                candidates = np.flatnonzero(self.alive[:self.size])
+            if not len(candidates):
+                return []
+            k = min(k, len(candidates))
+            if len(candidates) * 4 > self.size:
+                # Gathering most of the matrix costs more than scoring all of it and masking
+                keep = np.zeros(self.size, dtype=bool)
+                keep[candidates] = True
+                scores = np.where(keep, self.vectors[:self.size] @ query, -np.inf)
+                candidates = np.arange(self.size)
+            else:
+                scores = self.vectors[candidates] @ query
+            if residual is None:
+                top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+                order = top[np.argsort(-scores[top], kind="stable")]
+                return [(self.keys[candidates[i]], float(scores[i]) - 1.0) for i in order]
+
+            # The residual filter is only evaluated on candidates in score order until k pass
+            results = []
+            for i in np.argsort(-scores, kind="stable"):
+                if scores[i] == -np.inf:
+                    break
+                slot = candidates[i]
+                try:
+                    passed = residual.search(self.metadata[slot], options=_glob_options) is True
+                except (jmespath.exceptions.JMESPathError, TypeError, ValueError):
+                    passed = False
+                if passed:
+                    results.append((self.keys[slot], float(scores[i]) - 1.0))
+                    if len(results) == k:
+                        break
+            return results
+
+def _passes(metadata_filter: Optional[str], metadata) -> bool:
+    if not metadata_filter:
+        return True
+    try:
+        return jmespath.search(metadata_filter, metadata, options=_glob_options) is True
+    except (jmespath.exceptions.JMESPathError, TypeError, ValueError):
+        return False
+
+# --- Pathway integration ---
+# Same extension point as the built-in indexes: DocumentStore asks the factory for an index,
+# and DataIndex turns the (row id, score) replies into documents. Document vectors reach
+# the Python index through pw.io.subscribe; queries are answered as of now by a UDF.
+# query() is the variant whose answers follow later changes of the data. Pathway has to be
+# able to retract those answers, so it scores every query against every row in a join,
+# O(queries x rows), instead of using the Python index; DocumentStore only uses the
+# as-of-now variant.
+@dataclass(frozen=True, kw_only=True)
+class PrefilterKnn(InnerIndex):
+    dimensions: int
+    reserved_space: int = 1000
+    embedder: Optional[pw.UDF] = None
+    index: PrefilterVectorIndex = field(init=False)
+    vectors: pw.Table = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "index", PrefilterVectorIndex(self.dimensions, self.reserved_space))
+        vectors = self.data_column.table.select(
+            vector=self.embedder(self.data_column) if self.embedder is not None else self.data_column,
+            metadata=self.metadata_column if self.metadata_column is not None else None,
+        )
+        object.__setattr__(self, "vectors", vectors)
+
+        def on_change(key, row, time, is_addition):
+            if is_addition:
+                metadata = row["metadata"]
+                self.index.add(key, row["vector"], metadata.value if isinstance(metadata, pw.Json) else metadata)
+            else:
+                self.index.remove(key)
+
+        pw.io.subscribe(vectors, on_change=on_change)
+
+    def query(self, query_column: pw.ColumnReference, number_of_matches=3, metadata_filter=None) -> pw.Table:
+        @pw.udf(deterministic=True)
+        def score(query: np.ndarray, vector: np.ndarray, metadata, metadata_filter: Optional[str]) -> Optional[float]:
+            # Cosine similarity - 1 as in search(), or None when the row fails the filter
+            if not _passes(metadata_filter, metadata.value if isinstance(metadata, pw.Json) else metadata):
+                return None
+            query, vector = np.asarray(query, dtype=np.float32), np.asarray(vector, dtype=np.float32)
+            norms = np.linalg.norm(query) * np.linalg.norm(vector)
+            return float(query @ vector / norms if norms else query @ vector) - 1.0
+
+        @pw.udf(deterministic=True)
+        def top_k(matches: tuple, k: int) -> List[Tuple[pw.Pointer, float]]:
+            best = sorted(matches, key=lambda match: -match[0])[:k]
+            return [(key, match_score) for match_score, key in best]
+
+        queries = query_column.table.select(
+            vector=self.embedder(query_column) if self.embedder is not None else query_column,
+            k=number_of_matches,
+            metadata_filter=metadata_filter,
+        )
+        pairs = queries.join(self.vectors).select(
+            query_id=queries.id,
+            key=self.vectors.id,
+            score=score(queries.vector, self.vectors.vector, self.vectors.metadata, queries.metadata_filter),
+        )
+        replies = (
+            pairs.filter(pairs.score.is_not_none())
+            .groupby(pw.this.query_id)
+            .reduce(pw.this.query_id, matches=pw.reducers.tuple(pw.make_tuple(pw.unwrap(pw.this.score), pw.this.key)))
+        )
+        answered = queries.join_left(replies, queries.id == replies.query_id, id=queries.id).select(
+            k=queries.k, matches=pw.coalesce(replies.matches, ())
+        )
+        return answered.select(**{_INDEX_REPLY: top_k(answered.matches, answered.k)})
+
+    def query_as_of_now(self, query_column: pw.ColumnReference, number_of_matches=3, metadata_filter=None) -> pw.Table:
+        index = self.index
+
+        @pw.udf
+        def search(vector: np.ndarray, k: int, metadata_filter: Optional[str]) -> List[Tuple[pw.Pointer, float]]:
+            with tracing.span("knn.prefilter", k=k, filtered=metadata_filter is not None):
+                return index.search(vector, k, metadata_filter)
+
+        queries = query_column.table
+        vector = self.embedder(query_column) if self.embedder is not None else query_column
+        return queries.select(**{_INDEX_REPLY: search(vector, number_of_matches, metadata_filter)})
+
+@dataclass(kw_only=True)
+class PrefilterKnnFactory(KnnIndexFactory):
+    reserved_space: int = 1000
+
+    def build_inner_index(self, data_column: pw.ColumnReference, metadata_column: Optional[pw.ColumnExpression] = None) -> InnerIndex:
+        return PrefilterKnn(
+            data_column,
+            metadata_column,
+            dimensions=self.dimensions,
+            reserved_space=self.reserved_space,
+            embedder=self.embedder,
+        )
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# --- Response cache for JiniClient.query ---
+# Responses are keyed on a hash of the model name and the whitespace-normalized prompt.
+# Backends handle TTL and LRU eviction; an optional embedder adds a near-duplicate lookup
+# that reuses the answer of a previous prompt whose embedding is close enough.
+
+LLM_CACHE = os.environ.get("LLM_CACHE", "memory")  # "memory", "disk" or "off"
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 300))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_SIMILARITY = float(os.environ.get("LLM_CACHE_SIMILARITY", 0))  # 0 disables semantic lookup
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class DiskBackend:
+    # SQLite file so cached answers survive restarts; last_used drives LRU eviction
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+class SemanticIndex:
+    # Embeddings of recently cached prompts, matched by cosine similarity
+    def __init__(self, embedder=None, threshold: float = 0.95, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        if embedder is None:
+            from embedding_service import load_model  # Same model as pipeline.py, shared if the service runs
+
+            model = load_model("all-MiniLM-L12-v2")
+            self._encode = lambda text: model.encode(text)
+        else:
+            self._encode = embedder.__wrapped__
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_embedding = (None, None)
+
+    def _embed(self, text: str):
+        import numpy as np
+
+        text = normalize_prompt(text)
+        # A miss is followed by a put of the same prompt, so keep the last embedding around
+        last_text, last_vector = self._last_embedding
+        if text == last_text:
+            return last_vector
+        vector = np.asarray(self._encode(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+        self._last_embedding = (text, vector)
+        return vector
+
+    def add(self, key: str, text: str):
+        vector = self._embed(text)
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def nearest(self, text: str) -> Optional[str]:
+        import numpy as np
+
+        with self._lock:
+            if not self._vectors:
+                return None
+            keys = list(self._vectors.keys())
+            matrix = np.stack(list(self._vectors.values()))
+        scores = matrix @ self._embed(text)
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.threshold else None
+
+class ResponseCache:
+    def __init__(self, backend=None, semantic: Optional[SemanticIndex] = None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.semantic = semantic
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        if LLM_CACHE == "off":
+            return None
+        backend = DiskBackend() if LLM_CACHE == "disk" else MemoryBackend()
+        semantic = SemanticIndex(threshold=LLM_CACHE_SIMILARITY) if LLM_CACHE_SIMILARITY > 0 else None
+        return cls(backend, semantic)
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        key = prompt_key(model, prompt)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.semantic is not None:
+            nearest_key = self.semantic.nearest(f"{model}\n{prompt}")
+            value = self.backend.get(nearest_key) if nearest_key else None
+            if value is not None:
+                self.semantic_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, model: str, prompt: str, response: str):
+        key = prompt_key(model, prompt)
+        self.backend.put(key, response)
+        if self.semantic is not None:
+            self.semantic.add(key, f"{model}\n{prompt}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses, "entries": len(self.backend)}
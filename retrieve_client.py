@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import tracing
+
+API_BASE_URL = os.environ.get("API_BASE_URL", f"http://localhost:{os.environ.get('PATHWAY_PORT', 8765)}")
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT", 10))
+API_RETRIES = int(os.environ.get("API_RETRIES", 3))
+API_POOL_SIZE = int(os.environ.get("API_POOL_SIZE", 16))
+
+# --- Keep-alive client for the retrieval server ---
+# One requests.Session holds a pool of persistent connections, so repeated calls skip TCP
+# setup. Connection errors and 502/503/504 replies are retried with exponential backoff;
+# every call has a connect/read timeout. retrieve_many sends several recalls in one round
+# trip to /v1/retrieve_batch (served by the production front end in serving.py) and falls
+# back to concurrent single calls over the same pool when the server lacks that endpoint.
+class RetrieveClient:
+    def __init__(self, base_url: str = API_BASE_URL, timeout: float = API_TIMEOUT,
+                 retries: int = API_RETRIES, pool_size: int = API_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (min(3.05, timeout), timeout)
+        self.pool_size = pool_size
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),  # Retrieval is read-only, so POST is safe to repeat
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._batch_supported: Optional[bool] = None
+
+    def _post(self, path: str, payload: Dict) -> requests.Response:
+        with tracing.span("client" + path.replace("/v1/", ".")):
+            return self.session.post(self.base_url + path, json=payload, timeout=self.timeout)
+
+    def retrieve(self, query: str, k: int = 3, metadata_filter: Optional[str] = None,
+                 filepath_globpattern: Optional[str] = None) -> List[Dict]:
+        payload = {"query": query, "k": int(k)}
+        if metadata_filter:
+            payload["metadata_filter"] = metadata_filter
+        if filepath_globpattern:
+            payload["filepath_globpattern"] = filepath_globpattern
+        response = self._post("/v1/retrieve", payload)
+        response.raise_for_status()
+        return response.json()
+
+    def retrieve_recent(self, query: str, k: int = 3, start: Optional[str] = None, end: Optional[str] = None,
+                        last_seconds: Optional[float] = None, half_life_seconds: Optional[float] = None) -> List[Dict]:
+        """Recall within a time window (ISO 8601 bounds or the last N seconds), optionally recency-weighted."""
+        payload = {"query": query, "k": int(k)}
+        for name, value in (("start", start), ("end", end)):
+            if value is not None:
+                payload[name] = str(value)
+        for name, value in (("last_seconds", last_seconds), ("half_life_seconds", half_life_seconds)):
+            if value is not None:
+                payload[name] = float(value)
+        response = self._post("/v1/retrieve_recent", payload)
+        response.raise_for_status()
+        return response.json()
+
+    def aggregate(self, group_by: Optional[str] = None, value: Optional[str] = None, window_seconds: float = 3600,
+                  kind: str = "sliding", windows: int = 1) -> Dict:
+        """Event counts and field stats over a sliding window, or the last `windows` tumbling ones."""
+        payload = {"window_seconds": float(window_seconds), "kind": kind, "windows": int(windows)}
+        if group_by:
+            payload["group_by"] = group_by
+        if value is not None:
+            payload["value"] = str(value)
+        response = self._post("/v1/aggregate", payload)
+        response.raise_for_status()
+        return response.json()
+
+    def retrieve_many(self, queries: Sequence[str], k: int = 3) -> List[List[Dict]]:
+        """Results for each query, in order."""
+        queries = list(queries)
+        if not queries:
+            return []
+        if self._batch_supported is not False:
+            response = self._post("/v1/retrieve_batch", {"queries": [{"query": q, "k": int(k)} for q in queries]})
+            if response.status_code not in (404, 405):
+                response.raise_for_status()
+                self._batch_supported = True
+                return response.json()
+            self._batch_supported = False
+
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(queries))) as pool:
+            return list(pool.map(lambda q: self.retrieve(q, k), queries))
+
+    def close(self):
+        self.session.close()
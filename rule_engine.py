@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from event_log import EventLogReader
+
+PREDICTOR_RULES = os.environ.get("PREDICTOR_RULES", "")  # JSON rule file; "" uses DEFAULT_RULES
+NO_PREDICTION = "No strong prediction."
+
+# --- Declarative rule engine for event predictions ---
+# A rule is a prediction plus conditions on event fields (dotted for metadata), all of
+# which must hold; the first matching rule in list order wins, as in an if/elif chain:
+#   {"prediction": "Battery low", "when": {"metadata.battery_level": {"<": 15}}}
+#   {"prediction": "Too hot", "when": {"sensor": "temperature", "reading": {">=": 30}}}
+# Operators: == (a bare value), !=, <, <=, >, >=, in (a list) and contains (substring).
+# Comparisons against numbers also accept numeric strings, so "reading" works for sensors
+# that report numbers. Missing fields never match.
+# Batches are scored column by column. Every distinct condition across all rules is
+# evaluated once per batch: on the distinct values of string columns (a few hundred
+# sensors, readings and locations, however many rows) and then gathered to the rows
+# through their codes, or as one NumPy comparison on numeric columns. Rules then combine
+# boolean masks in order. EventColumns reads dict events or, without decoding anything,
+# the dictionary-encoded columns of an .evlog file (event_log.py).
+#   python rule_engine.py simulated_data.jsonl --rules rules.json
+
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in", "contains")
+_ORDERING = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+VECTOR_MIN_ROWS = 128  # Smaller batches are cheaper to score one event at a time
+
+DEFAULT_RULES: List[Dict] = [
+    {"prediction": "It might rain soon. Take an umbrella.", "when": {"sensor": "visual", "reading": {"contains": "dark"}}},
+    {"prediction": "You seem anxious. Try some breathing exercises.", "when": {"sensor": "emotion", "reading": "anxious"}},
+]
+
+def _field(event: Dict, dotted: str):
+    value = event
+    for part in dotted.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def _column(events: List[Dict], dotted: str) -> List:
+    """_field over a batch, without re-splitting the path per event."""
+    head, *rest = dotted.split(".")
+    values = [event.get(head) for event in events]
+    for part in rest:
+        values = [value.get(part) if isinstance(value, dict) else None for value in values]
+    return values
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)  # NaN counts as missing
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _test(value, op: str, target) -> bool:
+    """One condition on one value; the batch path applies the same test to distinct values."""
+    if value is None:
+        return False
+    if op == "==":
+        return value == target
+    if op == "!=":
+        return value != target
+    if op == "in":
+        return value in target
+    if op == "contains":
+        return isinstance(value, str) and target in value
+    number = _number(value)
+    return number is not None and _ORDERING[op](number, target)
+
+class Rule:
+    __slots__ = ("prediction", "conditions")
+
+    def __init__(self, prediction: str, when: Dict[str, object]):
+        self.prediction = prediction
+        self.conditions: List[Tuple[str, str, Hashable]] = []
+        for field, spec in when.items():
+            for op, target in (spec.items() if isinstance(spec, dict) else [("==", spec)]):
+                if op not in OPERATORS:
+                    raise ValueError(f"Unknown operator {op!r} for {field!r} in rule {prediction!r}")
+                if op == "in":
+                    target = frozenset(target)
+                elif op in _ORDERING:
+                    target = float(target)
+                self.conditions.append((field, op, target))
+
+    @classmethod
+    def from_dict(cls, spec: Dict) -> "Rule":
+        return cls(spec["prediction"], spec.get("when", {}))
+
+    def matches(self, event: Dict) -> bool:
+        return all(_test(_field(event, field), op, target) for field, op, target in self.conditions)
+
+def load_rules(path: str = PREDICTOR_RULES) -> List[Rule]:
+    if not path:
+        return [Rule.from_dict(spec) for spec in DEFAULT_RULES]
+    with open(path, "r", encoding="utf-8") as f:
+        return [Rule.from_dict(spec) for spec in json.load(f)]
+
+class EventColumns:
+    # String columns are (codes, distinct values); a code past the last value means missing
+    def __init__(self, length: int):
+        self.length = length
+        self.strings: Dict[str, Tuple[np.ndarray, Sequence]] = {}
+        self.numbers: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_events(cls, events: List[Dict], fields: Sequence[str]) -> "EventColumns":
+        columns = cls(len(events))
+        for field in fields:
+            values = _column(events, field)
+            present = [value for value in values if value is not None]
+            if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                columns.numbers[field] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+                uniques = list(uniques)
+                columns.strings[field] = (np.where(codes < 0, len(uniques), codes), uniques)
+        return columns
+
+    @classmethod
+    def from_log(cls, reader: EventLogReader, fields: Sequence[str], rows: Optional[slice] = None) -> "EventColumns":
+        """Columns of an .evlog file, read straight from its memory map."""
+        records = reader.records if rows is None else reader.records[rows]
+        columns = cls(len(records))
+        dictionary = reader.dictionary()
+        for field in fields:
+            kind = reader.kinds.get(field)
+            if kind is None:
+                columns.numbers[field] = np.full(len(records), np.nan)  # Not in this schema: never matches
+            elif kind == "str":
+                codes = records[field]
+                columns.strings[field] = (np.minimum(codes, len(dictionary)), dictionary)  # NULL_CODE -> missing
+            elif kind == "f8":
+                columns.numbers[field] = np.asarray(records[field])
+            elif kind == "i8":
+                values = np.asarray(records[field])
+                columns.numbers[field] = np.where(values == np.iinfo(np.int64).min, np.nan, values.astype(np.float64))
+            else:
+                raise ValueError(f"Rules cannot test the {kind} column {field!r}")
+        return columns
+
+class RuleEngine:
+    def __init__(self, rules: Optional[List[Rule]] = None, default: str = NO_PREDICTION):
+        self.rules = rules if rules is not None else load_rules()
+        self.default = default
+        self.predictions = [rule.prediction for rule in self.rules] + [default]  # Index -1 is the default
+        self.fields = sorted({field for rule in self.rules for field, _, _ in rule.conditions})
+
+    def predict(self, event: Dict) -> str:
+        for rule in self.rules:
+            if rule.matches(event):
+                return rule.prediction
+        return self.default
+
+    def _condition(self, columns: EventColumns, field: str, op: str, target) -> np.ndarray:
+        if field in columns.strings:
+            codes, uniques = columns.strings[field]
+            table = np.fromiter((_test(value, op, target) for value in uniques), dtype=bool, count=len(uniques))
+            return np.append(table, False)[codes]
+        values = columns.numbers[field]
+        present = ~np.isnan(values)
+        if op in _ORDERING:
+            return _ORDERING[op](values, target) & present
+        if op == "in":
+            numbers = [value for value in target if isinstance(value, (int, float)) and not isinstance(value, bool)]
+            return np.isin(values, numbers) & present
+        number = _number(target) if not isinstance(target, str) else None
+        if op == "==":
+            return values == number if number is not None else np.zeros(columns.length, dtype=bool)
+        if op == "!=":
+            return (values != number if number is not None else np.ones(columns.length, dtype=bool)) & present
+        return np.zeros(columns.length, dtype=bool)  # contains: numbers are not strings
+
+    def match(self, columns: EventColumns) -> np.ndarray:
+        """Index of the first matching rule per row, -1 where none matches."""
+        masks: Dict[Tuple, np.ndarray] = {}  # Shared by every rule using the same condition
+        result = np.full(columns.length, -1, dtype=np.int32)
+        unmatched = np.ones(columns.length, dtype=bool)
+        for index, rule in enumerate(self.rules):
+            mask = unmatched.copy()
+            for condition in rule.conditions:
+                if condition not in masks:
+                    masks[condition] = self._condition(columns, *condition)
+                mask &= masks[condition]
+            result[mask] = index
+            unmatched &= ~mask
+        return result
+
+    def predict_many(self, events: List[Dict]) -> List[str]:
+        if len(events) < VECTOR_MIN_ROWS:
+            return [self.predict(event) for event in events]
+        predictions = self.predictions
+        return [predictions[index] for index in self.match(EventColumns.from_events(events, self.fields)).tolist()]
+
+    def counts(self, columns: EventColumns) -> Dict[str, int]:
+        tally = np.bincount(self.match(columns) + 1, minlength=len(self.rules) + 1)
+        counts = {self.default: int(tally[0])}
+        for index, rule in enumerate(self.rules):
+            counts[rule.prediction] = counts.get(rule.prediction, 0) + int(tally[index + 1])
+        return counts
+
+def iter_jsonl(path: str, chunk_rows: int = 200_000) -> Iterator[List[Dict]]:
+    chunk: List[Dict] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                chunk.append(json.loads(line))
+                if len(chunk) == chunk_rows:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+def score_file(path: str, engine: RuleEngine) -> Dict[str, int]:
+    """Prediction counts over a .jsonl or .evlog history."""
+    if path.endswith(".evlog"):
+        return engine.counts(EventColumns.from_log(EventLogReader(path), engine.fields))
+    totals: Dict[str, int] = {}
+    for chunk in iter_jsonl(path):
+        for prediction, count in engine.counts(EventColumns.from_events(chunk, engine.fields)).items():
+            totals[prediction] = totals.get(prediction, 0) + count
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count rule predictions over an event history.")
+    parser.add_argument("paths", nargs="+", help=".jsonl or .evlog files")
+    parser.add_argument("--rules", default=PREDICTOR_RULES, help="JSON rule file (default: the built-in rules)")
+    args = parser.parse_args()
+
+    engine = RuleEngine(load_rules(args.rules))
+    for path in args.paths:
+        start = time.perf_counter()
+        counts = score_file(path, engine)
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        json.dump({"path": path, "rows": rows, "seconds": round(elapsed, 3),
+                   "rows_per_s": round(rows / elapsed) if elapsed else None, "predictions": counts}, sys.stdout)
+        print()
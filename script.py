@@ -1,7 +1,11 @@
-import json
+import os
 import time
 import random
 from datetime import datetime
+from event_log import SENSOR_SCHEMA, open_event_writer
+
+# Use a .evlog path to write the columnar binary format instead of JSON lines
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH", "simulated_data.jsonl")
 
 def generate_temperature():
     # Return temperature as string instead of a numeric value
@@ -47,28 +51,38 @@ sensor_functions = {
     "emotion": generate_emotion,
 }
 
+sensor_types = list(sensor_functions.keys())
+locations = ["home", "office", "park", "street", "restaurant"]
+
+def generate_event(device_id=None):
+    sensor = random.choice(sensor_types)
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "sensor": sensor,
+        # Wrap the reading value in str() to ensure it's always a string.
+        "reading": str(sensor_functions[sensor]()),
+        "intensity": round(random.uniform(0, 1), 2),
+        "metadata": {
+            "location": random.choice(locations),
+            "device_id": device_id or f"device_{random.randint(1, 100)}",
+            "battery_level": round(random.uniform(10, 100), 2)
+        }
+    }
+
 def simulate_complex_data(file_path):
-    sensor_types = list(sensor_functions.keys())
-    locations = ["home", "office", "park", "street", "restaurant"]
+    writer = open_event_writer(file_path, SENSOR_SCHEMA)
     
     while True:
-        sensor = random.choice(sensor_types)
-        event = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "sensor": sensor,
-            # Wrap the reading value in str() to ensure it's always a string.
-            "reading": str(sensor_functions[sensor]()),
-            "intensity": round(random.uniform(0, 1), 2),
-            "metadata": {
-                "location": random.choice(locations),
-                "device_id": f"device_{random.randint(1, 100)}",
-                "battery_level": round(random.uniform(10, 100), 2)
-            }
-        }
-        with open(file_path, "a") as f:
-            f.write(json.dumps(event) + "\n")
+        event = generate_event()
+        writer.write(event)
         print(f"Simulated event: {event}")
         time.sleep(random.uniform(4, 6))
 
 if __name__ == "__main__":
-    simulate_complex_data("simulated_data.jsonl")
+    # With --rate the simulator runs as a load generator (see loadgen.py)
+    import loadgen
+    args = loadgen.parse_args(default_output=EVENT_LOG_PATH)
+    if args.rate is None:
+        simulate_complex_data(args.output)
+    else:
+        loadgen.run("sensor", args)
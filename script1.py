@@ -1,13 +1,16 @@
-import json
 import time
 import random
 import os
 from datetime import datetime, timezone
+from event_log import STORY_SCHEMA, open_event_writer
+
+# Use a .evlog path to write the columnar binary format instead of JSON lines
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH", "simulated_dataM.jsonl")
 
 # Initialize serial number counter
 serial_no_counter = 0
 
-def generate_next_event(previous_event=None):
+def generate_next_event(previous_event=None, write_story=True):
     global serial_no_counter
     serial_no_counter += 1
     
@@ -28,7 +31,7 @@ def generate_next_event(previous_event=None):
     
     next_location = random.choice(location_transitions.get(last_location, locations))
     
-    story = generate_story(previous_event, next_location)
+    story = generate_story(previous_event, next_location, write_story)
     
     event = {
         "event_id": serial_no_counter,
@@ -50,7 +53,7 @@ def generate_next_event(previous_event=None):
     
     return event, story["text"]
 
-def generate_story(previous_event, current_location):
+def generate_story(previous_event, current_location, write_story=True):
     if previous_event:
         prev_location = previous_event["location"]
         transition = f"From {prev_location}, you now find yourself in {current_location}. "
@@ -107,20 +110,21 @@ def generate_story(previous_event, current_location):
     
     scenario = scenarios.get(current_location, {"text": "An uneventful moment passes.", "visual": "unknown", "auditory": "silent", "olfactory": "neutral", "gustatory": "neutral", "tactile": "neutral", "emotion": "neutral"})
     
-    with open("scenarios/interaction_story.txt", "a") as f:
-        f.write(transition + scenario["text"] + "\n")
+    if write_story:
+        with open("scenarios/interaction_story.txt", "a") as f:
+            f.write(transition + scenario["text"] + "\n")
     
     return scenario
 
 def simulate_complex_data(file_path):
     previous_event = None
+    writer = open_event_writer(file_path, STORY_SCHEMA)
     
     while True:
         event, story = generate_next_event(previous_event)
         previous_event = event  
         
-        with open(file_path, "a") as f:
-            f.write(json.dumps(event) + "\n")
+        writer.write(event)
         
         print(f"Simulated event: {event}")
         print(f"Story: {story}")
@@ -128,4 +132,10 @@ def simulate_complex_data(file_path):
         time.sleep(random.uniform(3, 5))
 
 if __name__ == "__main__":
-    simulate_complex_data("simulated_dataM.jsonl")
+    # With --rate the simulator runs as a load generator (see loadgen.py)
+    import loadgen
+    args = loadgen.parse_args(default_output=EVENT_LOG_PATH)
+    if args.rate is None:
+        simulate_complex_data(args.output)
+    else:
+        loadgen.run("story", args)
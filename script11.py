@@ -1,13 +1,16 @@
-import json
 import time
 import random
 import os
 from datetime import datetime, timezone
+from event_log import STORY_SCHEMA, open_event_writer
 from jiniai import JiniAI
 
 # Initialize Jina AI client (modify endpoint as needed)
 client = JiniAI
 
+# Use a .evlog path to write the columnar binary format instead of JSON lines
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH", "simulated_dataM.jsonl")
+
 # Initialize serial number counter
 serial_no_counter = 0
 
@@ -89,13 +92,13 @@ def generate_story(previous_event, current_location):
 
 def simulate_complex_data(file_path):
     previous_event = None
+    writer = open_event_writer(file_path, STORY_SCHEMA)
     
     while True:
         event, story = generate_next_event(previous_event)
         previous_event = event  
         
-        with open(file_path, "a") as f:
-            f.write(json.dumps(event) + "\n")
+        writer.write(event)
         
         print(f"Simulated event: {event}")
         print(f"Story: {story}")
@@ -103,4 +106,4 @@ def simulate_complex_data(file_path):
         time.sleep(random.uniform(3, 5))
 
 if __name__ == "__main__":
-    simulate_complex_data("simulated_dataM.jsonl")
+    simulate_complex_data(EVENT_LOG_PATH)
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import tracing
+
+# --- Tail-follow reader shared by the SensorStream variants ---
+# Remembers its byte offset so each call only touches bytes appended since the last one,
+# reopens the file when it is rotated (new inode) and rewinds when it is truncated.
+# "Latest event" lookups seek from the end of the file instead of reading it whole.
+class TailReader:
+    def __init__(self, file_path: str, start_at_end: bool = False, chunk_size: int = 4096):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self._start_at_end = start_at_end
+        self._file = None
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._partial = b""
+        self._latest_key = None
+        self._latest_event: Dict = {}
+
+    def _open(self, at_end: bool) -> bool:
+        try:
+            self._file = open(self.file_path, "rb")
+        except FileNotFoundError:
+            self._file = None
+            return False
+        stat = os.fstat(self._file.fileno())
+        self._inode = stat.st_ino
+        self._offset = stat.st_size if at_end else 0
+        self._file.seek(self._offset)
+        self._partial = b""
+        return True
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _drain(self) -> List[bytes]:
+        data = self._file.read()
+        if not data:
+            return []
+        self._offset += len(data)
+        data = self._partial + data
+        lines = data.split(b"\n")
+        # The last element is either empty or a line still being written
+        self._partial = lines.pop()
+        return lines
+
+    def read_new(self) -> List[Dict]:
+        """Return the events appended since the previous call."""
+        start = time.perf_counter()
+        events = self._read_new()
+        if events:  # Idle polls are not worth a histogram entry each
+            tracing.observe("tail.read", time.perf_counter() - start, events=len(events))
+            tracing.count("tail.events", len(events))
+        return events
+
+    def _read_new(self) -> List[Dict]:
+        if self._file is None:
+            if not self._open(at_end=self._start_at_end):
+                return []
+            self._start_at_end = False
+
+        lines: List[bytes] = []
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            # Rotated away and not recreated yet: keep whatever the old handle still holds
+            return self._parse(self._drain())
+
+        if stat.st_ino != self._inode:
+            lines.extend(self._drain())
+            self.close()
+            if not self._open(at_end=False):
+                return self._parse(lines)
+        elif stat.st_size < self._offset:
+            # Truncated in place: start over from the beginning
+            self._file.seek(0)
+            self._offset = 0
+            self._partial = b""
+
+        lines.extend(self._drain())
+        return self._parse(lines)
+
+    @staticmethod
+    def _parse(lines: List[bytes]) -> List[Dict]:
+        if not lines:
+            return []
+        events = []
+        with tracing.span("tail.parse", lines=len(lines)):
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    tracing.count("tail.parse_errors")
+                    continue
+        return events
+
+    def latest_event(self) -> Dict:
+        """Return the last complete event in the file, reading only its tail."""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return {}
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key == self._latest_key:
+            return self._latest_event
+
+        event = {}
+        with open(self.file_path, "rb") as file:
+            end = stat.st_size
+            buffer = b""
+            while end > 0:
+                start = max(0, end - self.chunk_size)
+                file.seek(start)
+                buffer = file.read(end - start) + buffer
+                end = start
+                lines = buffer.split(b"\n")
+                # lines[0] may be cut mid-line unless we reached the start of the file
+                candidates = lines if end == 0 else lines[1:]
+                parsed = self._last_valid(candidates)
+                if parsed is not None:
+                    event = parsed
+                    break
+
+        self._latest_key = key
+        self._latest_event = event
+        return event
+
+    @staticmethod
+    def _last_valid(lines: List[bytes]) -> Optional[Dict]:
+        for line in reversed(lines):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                # Usually a line that is still being written; fall back to the one before it
+                continue
+        return None
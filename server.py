@@ -1,13 +1,59 @@
-from pipeline import store  # Import the DocumentStore built in pipeline.py
+import os
+
+import pathway as pw
+from pipeline import DATA_PATH, aggregate_retrieve, recent_retrieve, store, window_aggregator  # Import the DocumentStore built in pipeline.py
 from pathway.xpacks.llm.servers import DocumentStoreServer
+from serving import serve_cached
+from tracing import metrics_endpoint, serve_metrics_from_env
+from time_index import RecentQuerySchema
+from window_stats import AggregateQuerySchema, aggregate_endpoint
+
+# Set up and start the REST API server on port 8765 (override with PATHWAY_PORT).
+PATHWAY_PORT = int(os.environ.get("PATHWAY_PORT", 8765))
+
+# SERVER_MODE=production runs Pathway multi-threaded with its persistent embedding cache on an
+# internal port, behind a pooled front end on PATHWAY_PORT that caches retrieval results
+# until the JSONL source changes.
+SERVER_MODE = os.environ.get("SERVER_MODE", "dev")
+UPSTREAM_PORT = int(os.environ.get("PATHWAY_UPSTREAM_PORT", PATHWAY_PORT + 1))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 2 * (os.cpu_count() or 1)))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 30))
+CACHE_DIR = os.environ.get("PATHWAY_CACHE_DIR", "./Cache")
+
+# Prometheus text at :METRICS_PORT/metrics when set (tracing.py); production also serves JSON at /v1/metrics
+serve_metrics_from_env()
 
-# Set up and start the REST API server on port 8765.
-PATHWAY_PORT = 8765
-server = DocumentStoreServer(
-    host="0.0.0.0",  # Listen on all interfaces
-    port=PATHWAY_PORT,
-    document_store=store,
-)
+if SERVER_MODE == "production":
+    # Engine worker threads; Pathway reads this when the computation starts
+    os.environ.setdefault("PATHWAY_THREADS", str(os.cpu_count() or 1))
+    server = DocumentStoreServer(
+        host="127.0.0.1",
+        port=UPSTREAM_PORT,
+        document_store=store,
+    )
+    server.serve("/v1/retrieve_recent", RecentQuerySchema, recent_retrieve, methods=("GET", "POST"))
+    server.serve("/v1/aggregate", AggregateQuerySchema, aggregate_retrieve, methods=("GET", "POST"))
+    front = serve_cached(
+        host="0.0.0.0",
+        port=PATHWAY_PORT,
+        upstream=f"http://127.0.0.1:{UPSTREAM_PORT}",
+        source_path=DATA_PATH,
+        workers=SERVER_WORKERS,
+        ttl=RESULT_CACHE_TTL,
+        # Window aggregates are answered in-process by the front, without an engine round trip
+        local_routes={"/v1/aggregate": aggregate_endpoint(window_aggregator), "/v1/metrics": metrics_endpoint()},
+    )
+    server.run(threaded=False, with_cache=True, cache_backend=pw.persistence.Backend.filesystem(CACHE_DIR))
+else:
+    server = DocumentStoreServer(
+        host="0.0.0.0",  # Listen on all interfaces
+        port=PATHWAY_PORT,
+        document_store=store,
+    )
+    # Time-window / recency-weighted recall from the time-partitioned index (time_index.py)
+    server.serve("/v1/retrieve_recent", RecentQuerySchema, recent_retrieve, methods=("GET", "POST"))
+    # Sliding / tumbling window counts and stats from the stream (window_stats.py)
+    server.serve("/v1/aggregate", AggregateQuerySchema, aggregate_retrieve, methods=("GET", "POST"))
 
-# Run the server in blocking mode.
-server.run(threaded=False, with_cache=False)
+    # Run the server in blocking mode.
+    server.run(threaded=False, with_cache=False)
\ No newline at end of file
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+# --- Production front for DocumentStoreServer ---
+# A pooled HTTP front end that answers repeated /v1/retrieve calls from a result cache and
+# forwards everything else to the Pathway server. Cached results are tagged with the
+# generation of the JSONL source (inode, size) seen when the request started, so any
+# appended, truncated or rotated file invalidates them; a short TTL bounds the window in
+# which the index may still be catching up with rows already on disk.
+# POST /v1/retrieve_batch takes {"queries": [{"query": ..., "k": ...}, ...]} and answers
+# every recall in one round trip, each one going through the same cache. Paths in
+# local_routes are answered by an in-process callable (body -> status, JSON) instead.
+# Every client connection gets its own thread, so a keep-alive client never holds a slot
+# another client needs; what is bounded is the upstream side, at most `workers` requests
+# in flight to Pathway at once through one shared, blocking connection pool. While Pathway
+# is starting, restarting or down, requests get a 502 (504 on a timeout) with a JSON error,
+# and those replies are never cached.
+
+CACHED_PATHS = {"/v1/retrieve", "/v1/retrieve_recent"}
+BATCH_PATH = "/v1/retrieve_batch"
+MAX_BATCH_QUERIES = 64
+KEEPALIVE_TIMEOUT = 15.0  # Idle keep-alive connections are closed and their threads end
+
+class SourceGeneration:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def current(self) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_ino, stat.st_size)
+
+class ResultCache:
+    def __init__(self, generation: SourceGeneration, ttl: float = 30.0, max_entries: int = 4096):
+        self.generation = generation
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(path: str, body: bytes) -> str:
+        try:
+            payload = json.dumps(json.loads(body or b"{}"), sort_keys=True)
+        except json.JSONDecodeError:
+            payload = body.decode("utf-8", "replace")
+        return f"{path}\x00{payload}"
+
+    def get(self, key: str, generation: Tuple[int, int]) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_generation, expires_at = entry
+                if entry_generation == generation and expires_at >= time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: bytes, generation: Tuple[int, int]):
+        with self._lock:
+            self._entries[key] = (value, generation, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations, "entries": len(self._entries)}
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    # One thread per connection; upstream concurrency is bounded by the handler's pool
+    daemon_threads = True
+
+LocalRoute = Callable[[bytes], Tuple[int, bytes]]
+
+def upstream_session(connections: int) -> requests.Session:
+    """A session whose pool blocks callers once `connections` upstream requests are in flight."""
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections, pool_block=True)
+    http = requests.Session()
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
+def make_handler(upstream: str, cache: ResultCache, fanout: Optional[ThreadPoolExecutor] = None,
+                 local_routes: Optional[Dict[str, LocalRoute]] = None, upstream_connections: int = 8):
+    local_routes = local_routes or {}
+    fanout = fanout or ThreadPoolExecutor(max_workers=8)
+    http = upstream_session(upstream_connections)  # Shared by all connection threads
+
+    class CachingHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = KEEPALIVE_TIMEOUT
+        disable_nagle_algorithm = True  # Headers and body are separate writes; avoid the delayed-ACK stall
+
+        def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _upstream(self, method: str, path: str, body: Optional[bytes], content_type: str) -> Tuple[int, bytes, str]:
+            try:
+                response = http.request(method, upstream + path, data=body, headers={"Content-Type": content_type}, timeout=60)
+            except requests.RequestException as e:
+                tracing.count("front.upstream_errors")
+                status = 504 if isinstance(e, requests.Timeout) else 502
+                return status, json.dumps({"error": f"upstream unavailable: {e}"}).encode("utf-8"), "application/json"
+            return response.status_code, response.content, response.headers.get("Content-Type", "application/json")
+
+        def _forward(self, method: str, body: Optional[bytes]) -> Tuple[int, bytes, str]:
+            return self._upstream(method, self.path, body, self.headers.get("Content-Type", "application/json"))
+
+        def do_GET(self):
+            if self.path == "/v1/cache_stats":
+                self._reply(200, json.dumps(cache.stats()).encode("utf-8"))
+                return
+            if self.path in local_routes:
+                self._reply(*local_routes[self.path](b""))
+                return
+            self._reply(*self._forward("GET", None))
+
+        def _retrieve(self, path: str, body: bytes, generation: Tuple[int, int]) -> Tuple[int, bytes, str]:
+            with tracing.span("front.retrieve", path=path) as span:
+                key = cache.key(path, body)
+                cached = cache.get(key, generation)
+                span.set(cached=cached is not None)
+                if cached is not None:
+                    tracing.count("front.cache_hits")
+                    return 200, cached, "application/json"
+                tracing.count("front.cache_misses")
+                with tracing.span("front.upstream"):
+                    status, content, content_type = self._upstream("POST", path, body, "application/json")
+                if status == 200:
+                    cache.put(key, content, generation)
+                return status, content, content_type
+
+        def _retrieve_batch(self, body: bytes):
+            try:
+                queries = json.loads(body or b"{}")["queries"]
+                if not isinstance(queries, list) or len(queries) > MAX_BATCH_QUERIES:
+                    raise ValueError
+            except (ValueError, KeyError, TypeError):
+                self._reply(400, json.dumps({"error": f"expected {{'queries': [...]}} with at most {MAX_BATCH_QUERIES} entries"}).encode("utf-8"))
+                return
+            generation = cache.generation.current()
+            bodies = [json.dumps(query).encode("utf-8") for query in queries]
+            results = list(fanout.map(lambda b: self._retrieve("/v1/retrieve", b, generation), bodies))
+            for status, content, _ in results:
+                if status != 200:
+                    self._reply(status, content)
+                    return
+            self._reply(200, b"[" + b",".join(content for _, content, _ in results) + b"]")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == BATCH_PATH:
+                self._retrieve_batch(body)
+                return
+            if self.path in local_routes:
+                self._reply(*local_routes[self.path](body))
+                return
+            if self.path not in CACHED_PATHS:
+                self._reply(*self._forward("POST", body))
+                return
+
+            self._reply(*self._retrieve(self.path, body, cache.generation.current()))
+
+        def log_message(self, format, *args):
+            pass  # One line per request is too noisy under load
+
+    return CachingHandler
+
+def serve_cached(host: str, port: int, upstream: str, source_path: str, workers: int, ttl: float,
+                 local_routes: Optional[Dict[str, LocalRoute]] = None) -> PooledHTTPServer:
+    cache = ResultCache(SourceGeneration(source_path), ttl=ttl)
+    handler = make_handler(upstream, cache, local_routes=local_routes, upstream_connections=workers)
+    server = PooledHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,40 @@
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+# --- Local stand-in for the JiniAI client ---
+# Mimics client.chat.completions.create(...) for both stream=False and stream=True with a
+# scripted latency, so the agent loops can be exercised and timed without a real LLM.
+class _Completions:
+    def __init__(self, llm: "StubJiniAI"):
+        self._llm = llm
+
+    def create(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        tokens = self._llm.reply_tokens(prompt)
+        self._llm.calls += 1
+        if stream:
+            return self._stream(tokens)
+        time.sleep(self._llm.first_token_latency + self._llm.token_latency * len(tokens))
+        message = SimpleNamespace(content="".join(tokens))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _stream(self, tokens: List[str]):
+        time.sleep(self._llm.first_token_latency)
+        for token in tokens:
+            time.sleep(self._llm.token_latency)
+            delta = SimpleNamespace(content=token)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+class StubJiniAI:
+    def __init__(self, first_token_latency: float = 0.5, token_latency: float = 0.02, reply_tokens: int = 30):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.reply_length = reply_tokens
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def reply_tokens(self, prompt: str) -> List[str]:
+        # Deterministic reply that echoes the start of the prompt, one word per token
+        words = (prompt.split() or ["ok"]) * self.reply_length
+        return [word + " " for word in words[: self.reply_length]]
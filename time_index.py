@@ -0,0 +1,252 @@
+import bisect
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pathway as pw
+
+import tracing
+
+TIME_PARTITION_SECONDS = int(os.environ.get("TIME_PARTITION_SECONDS", 3600))
+
+# --- Time-partitioned event index ---
+# Every ingested event is filed under the partition covering its timestamp (one per
+# TIME_PARTITION_SECONDS), each holding its own vector block. A query names a time window
+# (start/end, or the last N seconds) and only the partitions overlapping it are scanned.
+# With a recency half-life the score is relevance * 0.5 ** (age / half_life); partitions are
+# scanned newest first and the scan stops as soon as even a perfect match in the next older
+# partition could not beat the current k-th result, so months of history are not touched
+# for "what happened recently" queries. Ages are measured from the newest event in the index
+# unless the query passes `now`, which keeps replayed logs meaningful.
+
+def parse_timestamp(value) -> float:
+    """Epoch seconds for an ISO 8601 string (naive times are UTC, as script.py's utcnow() writes them) or a number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+class TimePartition:
+    def __init__(self, start: float, dimensions: int, capacity: int = 256):
+        self.start = start
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.payloads: List = []
+        self.size = 0
+        self.count = 0
+        self.newest = float("-inf")
+
+    def add(self, vector: np.ndarray, timestamp: float, payload) -> int:
+        if self.size == len(self.vectors):
+            capacity = 2 * len(self.vectors)
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.timestamps = np.resize(self.timestamps, capacity)
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        slot = self.size
+        self.vectors[slot] = vector
+        self.timestamps[slot] = timestamp
+        self.alive[slot] = True
+        self.payloads.append(payload)
+        self.size += 1
+        self.count += 1
+        self.newest = max(self.newest, timestamp)
+        return slot
+
+    def remove(self, slot: int):
+        # Retractions are rare for an append-only log, so the slot is only masked out
+        self.alive[slot] = False
+        self.payloads[slot] = None
+        self.count -= 1
+
+class TimePartitionedIndex:
+    def __init__(self, dimensions: int, partition_seconds: int = TIME_PARTITION_SECONDS):
+        self.dimensions = dimensions
+        self.partition_seconds = partition_seconds
+        self.partitions: Dict[float, TimePartition] = {}
+        self.starts: List[float] = []  # Sorted partition start times
+        self.location: Dict = {}  # key -> (partition start, slot)
+        self.newest = float("-inf")
+        self.partitions_scanned = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.location)
+
+    def _partition_start(self, timestamp: float) -> float:
+        return timestamp - timestamp % self.partition_seconds
+
+    def add(self, key, vector, timestamp: float, payload=None):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        with self._lock:
+            if key in self.location:
+                self.remove(key)
+            start = self._partition_start(timestamp)
+            partition = self.partitions.get(start)
+            if partition is None:
+                partition = self.partitions[start] = TimePartition(start, self.dimensions)
+                bisect.insort(self.starts, start)
+            slot = partition.add(vector / norm if norm else vector, timestamp, payload)
+            self.location[key] = (start, slot)
+            self.newest = max(self.newest, timestamp)
+
+    def remove(self, key):
+        with self._lock:
+            location = self.location.pop(key, None)
+            if location is None:
+                return
+            start, slot = location
+            partition = self.partitions[start]
+            partition.remove(slot)
+            if not partition.count:
+                del self.partitions[start]
+                self.starts.pop(bisect.bisect_left(self.starts, start))
+
+    def search(
+        self,
+        vector,
+        k: int = 3,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        half_life: Optional[float] = None,
+        now: Optional[float] = None,
+    ) -> List[Tuple[object, float, float, float]]:
+        """Top-k (payload, timestamp, similarity, score) within [start, end], best score first."""
+        if k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        best: List[Tuple[float, int, float, float, object]] = []  # Min-heap of the current top k
+        order = itertools.count()
+        with self._lock:
+            if now is None:
+                now = self.newest
+            lo = 0 if start is None else bisect.bisect_left(self.starts, self._partition_start(start))
+            hi = len(self.starts) if end is None else bisect.bisect_right(self.starts, end)
+            for partition_start in reversed(self.starts[lo:hi]):
+                partition = self.partitions[partition_start]
+                if half_life and len(best) == k:
+                    # Relevance is at most 1, so no row here can score above its newest row's decay
+                    if 0.5 ** (max(0.0, now - partition.newest) / half_life) <= best[0][0]:
+                        break
+                self.partitions_scanned += 1
+                size = partition.size
+                timestamps = partition.timestamps[:size]
+                keep = partition.alive[:size].copy()
+                if start is not None:
+                    keep &= timestamps >= start
+                if end is not None:
+                    keep &= timestamps <= end
+                rows = np.flatnonzero(keep)
+                if not len(rows):
+                    continue
+                similarity = partition.vectors[rows] @ query
+                if half_life:
+                    age = np.maximum(0.0, now - timestamps[rows])
+                    scores = (similarity + 1) / 2 * 0.5 ** (age / half_life)
+                else:
+                    scores = similarity
+                top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+                for i in top:
+                    entry = (float(scores[i]), next(order), float(timestamps[rows[i]]), float(similarity[i]), partition.payloads[rows[i]])
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry[0] > best[0][0]:
+                        heapq.heapreplace(best, entry)
+        return [(payload, timestamp, similarity, score) for score, _, timestamp, similarity, payload in sorted(best, key=lambda e: (-e[0], e[1]))]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "events": len(self.location),
+                "partitions": len(self.starts),
+                "partition_seconds": self.partition_seconds,
+                "oldest_partition": self.starts[0] if self.starts else None,
+                "newest_event": self.newest if self.location else None,
+                "partitions_scanned": self.partitions_scanned,
+            }
+
+# --- Pathway integration ---
+# The ingest table is embedded and streamed into the index with pw.io.subscribe; the
+# /v1/retrieve_recent endpoint (served next to DocumentStoreServer's routes) embeds each
+# query and answers it from the index as of now.
+class RecentQuerySchema(pw.Schema):
+    query: str
+    k: int = pw.column_definition(default_value=3)
+    start: Optional[str] = pw.column_definition(default_value=None)  # ISO 8601 or epoch seconds
+    end: Optional[str] = pw.column_definition(default_value=None)
+    last_seconds: Optional[float] = pw.column_definition(default_value=None)
+    half_life_seconds: Optional[float] = pw.column_definition(default_value=None)
+
+def index_events(index: TimePartitionedIndex, events: pw.Table, embedder: pw.UDF):
+    """Feed a table with text, timestamp and metadata columns into the index."""
+    embedded = events.select(
+        vector=embedder(pw.this.text),
+        ts=pw.apply_with_type(parse_timestamp, float, pw.this.timestamp),
+        timestamp=pw.this.timestamp,
+        text=pw.this.text,
+        metadata=pw.this.metadata,
+    )
+
+    def on_change(key, row, time, is_addition):
+        if is_addition:
+            metadata = row["metadata"]
+            metadata = metadata.value if isinstance(metadata, pw.Json) else metadata
+            index.add(key, row["vector"], row["ts"], (row["text"], row["timestamp"], metadata))
+            tracing.count("ingest.rows")
+        else:
+            index.remove(key)
+
+    pw.io.subscribe(embedded, on_change=on_change)
+
+def recent_query_handler(index: TimePartitionedIndex, embedder: pw.UDF):
+    def _bound(value: Optional[str]) -> Optional[float]:
+        if value is None or value == "":
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return parse_timestamp(value)
+
+    @pw.udf
+    def search(vector: np.ndarray, k: int, start: Optional[str], end: Optional[str],
+               last_seconds: Optional[float], half_life_seconds: Optional[float]) -> pw.Json:
+        try:
+            window_start, window_end = _bound(start), _bound(end)
+        except ValueError as e:
+            return pw.Json({"error": f"invalid time bound: {e}"})
+        if last_seconds is not None:
+            window_start = max(float("-inf") if window_start is None else window_start, index.newest - last_seconds)
+        with tracing.span("knn.time_window", k=k) as span:
+            scanned = index.partitions_scanned
+            results = index.search(vector, k, window_start, window_end, half_life_seconds)
+            span.set(partitions=index.partitions_scanned - scanned)
+        return pw.Json([
+            {
+                "text": text,
+                "metadata": metadata,
+                "timestamp": timestamp,
+                "dist": 1.0 - similarity,
+                "score": score,
+            }
+            for (text, timestamp, metadata), _, similarity, score in results
+        ])
+
+    def handler(queries: pw.Table) -> pw.Table:
+        return queries.select(
+            result=search(
+                embedder(pw.this.query), pw.this.k, pw.this.start, pw.this.end,
+                pw.this.last_seconds, pw.this.half_life_seconds,
+            )
+        )
+
+    return handler
@@ -0,0 +1,272 @@
+import atexit
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+TRACING = os.environ.get("TRACING", "on") != "off"
+TRACE_FILE = os.environ.get("TRACE_FILE", "")  # JSONL span records; "" keeps metrics only
+TRACE_SAMPLE = float(os.environ.get("TRACE_SAMPLE", 1.0))  # Fraction of root spans written to TRACE_FILE
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))  # 0 disables the standalone metrics endpoint
+
+# --- Spans, counters and latency histograms ---
+# span("embed.batch", rows=64) times a block. Every span feeds an in-process histogram with
+# fixed log-spaced buckets (1 us doubling up to ~2 min), so recording is a bisect and three
+# increments under one lock and memory stays constant however long the process runs.
+# Spans nest per thread; when TRACE_FILE is set, sampled root spans and everything under
+# them are also appended there as JSON lines (name, start, duration, ids, attributes)
+# through a buffer flushed once a second. observe() records a duration measured elsewhere,
+# count() bumps a counter and gauge() sets a current value such as a queue depth. Metrics
+# are exported as Prometheus text or JSON, from metrics_endpoint() (a serving.py local
+# route) or serve_metrics() on its own port.
+# TRACING=off turns every call into a no-op.
+
+BOUNDS: List[float] = [1e-6 * 2 ** i for i in range(28)]  # Upper bucket bounds in seconds
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation, capped at the largest seen
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max),
+        }
+
+class Registry:
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "latency": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = _metric_name(name) + "_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+            for name, value in sorted(self.gauges.items()):
+                metric = _metric_name(name)
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value:g}"]
+            for name, histogram in sorted(self.histograms.items()):
+                metric = _metric_name(name) + "_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(BOUNDS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines += [f"{metric}_sum {histogram.total:.6f}", f"{metric}_count {histogram.count}"]
+        return "\n".join(lines) + "\n"
+
+def _metric_name(name: str) -> str:
+    return "sensor_" + "".join(c if c.isalnum() else "_" for c in name)
+
+class TraceWriter:
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self._file = open(path, "a", encoding="utf-8", buffering=1 << 16)
+        self._lock = threading.Lock()
+        self._interval = flush_interval
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self.flush)
+
+    def write(self, record: Dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._interval)
+            self.flush()
+
+registry = Registry()
+_writer: Optional[TraceWriter] = TraceWriter(TRACE_FILE) if TRACING and TRACE_FILE else None
+_ids = itertools.count(1)
+_local = threading.local()
+_PID = os.getpid()
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "wall", "id", "parent", "trace", "sampled")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = stack[-1] if stack else None
+        if _writer is not None:
+            self.id = next(_ids)
+            if parent is not None:
+                self.parent, self.trace, self.sampled = parent.id, parent.trace, parent.sampled
+            else:
+                self.parent, self.trace, self.sampled = None, self.id, random.random() < TRACE_SAMPLE
+            self.wall = time.time()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _local.stack.pop()
+        registry.observe(self.name, seconds)
+        if exc_type is not None:
+            registry.count(self.name + ".errors")
+        if _writer is not None and self.sampled:
+            record = {"name": self.name, "ts": round(self.wall, 6), "ms": round(seconds * 1000, 3),
+                      "pid": _PID, "trace": self.trace, "span": self.id, "parent": self.parent}
+            if self.attrs:
+                record["attrs"] = self.attrs
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            _writer.write(record)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(name: str, **attrs):
+    return Span(name, attrs) if TRACING else _NOOP
+
+def count(name: str, value: float = 1):
+    if TRACING:
+        registry.count(name, value)
+
+def gauge(name: str, value: float):
+    if TRACING:
+        registry.gauge(name, value)
+
+def observe(name: str, seconds: float, **attrs):
+    """Record a duration measured by the caller, as if a span of that length had just ended."""
+    if not TRACING:
+        return
+    registry.observe(name, seconds)
+    if _writer is not None:
+        stack = getattr(_local, "stack", None)
+        parent = stack[-1] if stack else None
+        if not (parent.sampled if parent is not None else random.random() < TRACE_SAMPLE):
+            return
+        span_id = next(_ids)
+        record = {"name": name, "ts": round(time.time() - seconds, 6), "ms": round(seconds * 1000, 3), "pid": _PID,
+                  "trace": parent.trace if parent else span_id, "span": span_id, "parent": parent.id if parent else None}
+        if attrs:
+            record["attrs"] = attrs
+        _writer.write(record)
+
+def traced(name: str) -> Callable:
+    """Decorator form of span() for whole functions."""
+    def decorate(fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        wrapper.__name__, wrapper.__doc__ = fn.__name__, fn.__doc__
+        return wrapper
+    return decorate
+
+def metrics_endpoint() -> Callable[[bytes], Tuple[int, bytes]]:
+    """serving.py local route answering with the JSON snapshot."""
+    return lambda body: (200, json.dumps(registry.snapshot()).encode("utf-8"))
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> HTTPServer:
+    """GET /metrics (Prometheus text) and /metrics.json on a background thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def serve_metrics_from_env() -> Optional[HTTPServer]:
+    return serve_metrics(METRICS_PORT) if TRACING and METRICS_PORT else None
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+PIPELINE_SNAPSHOT_DIR = os.environ.get("PIPELINE_SNAPSHOT_DIR", "./Snapshot")  # "" disables snapshots
+PIPELINE_SNAPSHOT_SECONDS = float(os.environ.get("PIPELINE_SNAPSHOT_SECONDS", 10))
+
+# --- Embedding snapshot for fast restarts ---
+# Pathway rebuilds its indexes from the source on every start, and embedding is what makes
+# that slow. The snapshot keeps every computed vector on disk so a restart only runs the
+# model on rows appended after the last checkpoint:
+#   vectors.f32      float32 rows, memory-mapped on load (nothing is parsed or copied)
+#   keys.u64         one 64-bit hash of the document text per row
+#   checkpoint.json  row count, model, dimensions and the source byte offset covered
+# checkpoint.json is replaced atomically after the data files are synced, so a crash
+# mid-append only leaves bytes past the recorded row count, which are cut off on load.
+# Lookups go through the text hash, so a rotated or rewritten source still reuses the
+# vectors of unchanged rows; only the offset restarts from zero.
+# SnapshotCheckpointer follows the source from that offset in a background thread. It takes
+# vectors the pipeline has already computed from the embedder's memo and stops at the
+# first row not embedded yet, so the checkpoint always covers a prefix of the file (Pathway
+# does not embed rows in file order). Rows still missing once the embedder has gone idle,
+# or after STALL_PASSES passes (evicted from the memo during a long burst), are embedded in
+# one batch, which also memoizes them for the pipeline.
+
+SNAPSHOT_READ_BYTES = 4 << 20  # Source bytes read per checkpoint step
+DIGEST_BYTES = 4096  # Source bytes before the offset that must be unchanged to resume from it
+STALL_PASSES = 6
+
+def text_key(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def document_text(timestamp, sensor, reading, intensity) -> str:
+    """The DocumentStore text for one event; snapshot keys are hashes of it."""
+    return f"Timestamp: {timestamp} | Sensor: {sensor} | Reading: {reading} | Intensity: {intensity}"
+
+def event_text(event: Dict) -> str:
+    # Mirrors the column conversions in pipeline.py
+    return document_text(str(event["timestamp"]), event["sensor"], str(event["reading"]), float(event["intensity"]))
+
+def _source_digest(path: str, offset: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - DIGEST_BYTES))
+        return hashlib.sha1(f.read(min(offset, DIGEST_BYTES))).hexdigest()
+
+class VectorSnapshot:
+    def __init__(self, directory: str, source_path: str, model: str, dimensions: int):
+        self.directory = directory
+        self.source_path = os.path.abspath(source_path)
+        self.model = model
+        self.dimensions = dimensions
+        self.rows = 0  # Rows on disk, including those appended since load
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.loaded_rows, self._vectors, self._order, self._sorted = self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_checkpoint(self) -> Optional[Dict]:
+        try:
+            with open(self._path("checkpoint.json"), "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if checkpoint.get("model") != self.model or checkpoint.get("dimensions") != self.dimensions:
+            return None  # Vectors from another model are useless
+        return checkpoint
+
+    def _source_unchanged(self, checkpoint: Dict) -> bool:
+        try:
+            stat = os.stat(self.source_path)
+            return (checkpoint.get("source") == self.source_path and stat.st_ino == checkpoint.get("inode")
+                    and stat.st_size >= checkpoint["offset"]
+                    and _source_digest(self.source_path, checkpoint["offset"]) == checkpoint.get("digest"))
+        except (OSError, KeyError):
+            return False
+
+    def _load(self) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        checkpoint = self._read_checkpoint()
+        rows = checkpoint["rows"] if checkpoint else 0
+        # Drop anything written past the last checkpoint (or everything, without one)
+        for name, width in (("vectors.f32", 4 * self.dimensions), ("keys.u64", 8)):
+            with open(self._path(name), "ab") as f:
+                f.truncate(rows * width)
+        self.rows = rows
+        if checkpoint and self._source_unchanged(checkpoint):
+            self.offset, self.inode = checkpoint["offset"], checkpoint["inode"]
+        if not rows:
+            empty = np.empty(0, dtype=np.uint64)
+            return 0, np.empty((0, self.dimensions), dtype=np.float32), empty, empty
+        vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+        keys = np.memmap(self._path("keys.u64"), dtype=np.uint64, mode="r", shape=(rows,))
+        order = np.argsort(keys, kind="stable")
+        return rows, vectors, order, keys[order]
+
+    def lookup(self, text: str) -> Optional[np.ndarray]:
+        """The stored vector for `text`, if it was checkpointed before this process started."""
+        if not self.loaded_rows:
+            return None
+        key = np.uint64(text_key(text))
+        i = int(np.searchsorted(self._sorted, key))
+        if i < self.loaded_rows and self._sorted[i] == key:
+            return np.array(self._vectors[self._order[i]])
+        return None
+
+    def rewind(self, inode: Optional[int]):
+        """Start covering a rotated or truncated source from its first byte."""
+        self.offset, self.inode = 0, inode
+
+    def append(self, texts: List[str], vectors: List[np.ndarray], offset: int, inode: int):
+        with self._lock:
+            if texts:
+                data = np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dimensions)
+                keys = np.array([text_key(text) for text in texts], dtype=np.uint64)
+                for name, array in (("vectors.f32", data), ("keys.u64", keys)):
+                    with open(self._path(name), "ab") as f:
+                        f.write(array.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+            checkpoint = {
+                "rows": self.rows + len(texts),
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "source": self.source_path,
+                "inode": inode,
+                "offset": offset,
+                "digest": _source_digest(self.source_path, offset),
+                "written_at": time.time(),
+            }
+            temp = self._path("checkpoint.json.tmp")
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self._path("checkpoint.json"))
+            self.rows, self.offset, self.inode = checkpoint["rows"], offset, inode
+
+    def stats(self) -> Dict:
+        return {"rows": self.rows, "loaded_rows": self.loaded_rows, "offset": self.offset}
+
+class SnapshotCheckpointer:
+    def __init__(self, snapshot: VectorSnapshot, embedder, row_text: Callable[[Dict], str] = event_text,
+                 interval: float = PIPELINE_SNAPSHOT_SECONDS):
+        self.snapshot = snapshot
+        self.embedder = embedder
+        self.row_text = row_text
+        self.interval = interval
+        self._stalled_at: Optional[int] = None
+        self._stalls = 0
+        self._encoded_at_stall = -1
+        self._stop = threading.Event()
+        self.embedded = 0  # Rows the checkpointer had to embed itself
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def _read(self) -> Tuple[List[Tuple[Optional[str], int]], int]:
+        """(text or None, end offset) for complete lines past the checkpoint, and the source inode."""
+        snapshot = self.snapshot
+        with open(snapshot.source_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != snapshot.inode or stat.st_size < snapshot.offset:
+                snapshot.rewind(stat.st_ino)
+            f.seek(snapshot.offset)
+            data = f.read(SNAPSHOT_READ_BYTES)
+        rows = []
+        position = snapshot.offset
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # Still being written
+            position += len(line)
+            try:
+                text = self.row_text(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                text = None  # Blank or malformed lines are skipped, as the reader skips them
+            rows.append((text, position))
+        return rows, stat.st_ino
+
+    def checkpoint(self) -> int:
+        """Append every embedded row past the checkpoint; returns the rows written."""
+        written = 0
+        while True:
+            rows, inode = self._read()
+            if not rows:
+                return written
+            texts: List[str] = []
+            vectors: List[Optional[np.ndarray]] = []
+            seen = set()
+            start = offset = self.snapshot.offset
+            stalled = self._stalled_at == start and (
+                self.embedder.encoded == self._encoded_at_stall or self._stalls >= STALL_PASSES)
+            for text, end in rows:
+                if text is not None and text not in seen and self.snapshot.lookup(text) is None:
+                    vector = self.embedder.cached(text)
+                    if vector is None and not stalled:
+                        break  # The pipeline has not embedded it yet; retry on the next pass
+                    seen.add(text)
+                    texts.append(text)
+                    vectors.append(vector)
+                offset = end
+            if offset == start:
+                self._stalls = self._stalls + 1 if self._stalled_at == start else 1
+                self._stalled_at, self._encoded_at_stall = start, self.embedder.encoded
+                return written
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                for i, vector in zip(missing, self.embedder.embed_batch([texts[i] for i in missing])):
+                    vectors[i] = vector
+                self.embedded += len(missing)
+            self.snapshot.append(texts, vectors, offset, inode)
+            written += len(texts)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:  # A failed pass is retried; the snapshot on disk stays consistent
+                self.errors += 1
+                self.last_error = repr(e)
+
+    def start(self) -> "SnapshotCheckpointer":
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
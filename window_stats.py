@@ -0,0 +1,319 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import pathway as pw
+
+import tracing
+from time_index import parse_timestamp
+
+WINDOW_BUCKET_SECONDS = int(os.environ.get("WINDOW_BUCKET_SECONDS", 60))
+# Sliding windows kept as running totals, in seconds; other lengths are summed from buckets
+WINDOW_SLIDING_SECONDS = tuple(int(w) for w in os.environ.get("WINDOW_SLIDING_SECONDS", "60,300,3600").split(","))
+WINDOW_RETENTION_SECONDS = int(os.environ.get("WINDOW_RETENTION_SECONDS", 86400))
+
+AGG_FIELDS = ("intensity", "temperature", "humidity", "battery_level")
+GROUP_BY = ("sensor", "location", "device_id")
+
+# --- Sliding / tumbling window aggregation ---
+# Every event updates a handful of series (all events, its sensor, its location and its
+# device_id). A series keeps per-bucket count/sum/min/max for each numeric field in a deque
+# of WINDOW_BUCKET_SECONDS buckets, plus running totals for each standing sliding window:
+# an event adds to its bucket and to those totals, and buckets falling out of a window are
+# subtracted as time advances, so an update is O(1) and a count/mean over the last hour is
+# a lookup. Min/max are combined from at most window / bucket buckets, and tumbling windows
+# (aligned to the epoch) are assembled from the same buckets. Time is event time: "now" is
+# the newest timestamp seen, which keeps replayed logs meaningful.
+
+def event_values(event: Dict) -> Dict[str, float]:
+    """Numeric fields of an event, from the top level, its metadata or a numeric sensor reading."""
+    metadata = event.get("metadata") or {}
+    values = {}
+    for field in AGG_FIELDS:
+        value = event.get(field, metadata.get(field))
+        if value is None and event.get("sensor") == field:
+            value = event.get("reading")  # script.py writes temperature/humidity readings as strings
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(value):
+            values[field] = value
+    return values
+
+def event_groups(event: Dict) -> List[Tuple[str, str]]:
+    metadata = event.get("metadata") or {}
+    groups = [("all", "*")]
+    for dimension in GROUP_BY:
+        value = event.get(dimension, metadata.get(dimension))
+        if value is not None:
+            groups.append((dimension, str(value)))
+    return groups
+
+class _Stats:
+    __slots__ = ("count", "n", "total", "low", "high")
+
+    def __init__(self):
+        self.count = 0
+        self.n = [0] * len(AGG_FIELDS)
+        self.total = [0.0] * len(AGG_FIELDS)
+        self.low = [math.inf] * len(AGG_FIELDS)
+        self.high = [-math.inf] * len(AGG_FIELDS)
+
+    def add(self, values: List[Tuple[int, float]]):
+        self.count += 1
+        for i, value in values:
+            self.n[i] += 1
+            self.total[i] += value
+            if value < self.low[i]:
+                self.low[i] = value
+            if value > self.high[i]:
+                self.high[i] = value
+
+    def merge(self, other: "_Stats"):
+        self.count += other.count
+        for i in range(len(AGG_FIELDS)):
+            self.n[i] += other.n[i]
+            self.total[i] += other.total[i]
+            self.low[i] = min(self.low[i], other.low[i])
+            self.high[i] = max(self.high[i], other.high[i])
+
+    def subtract(self, other: "_Stats"):
+        # Only the additive parts; min/max are always recombined from buckets
+        self.count -= other.count
+        for i in range(len(AGG_FIELDS)):
+            self.n[i] -= other.n[i]
+            self.total[i] -= other.total[i]
+
+    def to_dict(self, low: Optional[List[float]] = None, high: Optional[List[float]] = None) -> Dict:
+        low, high = low or self.low, high or self.high
+        fields = {}
+        for i, field in enumerate(AGG_FIELDS):
+            if self.n[i]:
+                fields[field] = {
+                    "count": self.n[i],
+                    "mean": self.total[i] / self.n[i],
+                    "min": low[i],
+                    "max": high[i],
+                }
+        return {"count": self.count, "fields": fields}
+
+class _Bucket(_Stats):
+    __slots__ = ("start",)
+
+    def __init__(self, start: float):
+        super().__init__()
+        self.start = start
+
+class _Sliding:
+    __slots__ = ("head", "stats", "dirty")
+
+    def __init__(self):
+        self.head = 0  # Absolute index of the oldest bucket inside the window
+        self.stats = _Stats()
+        self.dirty = False  # Set when a late event forced a bucket into the middle of the deque
+
+class SeriesWindows:
+    def __init__(self, bucket_seconds: int, sliding_windows: Tuple[int, ...], retention: int):
+        self.bucket_seconds = bucket_seconds
+        self.retention = max(retention, *sliding_windows) if sliding_windows else retention
+        self.buckets: Deque[_Bucket] = deque()
+        self.popped = 0  # Buckets dropped from the left so far; deque position + popped is stable
+        self.sliding = {window: _Sliding() for window in sliding_windows}
+
+    def add(self, timestamp: float, values: List[Tuple[int, float]], now: float):
+        start = timestamp - timestamp % self.bucket_seconds
+        if start + self.bucket_seconds <= now - self.retention:
+            return  # Older than anything still kept
+        buckets = self.buckets
+        if not buckets or start > buckets[-1].start:
+            bucket = _Bucket(start)
+            buckets.append(bucket)
+            position = self.popped + len(buckets) - 1
+        else:
+            i = len(buckets) - 1
+            while i >= 0 and buckets[i].start > start:
+                i -= 1
+            if i >= 0 and buckets[i].start == start:
+                bucket, position = buckets[i], self.popped + i
+            else:
+                bucket = _Bucket(start)
+                buckets.insert(i + 1, bucket)
+                position = None
+                for sliding in self.sliding.values():
+                    sliding.dirty = True
+        bucket.add(values)
+        if position is not None:
+            for sliding in self.sliding.values():
+                if not sliding.dirty and position >= sliding.head:
+                    sliding.stats.add(values)
+        self.expire(now)
+
+    def expire(self, now: float):
+        end = self.popped + len(self.buckets)
+        for window, sliding in self.sliding.items():
+            if sliding.dirty:
+                continue
+            cutoff = now - window
+            while sliding.head < end and self.buckets[sliding.head - self.popped].start + self.bucket_seconds <= cutoff:
+                sliding.stats.subtract(self.buckets[sliding.head - self.popped])
+                sliding.head += 1
+        while self.buckets and self.buckets[0].start + self.bucket_seconds <= now - self.retention:
+            self.buckets.popleft()
+            self.popped += 1
+
+    def sliding_stats(self, window: float, now: float) -> Dict:
+        self.expire(now)
+        cutoff = now - window
+        inside = []  # Newest first
+        for bucket in reversed(self.buckets):
+            if bucket.start + self.bucket_seconds <= cutoff:
+                break
+            inside.append(bucket)
+        low = [min((bucket.low[i] for bucket in inside), default=math.inf) for i in range(len(AGG_FIELDS))]
+        high = [max((bucket.high[i] for bucket in inside), default=-math.inf) for i in range(len(AGG_FIELDS))]
+        sliding = self.sliding.get(window)
+        if sliding is None or sliding.dirty:
+            stats = _Stats()
+            for bucket in inside:
+                stats.merge(bucket)
+            if sliding is None:
+                return stats.to_dict()
+            sliding.head, sliding.stats, sliding.dirty = self.popped + len(self.buckets) - len(inside), stats, False
+        return sliding.stats.to_dict(low, high)
+
+    def tumbling_stats(self, window: float, windows: int, now: float) -> List[Dict]:
+        current = now - now % window
+        starts = [current - window * n for n in range(windows - 1, -1, -1)]
+        results = {start: _Stats() for start in starts}
+        for bucket in reversed(self.buckets):
+            if bucket.start < starts[0]:
+                break
+            stats = results.get(bucket.start - bucket.start % window)
+            if stats is not None:
+                stats.merge(bucket)
+        return [{"start": start, "end": start + window, **results[start].to_dict()} for start in starts]
+
+class WindowAggregator:
+    def __init__(
+        self,
+        bucket_seconds: int = WINDOW_BUCKET_SECONDS,
+        sliding_windows: Tuple[int, ...] = WINDOW_SLIDING_SECONDS,
+        retention: int = WINDOW_RETENTION_SECONDS,
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.sliding_windows = tuple(sliding_windows)
+        self.retention = retention
+        self.series: Dict[Tuple[str, str], SeriesWindows] = {}
+        self.now = -math.inf
+        self.events = 0
+        self._lock = threading.Lock()
+
+    def add(self, event: Dict, timestamp: Optional[float] = None):
+        if timestamp is None:
+            timestamp = parse_timestamp(event["timestamp"])
+        values = [(AGG_FIELDS.index(field), value) for field, value in event_values(event).items()]
+        with self._lock:
+            self.now = max(self.now, timestamp)
+            self.events += 1
+            for group in event_groups(event):
+                series = self.series.get(group)
+                if series is None:
+                    series = self.series[group] = SeriesWindows(self.bucket_seconds, self.sliding_windows, self.retention)
+                series.add(timestamp, values, self.now)
+
+    def query(self, group_by: Optional[str] = None, value: Optional[str] = None, window: float = 3600,
+              kind: str = "sliding", windows: int = 1) -> Dict:
+        if group_by not in (None, "", "all") + GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        if kind not in ("sliding", "tumbling"):
+            raise ValueError("kind must be sliding or tumbling")
+        if window <= 0 or windows < 1:
+            raise ValueError("window and windows must be positive")
+        dimension = group_by if group_by in GROUP_BY else "all"
+        with self._lock:
+            if dimension == "all":
+                keys = [("all", "*")]
+            elif value is not None:
+                keys = [(dimension, str(value))]
+            else:
+                keys = sorted(key for key in self.series if key[0] == dimension)
+            groups = {}
+            for key in keys:
+                series = self.series.get(key)
+                if series is None:
+                    groups[key[1]] = {"count": 0, "fields": {}} if kind == "sliding" else []
+                elif kind == "sliding":
+                    groups[key[1]] = series.sliding_stats(window, self.now)
+                else:
+                    groups[key[1]] = series.tumbling_stats(window, min(windows, 1000), self.now)
+            return {
+                "kind": kind,
+                "window_seconds": window,
+                "group_by": dimension,
+                "as_of": self.now if self.events else None,
+                "groups": groups,
+            }
+
+# --- Pathway integration ---
+# The raw event table feeds the aggregator through pw.io.subscribe. Queries are served as a
+# Pathway route next to DocumentStoreServer's, and (in production mode) directly by the
+# serving.py front end, which skips the engine round trip.
+class AggregateQuerySchema(pw.Schema):
+    group_by: Optional[str] = pw.column_definition(default_value=None)  # sensor, location, device_id
+    value: Optional[str] = pw.column_definition(default_value=None)
+    window_seconds: float = pw.column_definition(default_value=3600.0)
+    kind: str = pw.column_definition(default_value="sliding")  # sliding or tumbling
+    windows: int = pw.column_definition(default_value=1)  # Number of most recent tumbling windows
+
+def aggregate_events(aggregator: WindowAggregator, events: pw.Table):
+    """Feed a table with timestamp, sensor, reading, intensity and metadata columns into the aggregator."""
+    def on_change(key, row, time, is_addition):
+        if not is_addition:
+            return  # The sensor log is append-only; retractions only come from rewritten rows
+        event = dict(row)
+        if isinstance(event.get("metadata"), pw.Json):
+            event["metadata"] = event["metadata"].value
+        aggregator.add(event, parse_timestamp(event["timestamp"]))
+
+    pw.io.subscribe(events, on_change=on_change)
+
+def _answer(aggregator: WindowAggregator, request: Dict) -> Dict:
+    with tracing.span("aggregate.query"):
+        return aggregator.query(
+            request.get("group_by"),
+            request.get("value"),
+            float(request.get("window_seconds") or 3600),
+            request.get("kind") or "sliding",
+            int(request.get("windows") or 1),
+        )
+
+def aggregate_query_handler(aggregator: WindowAggregator):
+    @pw.udf
+    def answer(group_by: Optional[str], value: Optional[str], window_seconds: float, kind: str, windows: int) -> pw.Json:
+        request = {"group_by": group_by, "value": value, "window_seconds": window_seconds, "kind": kind, "windows": windows}
+        try:
+            return pw.Json(_answer(aggregator, request))
+        except ValueError as e:
+            return pw.Json({"error": str(e)})
+
+    def handler(queries: pw.Table) -> pw.Table:
+        return queries.select(
+            result=answer(pw.this.group_by, pw.this.value, pw.this.window_seconds, pw.this.kind, pw.this.windows)
+        )
+
+    return handler
+
+def aggregate_endpoint(aggregator: WindowAggregator) -> Callable[[bytes], Tuple[int, bytes]]:
+    """Request body -> (status, JSON reply), for serving.py's in-process routes."""
+    def endpoint(body: bytes) -> Tuple[int, bytes]:
+        try:
+            request = json.loads(body or b"{}")
+            return 200, json.dumps(_answer(aggregator, request)).encode("utf-8")
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, json.dumps({"error": str(e)}).encode("utf-8")
+
+    return endpoint
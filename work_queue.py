@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import count
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import tracing
+
+WORK_QUEUE_SIZE = int(os.environ.get("WORK_QUEUE_SIZE", 256))  # Events waiting for an LLM worker
+WORK_QUEUE_POLICY = os.environ.get("WORK_QUEUE_POLICY", "drop_oldest")  # drop_oldest or coalesce
+WORK_QUEUE_BATCH = int(os.environ.get("WORK_QUEUE_BATCH", 32))  # Most events answered in one LLM turn
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", 1))
+
+# --- Bounded work queue between sensor ingest and the LLM ---
+# The tailing loop puts every new event here and returns to the log at once. A pool of LLM
+# workers takes whatever has accumulated, up to WORK_QUEUE_BATCH events, for one turn.
+# The queue never holds more than WORK_QUEUE_SIZE events, so under a burst the backlog,
+# the prompt and the age of what gets answered all stay bounded. Overload policies:
+#   drop_oldest  a full queue sheds its oldest ordinary event for the new one
+#   coalesce     an event replaces the queued one from the same sensor and device,
+#                keeping its place in line; a full queue then sheds as drop_oldest
+# Anomalies (is_priority, e.g. Predictor flagging an anxious emotion) go to a separate
+# lane: they are handed out first, never coalesced, and shed only when the whole queue
+# is anomalies. Depth, drops and coalesced events are kept in stats() and exported
+# through tracing.py (queue.depth gauge, queue.* counters, queue.wait latency).
+
+POLICIES = ("drop_oldest", "coalesce")
+
+def sensor_key(event: Dict) -> Hashable:
+    metadata = event.get("metadata") or {}
+    return event.get("sensor"), metadata.get("device_id")
+
+class BoundedEventQueue:
+    def __init__(self, capacity: int = WORK_QUEUE_SIZE, policy: str = WORK_QUEUE_POLICY,
+                 is_priority: Optional[Callable[[Dict], bool]] = None,
+                 coalesce_key: Callable[[Dict], Hashable] = sensor_key):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown work queue policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        self.capacity = max(1, capacity)
+        self.policy = policy
+        self.is_priority = is_priority
+        self.coalesce_key = coalesce_key
+        # (event, time queued) per lane; ordinary events are keyed by sensor when coalescing
+        self._normal: "OrderedDict[Hashable, Tuple[Dict, float]]" = OrderedDict()
+        self._priority: Deque[Tuple[Dict, float]] = deque()
+        self._ids = count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.served = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return len(self._normal) + len(self._priority)
+
+    def _shed(self):
+        self.dropped += 1
+        tracing.count("queue.dropped")
+
+    def put(self, event: Dict, priority: Optional[bool] = None) -> bool:
+        """Queue an event; returns False if it was shed on arrival or the queue is closed."""
+        if priority is None:
+            priority = bool(self.is_priority and self.is_priority(event))
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                return False
+            self.enqueued += 1
+            tracing.count("queue.enqueued")
+            if not priority:
+                key = self.coalesce_key(event) if self.policy == "coalesce" else next(self._ids)
+                queued = self._normal.get(key)
+                if queued is not None:
+                    # The newest reading wins, in the slot and with the age of the first one
+                    self._normal[key] = (event, queued[1])
+                    self.coalesced += 1
+                    tracing.count("queue.coalesced")
+                    return True
+            if len(self) >= self.capacity:
+                if self._normal:
+                    self._normal.popitem(last=False)
+                elif priority:
+                    self._priority.popleft()
+                else:
+                    self._shed()  # Only anomalies are waiting; they outrank this event
+                    return False
+                self._shed()
+            if priority:
+                self._priority.append((event, now))
+                tracing.count("queue.priority")
+            else:
+                self._normal[key] = (event, now)
+            self.high_water = max(self.high_water, len(self))
+            tracing.gauge("queue.depth", len(self))
+            self._cond.notify()
+        return True
+
+    def get_batch(self, max_events: int = WORK_QUEUE_BATCH, timeout: Optional[float] = None) -> List[Dict]:
+        """Up to max_events events, anomalies first, in arrival order; [] on timeout or once closed and drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not len(self):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if self._closed or (remaining is not None and remaining <= 0):
+                    return []
+                self._cond.wait(remaining)
+            taken: List[Tuple[Dict, float]] = []
+            while self._priority and len(taken) < max_events:
+                taken.append(self._priority.popleft())
+            while self._normal and len(taken) < max_events:
+                taken.append(self._normal.popitem(last=False)[1])
+            self.served += len(taken)
+            tracing.gauge("queue.depth", len(self))
+        now = time.monotonic()
+        for _, queued_at in taken:
+            tracing.observe("queue.wait", now - queued_at)
+        taken.sort(key=lambda entry: entry[1])  # Prompts read chronologically
+        return [event for event, _ in taken]
+
+    def close(self):
+        """Refuse new events; workers drain what is queued and then stop."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "capacity": self.capacity,
+                "depth": len(self),
+                "priority_depth": len(self._priority),
+                "high_water": self.high_water,
+                "enqueued": self.enqueued,
+                "served": self.served,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+            }
+
+class WorkerPool:
+    # Each worker takes one batch at a time, so at most `workers` LLM turns run at once
+    def __init__(self, queue: BoundedEventQueue, handle: Callable[[List[Dict]], None],
+                 workers: int = LLM_WORKERS, batch_size: int = WORK_QUEUE_BATCH):
+        self.queue = queue
+        self.handle = handle
+        self.batch_size = batch_size
+        self.batches = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._threads = [threading.Thread(target=self._run, name=f"llm-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+
+    @property
+    def size(self) -> int:
+        return len(self._threads)
+
+    def _run(self):
+        while True:
+            batch = self.queue.get_batch(self.batch_size)
+            if not batch:
+                return  # Closed and drained
+            try:
+                self.handle(batch)
+            except Exception as e:  # One failed turn must not stop the worker
+                self.errors += 1
+                self.last_error = repr(e)
+                tracing.count("queue.worker_errors")
+            self.batches += 1
+
+    def start(self) -> "WorkerPool":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None):
+        for thread in self._threads:
+            thread.join(timeout)